@@ -0,0 +1,76 @@
+"""
+Compara dos resultados de benchmarks/run.py.
+
+Muestra cada métrica con su variación y termina con código 1 si alguna empeora
+más que el umbral (para usarlo en CI).
+
+Uso (desde backend/):
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/nuevo.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+# Métricas en las que un valor mayor es mejor; en el resto (tiempos, memoria) mejor es menor
+HIGHER_IS_BETTER = ("pages_per_second", "chunks_per_second", "asks_per_second")
+
+
+def flatten(results: Dict[str, Any]) -> Dict[str, float]:
+    """Extrae las métricas comparables con claves estables (p. ej. "ingest.100p.pages_per_second")."""
+    metrics: Dict[str, float] = {}
+    for key in ("import_seconds", "startup_seconds", "peak_rss_mb"):
+        if isinstance(results.get(key), (int, float)):
+            metrics[key] = results[key]
+    for section in ("ingest", "delete"):
+        items: List[Dict[str, Any]] = results.get(section, [])
+        for item in items:
+            for name, value in item.items():
+                if name not in ("pages", "chunks", "count") and isinstance(value, (int, float)):
+                    metrics[f"{section}.{item['pages']}p.{name}"] = value
+    ask: Dict[str, Any] = results.get("ask") or {}
+    for name, value in ask.items():
+        if name not in ("pages", "concurrency", "count", "errors") and isinstance(value, (int, float)):
+            metrics[f"ask.{name}"] = value
+    return metrics
+
+
+def change_percent(name: str, before: float, after: float) -> Optional[float]:
+    """Variación en %, positiva si la métrica empeora."""
+    if not before:
+        return None
+    change = (after - before) / before * 100
+    return -change if name.endswith(HIGHER_IS_BETTER) else change
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compara dos resultados de benchmark")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Empeoramiento máximo permitido (%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = flatten(json.load(f))
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = flatten(json.load(f))
+
+    regressions: List[str] = []
+    print(f"{'métrica':<40} {'antes':>12} {'ahora':>12} {'cambio':>9}")
+    for name in sorted(set(baseline) & set(current)):
+        change = change_percent(name, baseline[name], current[name])
+        flag = ""
+        if change is not None and change > args.threshold:
+            flag = "  <-- peor"
+            regressions.append(name)
+        shown = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<40} {baseline[name]:>12} {current[name]:>12} {shown:>9}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} métricas empeoran más de un {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Benchmark offline de ingesta, borrado y preguntas (sin APIs de Google).
+
+Sustituye embeddings y LLM por los modelos locales deterministas (EMBEDDING_PROVIDER
+y CHAT_PROVIDER = "fake") con la latencia y el jitter indicados, genera PDFs
+sintéticos y mide:
+
+- ingesta: add_pdf_from_path (páginas/s, chunks/s)
+- borrado: delete_document (ms)
+- preguntas: POST /rag/ask a través de la app FastAPI (p50/p95/p99, preguntas/s)
+- memoria: pico de RSS por fase y del proceso
+
+Todo se ejecuta en un directorio temporal y el resultado se guarda como JSON para
+compararlo entre ejecuciones con benchmarks/compare.py.
+
+Uso (desde backend/):
+    python -m benchmarks.run --pages 10 100 500 --asks 200 --concurrency 16
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Event, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic_pdf import make_pdf  # noqa: E402
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark offline del servicio RAG")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500], help="Tamaños de PDF (páginas) a indexar")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeticiones de ingesta/borrado por tamaño")
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--asks", type=int, default=200, help="Preguntas a /rag/ask")
+    parser.add_argument("--concurrency", type=int, default=8, help="Preguntas simultáneas")
+    parser.add_argument("--ask-pages", type=int, default=50, help="Páginas del documento consultado")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embedding-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0)
+    parser.add_argument("--chat-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--vector-backend", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--answer-cache", action="store_true", help="Mantener activa la caché de respuestas")
+    parser.add_argument("--embedding-cache", action="store_true", help="Mantener activa la caché de embeddings")
+    parser.add_argument("--workdir", help="Directorio de trabajo (por defecto uno temporal que se borra al final)")
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto benchmarks/results/bench-<fecha>.json)")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Fija la configuración antes de importar src (Settings se lee al importar)."""
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "fake",
+        "CHAT_PROVIDER": "fake",
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "FAKE_EMBEDDING_JITTER_MS": str(args.embedding_jitter_ms),
+        "FAKE_CHAT_LATENCY_MS": str(args.chat_latency_ms),
+        "FAKE_CHAT_JITTER_MS": str(args.chat_jitter_ms),
+        "VECTOR_BACKEND": args.vector_backend,
+        "ANSWER_CACHE_ENABLED": str(args.answer_cache),
+        "EMBEDDING_CACHE_ENABLED": str(args.embedding_cache),
+        # La ingesta se mide llamando directamente a add_pdf_from_path, sin cola ni reconciliador
+        "INDEXING_WORKERS": "0",
+        "RECONCILE_INTERVAL_SECONDS": "0",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+
+
+def current_rss_mb() -> Optional[float]:
+    """RSS actual del proceso (Linux, /proc); None si no está disponible."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_peak_rss_mb() -> Optional[float]:
+    """Pico de RSS de todo el proceso (ru_maxrss está en KB en Linux y en bytes en macOS)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RSSSampler:
+    """Muestrea el RSS en un hilo mientras dura el bloque `with` y guarda el máximo."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb: Optional[float] = None
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _sample(self) -> None:
+        rss = current_rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "RSSSampler":
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def summarize(values_ms: List[float]) -> Dict[str, float]:
+    """Percentiles (nearest-rank), media y máximo de una lista de latencias en ms."""
+    if not values_ms:
+        return {}
+    ordered = sorted(values_ms)
+
+    def percentile(p: float) -> float:
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def bench_ingest_and_delete(service: Any, pdf_dir: str, args: argparse.Namespace) -> Dict[str, List[Dict[str, Any]]]:
+    """Indexa y elimina cada tamaño de PDF `repeats` veces."""
+    ingest: List[Dict[str, Any]] = []
+    delete: List[Dict[str, Any]] = []
+    for pages in args.pages:
+        template = os.path.join(pdf_dir, f"synthetic_{pages}.pdf")
+        make_pdf(template, pages, args.words_per_page, seed=pages)
+        durations: List[float] = []
+        delete_ms: List[float] = []
+        chunks = 0
+        with RSSSampler() as sampler:
+            for repeat in range(args.repeats):
+                # _purge_document borra el PDF: cada repetición indexa su propia copia
+                path = os.path.join(pdf_dir, f"synthetic_{pages}_{repeat}.pdf")
+                shutil.copyfile(template, path)
+                started = time.perf_counter()
+                result = service.add_pdf_from_path(path, os.path.basename(path))
+                durations.append(time.perf_counter() - started)
+                chunks = result["chunks"]
+
+                started = time.perf_counter()
+                service.delete_document(result["doc_id"])
+                delete_ms.append((time.perf_counter() - started) * 1000)
+
+        best = min(durations)
+        ingest.append({
+            "pages": pages,
+            "chunks": chunks,
+            "seconds_min": round(best, 4),
+            "seconds_mean": round(sum(durations) / len(durations), 4),
+            "pages_per_second": round(pages / best, 2),
+            "chunks_per_second": round(chunks / best, 2),
+            "peak_rss_mb": round(sampler.peak_mb, 1) if sampler.peak_mb is not None else None,
+        })
+        delete.append({"pages": pages, "chunks": chunks, **summarize(delete_ms)})
+        print(f"[Benchmark] {pages} páginas: {chunks} chunks en {best:.3f} s, borrado p50 {delete[-1]['p50_ms']} ms")
+    return {"ingest": ingest, "delete": delete}
+
+
+def bench_ask(client: Any, service: Any, pdf_dir: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Lanza `asks` preguntas a /rag/ask con `concurrency` clientes simultáneos."""
+    path = os.path.join(pdf_dir, "synthetic_ask.pdf")
+    make_pdf(path, args.ask_pages, args.words_per_page, seed=args.ask_pages)
+    doc_id = service.add_pdf_from_path(path, "synthetic_ask.pdf")["doc_id"]
+
+    # Términos únicos por página (ref{página}x{n}): cada pregunta es distinta y no la sirve la caché
+    questions = [f"¿Qué dice el documento sobre ref{i % args.ask_pages}x{i % 12} en la pregunta {i}?" for i in range(args.asks)]
+
+    def ask(question: str) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        response = client.post("/rag/ask", json={"question": question, "doc_id": doc_id})
+        return (time.perf_counter() - started) * 1000, response.status_code == 200
+
+    for question in questions[:5]:
+        ask(f"calentamiento {question}")
+
+    with RSSSampler() as sampler, ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        started = time.perf_counter()
+        outcomes = list(executor.map(ask, questions))
+        wall = time.perf_counter() - started
+    latencies = [elapsed for elapsed, _ in outcomes]
+    errors = sum(1 for _, ok in outcomes if not ok)
+
+    service.delete_document(doc_id)
+    result = {
+        "pages": args.ask_pages,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "asks_per_second": round(len(questions) / wall, 2) if wall else None,
+        "peak_rss_mb": round(sampler.peak_mb, 1) if sampler.peak_mb is not None else None,
+        **summarize(latencies),
+    }
+    print(f"[Benchmark] /ask: p50 {result.get('p50_ms')} ms, p95 {result.get('p95_ms')} ms, p99 {result.get('p99_ms')} ms, {result['asks_per_second']} preguntas/s")
+    return result
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    configure_environment(args)
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="rag-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    previous_cwd = os.getcwd()
+    # Las rutas de datos (./chroma_db, data/pdfs) son relativas al directorio actual
+    os.chdir(workdir)
+    try:
+        from fastapi.testclient import TestClient
+
+        started = time.perf_counter()
+        from src.main import app
+        from src.services.rag_service import RAGService
+        import_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        service = RAGService()
+        startup_seconds = time.perf_counter() - started
+        app.state.rag_service = service
+
+        pdf_dir = os.path.join(workdir, "synthetic")
+        os.makedirs(pdf_dir, exist_ok=True)
+        results: Dict[str, Any] = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("workdir", "output")},
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "import_seconds": round(import_seconds, 3),
+            "startup_seconds": round(startup_seconds, 3),
+        }
+        results.update(bench_ingest_and_delete(service, pdf_dir, args))
+        with TestClient(app) as client:
+            results["ask"] = bench_ask(client, service, pdf_dir, args)
+        peak = process_peak_rss_mb()
+        results["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+
+        service.indexing_pool.stop()
+        service.reconciler.stop()
+        return results
+    finally:
+        os.chdir(previous_cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    output = args.output or os.path.join(
+        BACKEND_DIR, "benchmarks", "results", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output = os.path.abspath(output)
+    results = run(args)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"[Benchmark] Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import random
+import textwrap
+from typing import List
+
+# Vocabulario fijo: el mismo seed produce siempre el mismo PDF
+_VOCABULARY = [
+    "contrato", "cliente", "factura", "importe", "plazo", "entrega", "garantía", "servicio",
+    "proveedor", "pago", "cláusula", "anexo", "informe", "resultado", "análisis", "riesgo",
+    "proyecto", "equipo", "fecha", "documento", "sección", "requisito", "sistema", "datos",
+    "usuario", "acceso", "seguridad", "calidad", "proceso", "revisión", "objetivo", "coste",
+]
+_LINE_WIDTH = 90
+_LINES_PER_PAGE = 60
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def page_text(number: int, words: int, rng: random.Random) -> str:
+    """Texto de una página: palabras del vocabulario más términos únicos por página (p. ej. "ref12x3")."""
+    tokens: List[str] = []
+    for i in range(words):
+        tokens.append(rng.choice(_VOCABULARY))
+        if i % 25 == 0:
+            tokens.append(f"ref{number}x{i // 25}")
+    return " ".join(tokens)
+
+
+def make_pdf(path: str, pages: int, words_per_page: int = 300, seed: int = 0) -> None:
+    """
+    Genera un PDF sintético con texto extraíble (sin dependencias externas).
+
+    Args:
+        path: Ruta de salida
+        pages: Número de páginas
+        words_per_page: Palabras por página (se recortan a lo que cabe en 60 líneas)
+        seed: Semilla del generador de texto
+    """
+    rng = random.Random(seed)
+    objects: List[bytes] = [
+        b"<</Type/Catalog/Pages 2 0 R>>",
+        ("<</Type/Pages/Kids[" + " ".join(f"{4 + 2 * i} 0 R" for i in range(pages)) + f"]/Count {pages}>>").encode("latin-1"),
+        b"<</Type/Font/Subtype/Type1/BaseFont/Helvetica/Encoding/WinAnsiEncoding>>",
+    ]
+    for number in range(pages):
+        text = page_text(number, words_per_page, rng)
+        lines = textwrap.wrap(text, _LINE_WIDTH)[:_LINES_PER_PAGE]
+        stream = ("BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET").encode("cp1252")
+        objects.append(f"<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 842]/Resources<</Font<</F1 3 0 R>>>>/Contents {5 + 2 * number} 0 R>>".encode("latin-1"))
+        objects.append(f"<</Length {len(stream)}>>stream\n".encode("latin-1") + stream + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets: List[int] = []
+    for index, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{index} 0 obj".encode("latin-1") + body + b"endobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer<</Size {len(objects) + 1}/Root 1 0 R>>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+
+    with open(path, "wb") as f:
+        f.write(output)
@@ -5,11 +5,66 @@ from typing import Optional
 class Settings(BaseSettings):
     GOOGLE_API_KEY: Optional[SecretStr] = None
     CHROMA_PERSIST_DIR: str = "./chroma_db"
+    # Servidor Chroma compartido (recomendado con varios workers); vacío = directorio local
+    CHROMA_SERVER_HOST: str = ""
+    CHROMA_SERVER_PORT: int = 8000
+    VECTOR_BACKEND: str = "chroma"  # "chroma" | "numpy" (matrices .npy por documento, búsqueda exacta)
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
     K: int = 2
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATE_FACTOR: int = 4  # candidatos por fuente = K * factor antes de fusionar
+    RRF_K: int = 60
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
     EMBEDDING_MODEL: str = "models/embedding-001"
+    EMBEDDING_PROVIDER: str = "google"  # "google" | "fake" (local, sin red)
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_CONCURRENCY: int = 4
+    FAKE_EMBEDDING_SIZE: int = 256
+    FAKE_EMBEDDING_LATENCY_MS: float = 0.0
+    FAKE_EMBEDDING_JITTER_MS: float = 0.0
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_MB: int = 512
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    QUERY_EMBEDDING_DISK_CACHE: bool = False
     CHAT_MODEL: str = "gemini-2.5-pro-exp-03-25"
+    CHAT_PROVIDER: str = "google"  # "google" | "fake" (local, sin red)
+    FAKE_CHAT_LATENCY_MS: float = 0.0
+    FAKE_CHAT_JITTER_MS: float = 0.0
+    FAKE_CHAT_RESPONSE_WORDS: int = 40
+    PARSE_CACHE_MAX_ENTRIES: int = 4
+    PDF_PROCESS_WORKERS: int = 0  # procesos para extraer PDFs grandes (0 = núcleos disponibles)
+    PDF_PARALLEL_MIN_PAGES: int = 64  # por debajo se extrae en el proceso actual
+    PDF_PAGES_PER_TASK: int = 32
+    ASK_MAX_CONCURRENCY: int = 32
+    ASK_BATCH_MAX_QUESTIONS: int = 50  # preguntas por petición en /rag/ask/batch
+    ASK_BATCH_CONCURRENCY: int = 8  # llamadas al LLM en paralelo por lote
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
+    ANSWER_CACHE_TTL_SECONDS: float = 3600
+    ANSWER_CACHE_VERSION_REFRESH_SECONDS: float = 1.0  # cada cuánto se leen las versiones escritas por otros workers
+    MAX_UPLOAD_SIZE_MB: int = 50
+    INDEXING_WORKERS: int = 2  # hilos de indexación por proceso (0 = no consumir la cola)
+    INDEXING_MAX_ATTEMPTS: int = 3
+    INDEXING_RETRY_BACKOFF_SECONDS: float = 5.0  # se duplica en cada reintento
+    INDEXING_JOB_LEASE_SECONDS: float = 300  # tras este tiempo sin latido, otro worker retoma el trabajo
+    INDEXING_POLL_INTERVAL_SECONDS: float = 1.0
+    INDEXING_FAILED_JOB_RETENTION_SECONDS: float = 86400  # trabajos fallidos que se conservan (last_error) antes de que el reconciliador los borre
+    DELETE_VERIFY: bool = False  # comprobar (solo IDs) que no quedan chunks tras eliminar
+    RECONCILE_INTERVAL_SECONDS: float = 600  # reconciliador en segundo plano (0 = desactivado)
+    RECONCILE_MAX_REPAIRS: int = 20  # documentos reencolados como máximo por ronda
+    RECONCILE_FILE_GRACE_SECONDS: float = 600  # antigüedad mínima para borrar archivos no referenciados
+    PROGRESS_FLUSH_INTERVAL_SECONDS: float = 0.5  # frecuencia máxima de escritura del progreso en SQLite
+    PROGRESS_STREAM_INTERVAL_SECONDS: float = 0.5
+    STARTUP_WARMUP: bool = True  # precargar colección, índices y BM25 antes de aceptar peticiones
+    METRICS_ENABLED: bool = True  # exponer /metrics en formato Prometheus
+    PROFILING_TOKEN: Optional[SecretStr] = None  # token de administración para perfilar peticiones (vacío = desactivado)
+    PROFILING_DIR: str = "data/profiles"
+    PROFILING_MAX_PER_MINUTE: int = 6  # perfiles por minuto y proceso
+    PROFILING_MAX_STORED: int = 50  # se conservan los más recientes
+    PROFILING_SAMPLE_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_SPANS: int = 5000  # spans por perfil (el resto se cuenta como descartado)
 
     class Config:
         env_file = ".env"
@@ -1,227 +1,351 @@
 import os
-from typing import List, Dict, Any, Optional
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, Future, FIRST_COMPLETED
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Iterable, Callable, Set, cast
 from langchain_chroma import Chroma
-from langchain.schema import Document
+from langchain_core.documents import Document
 
 from src.config import settings
+from src.db.vector_store import VectorStore
+from src.utils.file_lock import FileLock
+from src.utils.metrics import track_stage
 
+if TYPE_CHECKING:
+    # chromadb se importa solo si hay servidor configurado
+    from chromadb.api import ClientAPI
+    from chromadb.api.types import PyEmbeddings
 
-class ChromaDBManager:
-    """Maneja todas las operaciones específicas de ChromaDB."""
+DEFAULT_COLLECTION = "langchain"  # Nombre por defecto de langchain-chroma
+ACTIVE_COLLECTION_FILE = "active_collection"
+REBUILD_LOCK_FILE = "rebuild.lock"
+DELETE_BATCH_SIZE = 5000  # por debajo del límite de lote de Chroma
+
+
+class ChromaDBManager(VectorStore):
+    """
+    Maneja todas las operaciones específicas de ChromaDB.
+    
+    Con varios workers, cada proceso detecta por mtime los cambios del archivo
+    active_collection y reabre la colección que otro worker haya activado tras
+    una reconstrucción. Si CHROMA_SERVER_HOST está configurado se usa un servidor
+    Chroma compartido en lugar del cliente persistente local.
+    """
+    
+    name = "ChromaDB"
     
     def __init__(self, persist_directory: str):
-        self.persist_directory = persist_directory
-        os.makedirs(persist_directory, exist_ok=True)
+        super().__init__(persist_directory)
         
-        # Inicializar embeddings
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=settings.EMBEDDING_MODEL,
-            google_api_key=settings.GOOGLE_API_KEY,
-            transport="rest",
-        )
+        # Solo un worker reconstruye a la vez
+        self._rebuild_lock = FileLock(os.path.join(persist_directory, REBUILD_LOCK_FILE))
+        self._client = self._create_client()
         
         # Inicializar base de datos
         self._init_db()
     
+    @staticmethod
+    def _create_client() -> Optional["ClientAPI"]:
+        """Cliente HTTP si hay un servidor Chroma configurado; None para usar el directorio local."""
+        if not settings.CHROMA_SERVER_HOST:
+            return None
+        import chromadb
+        print(f"[ChromaDB] Usando servidor Chroma en {settings.CHROMA_SERVER_HOST}:{settings.CHROMA_SERVER_PORT}")
+        return chromadb.HttpClient(host=settings.CHROMA_SERVER_HOST, port=settings.CHROMA_SERVER_PORT)
+    
     def _init_db(self):
         """Inicializa la base de datos ChromaDB."""
+        self._active_mtime = self._active_collection_mtime()
+        self.collection_name = self._read_active_collection()
         try:
-            self.db = Chroma(
-                persist_directory=self.persist_directory, 
-                embedding_function=self.embeddings
-            )
+            self._db = self._open_collection(self.collection_name)
         except Exception:
             # Fallback: crear/abrir igualmente
-            self.db = Chroma(
-                persist_directory=self.persist_directory, 
+            self._db = self._open_collection(self.collection_name)
+    
+    @property
+    def db(self) -> Chroma:
+        """Colección activa; se reabre si otro worker activó una colección nueva."""
+        if self._active_collection_mtime() != self._active_mtime:
+            with self._write_lock:
+                mtime = self._active_collection_mtime()
+                if mtime != self._active_mtime:
+                    collection_name = self._read_active_collection()
+                    if collection_name != self.collection_name:
+                        print(f"[ChromaDB] Colección activa cambiada por otro proceso: {collection_name}")
+                        self._db = self._open_collection(collection_name)
+                        self.collection_name = collection_name
+                        self._generation += 1
+                    self._active_mtime = mtime
+        return self._db
+    
+    def _open_collection(self, collection_name: str) -> Chroma:
+        """Abre (o crea) una colección en el directorio persistente o en el servidor."""
+        if self._client is not None:
+            return Chroma(
+                collection_name=collection_name,
+                client=self._client,
                 embedding_function=self.embeddings
             )
+        return Chroma(
+            collection_name=collection_name,
+            persist_directory=self.persist_directory, 
+            embedding_function=self.embeddings
+        )
     
-    def add_documents(self, chunks: List[Document], metadatas: List[Dict[str, Any]], ids: List[str]) -> None:
-        """Añade documentos a ChromaDB con estrategia de compatibilidad."""
+    def _active_collection_mtime(self) -> Optional[int]:
         try:
-            # Validar datos antes de insertar
-            self._validate_insertion_data(chunks, metadatas, ids)
-            
-            # Normalizar metadatos para consistencia
-            normalized_metadatas = self._normalize_metadata(metadatas)
-            
-            try:
-                print(f"[ChromaDB] Insertando {len(chunks)} chunks con add_documents")
-                self.db.add_documents(documents=chunks, metadatas=normalized_metadatas, ids=ids)
-                print(f"[ChromaDB] Inserción exitosa con add_documents")
-            except TypeError:
-                # Fallback para versiones de ChromaDB que requieren texts
-                print(f"[ChromaDB] Fallback: usando add_texts")
-                texts = [d.page_content for d in chunks]
-                self.db.add_texts(texts, metadatas=normalized_metadatas, ids=ids)  # type: ignore[arg-type]
-                print(f"[ChromaDB] Inserción exitosa con add_texts")
-                
-        except Exception as e:
-            raise RuntimeError(f"Error al añadir documentos a ChromaDB: {str(e)}")
+            return os.stat(os.path.join(self.persist_directory, ACTIVE_COLLECTION_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
     
-    def _validate_insertion_data(self, chunks: List[Document], metadatas: List[Dict[str, Any]], ids: List[str]) -> None:
-        """Valida que los datos de inserción sean consistentes."""
-        if len(chunks) != len(metadatas) or len(chunks) != len(ids):
-            raise ValueError(f"Longitudes inconsistentes: chunks={len(chunks)}, metadatas={len(metadatas)}, ids={len(ids)}")
-        
-        if not chunks:
-            raise ValueError("No hay chunks para insertar")
-        
-        # Verificar que los IDs sean únicos
-        if len(set(ids)) != len(ids):
-            raise ValueError("IDs duplicados encontrados")
-        
-        # Verificar que los metadatos tengan las claves requeridas
-        required_keys = {"doc_id", "filename", "chunk_index"}
-        for i, metadata in enumerate(metadatas):
-            missing_keys = required_keys - set(metadata.keys())
-            if missing_keys:
-                raise ValueError(f"Metadatos incompletos en chunk {i}: faltan {missing_keys}")
+    def _read_active_collection(self) -> str:
+        """Lee el nombre de la colección activa (cambia tras cada reconstrucción)."""
+        try:
+            with open(os.path.join(self.persist_directory, ACTIVE_COLLECTION_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or DEFAULT_COLLECTION
+        except FileNotFoundError:
+            return DEFAULT_COLLECTION
+    
+    def _write_active_collection(self, collection_name: str) -> None:
+        """Guarda de forma atómica el nombre de la colección activa."""
+        path = os.path.join(self.persist_directory, ACTIVE_COLLECTION_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(collection_name)
+        os.replace(tmp_path, path)
+    
+    def _store_batch(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Inserta el lote en la colección activa: queda consultable antes de acabar el documento."""
+        self._upsert_batch(self.db, ids, embeddings, texts, metadatas)
     
-    def _normalize_metadata(self, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Normaliza metadatos para asegurar tipos consistentes."""
-        normalized: List[Dict[str, Any]] = []
-        for metadata in metadatas:
-            # Crear copia y asegurar que todos los valores sean strings
-            normalized_meta: Dict[str, Any] = {}
-            for key, value in metadata.items():
-                if isinstance(value, (int, float, bool)):
-                    normalized_meta[key] = str(value)
-                elif isinstance(value, str):
-                    normalized_meta[key] = value
-                else:
-                    normalized_meta[key] = str(value)
-            normalized.append(normalized_meta)
-        return normalized
+    def _upsert_batch(self, db: Chroma, ids: List[str], embeddings: List[Any], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Inserta un lote con embeddings ya calculados directamente en la colección."""
+        db._collection.upsert(  # type: ignore[attr-defined]
+            ids=ids,
+            embeddings=embeddings,  # type: ignore[arg-type]
+            documents=texts,
+            metadatas=metadatas,  # type: ignore[arg-type]
+        )
     
     def delete_by_metadata(self, where: Dict[str, Any]) -> None:
-        """Elimina documentos por metadata con estrategia robusta."""
+        """
+        Elimina documentos por metadata en una sola operación.
+        
+        Se usa cuando no se conocen los IDs (p.ej. documentos que no terminaron de
+        indexarse); si se conocen, delete_document_chunks es más barato.
+        """
         try:
-            # Primero verificar qué documentos existen antes de eliminar
-            results = self.db.get(where=where, include=["metadatas", "documents"])
-            
-            if not results or not results.get("ids"):
-                print(f"[ChromaDB] No se encontraron documentos para eliminar con filtro: {where}")
-                return
-            
-            ids_to_delete = results["ids"]
-            print(f"[ChromaDB] Eliminando {len(ids_to_delete)} documentos con filtro: {where}")
-            
-            # Estrategia 1: Eliminar por IDs específicos (más preciso que por metadata)
-            try:
-                print(f"[ChromaDB] Intentando eliminación por IDs: {ids_to_delete[:3]}...")  # Mostrar solo los primeros 3
-                self.db.delete(ids=ids_to_delete)
-                
-                # Verificar que la eliminación fue exitosa
-                verification = self.db.get(where=where, include=["metadatas"])
-                if verification and verification.get("ids"):
-                    remaining_ids = verification["ids"]
-                    print(f"[ChromaDB] ADVERTENCIA: {len(remaining_ids)} documentos permanecen después de eliminación por IDs")
-                    # Fallback: usar where como respaldo
-                    self.db.delete(where=where)
-                    # Forzar persistencia para procesar cola
-                    self._force_persistence()
-                    # Verificación final
-                    final_verification = self.db.get(where=where, include=["metadatas"])
-                    if final_verification and final_verification.get("ids"):
-                        raise RuntimeError(f"Eliminación fallida: {len(final_verification['ids'])} documentos permanecen")
-                
-                print(f"[ChromaDB] Eliminación exitosa: {len(ids_to_delete)} documentos eliminados por IDs")
-                
-            except Exception as e:
-                print(f"[ChromaDB] Error en eliminación por IDs, intentando por metadata: {str(e)}")
-                # Fallback: eliminar usando where
-                self.db.delete(where=where)
-                # Forzar persistencia
-                self._force_persistence()
-                
-                # Verificación final después del fallback
-                verification = self.db.get(where=where, include=["metadatas"])
-                if verification and verification.get("ids"):
-                    remaining_ids = verification["ids"]
-                    print(f"[ChromaDB] ADVERTENCIA: {len(remaining_ids)} documentos no fueron eliminados después del fallback")
-                    raise RuntimeError(f"Eliminación incompleta: {len(remaining_ids)} documentos permanecen")
-                
-                print(f"[ChromaDB] Eliminación exitosa por fallback: {len(ids_to_delete)} documentos eliminados")
-                
+            self.db._collection.delete(where=where)  # type: ignore[attr-defined]
+            print(f"[ChromaDB] Eliminados los chunks con filtro: {where}")
         except Exception as e:
             raise RuntimeError(f"Error al eliminar documentos de ChromaDB: {str(e)}")
     
-    def _force_persistence(self) -> None:
-        """Fuerza la persistencia para procesar la cola de embeddings."""
+    def delete_ids(self, ids: List[str]) -> None:
+        """Elimina chunks por ID, en lotes de DELETE_BATCH_SIZE."""
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            self.db._collection.delete(ids=ids[start:start + DELETE_BATCH_SIZE])  # type: ignore[attr-defined]
+    
+    def delete_document_chunks(self, doc_id: str, chunk_count: int, verify: bool = False) -> None:
+        """
+        Elimina los chunks de un documento usando sus IDs deterministas ({doc_id}_{i}).
+        
+        No hace falta consultar la colección antes de borrar; la verificación
+        opcional solo pide IDs (sin textos ni metadatos).
+        
+        Args:
+            doc_id: ID del documento
+            chunk_count: Número de chunks registrado en el índice
+            verify: Si se comprueba que no queda ningún chunk del documento
+            
+        Raises:
+            RuntimeError: Si falla la eliminación o la verificación encuentra restos
+        """
         try:
-            if hasattr(self.db, '_client') and hasattr(self.db._client, 'persist'):  # type: ignore[misc]
-                self.db._client.persist()  # type: ignore[attr-defined]
-                print("[ChromaDB] Persistencia forzada para procesar cola de embeddings")
+            with track_stage("vector_delete", items=chunk_count):
+                self.delete_ids([f"{doc_id}_{i}" for i in range(chunk_count)])
         except Exception as e:
-            print(f"[ChromaDB] Error al forzar persistencia: {str(e)}")
+            raise RuntimeError(f"Error al eliminar documentos de ChromaDB: {str(e)}")
+        
+        if not verify:
+            return
+        with track_stage("delete_verify"):
+            deleted = self.verify_document_deleted(doc_id)
+        if not deleted:
+            # Chunks fuera del rango conocido: borrar por metadata como respaldo
+            self.delete_by_metadata({"doc_id": doc_id})
     
-    def get_retriever(self, search_kwargs: Dict[str, Any]):
-        """Retorna un retriever configurado."""
-        return self.db.as_retriever(search_kwargs=search_kwargs)
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Abre la colección activa y consulta con un vector ya guardado.
+
+        La consulta carga el índice HNSW del segmento en memoria sin llamar a la API
+        de embeddings.
+        """
+        collection = self.db._collection  # type: ignore[attr-defined]
+        count = collection.count()
+        if count:
+            sample = collection.get(limit=1, include=["embeddings"])
+            embeddings = sample.get("embeddings")
+            if embeddings is not None and len(embeddings):
+                collection.query(query_embeddings=[list(embeddings[0])], n_results=1, include=[])
+        return {"collection": self.collection_name, "chunks": count}
+
+    def search_by_vectors(self, vectors: List[List[float]], k: int, where: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """
+        Busca los k chunks más similares a cada vector con una sola consulta a Chroma.
+        
+        Args:
+            vectors: Embeddings de las consultas
+            k: Número de resultados por consulta
+            where: Filtro de metadata opcional (p.ej. {"doc_id": ...})
+            
+        Returns:
+            Por consulta, lista de documentos ordenados por similitud
+        """
+        if not vectors:
+            return []
+        results = self.db._collection.query(  # type: ignore[attr-defined]
+            query_embeddings=cast("PyEmbeddings", vectors),
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas"],
+        )
+        return [
+            [
+                Document(id=chunk_id, page_content=text or "", metadata=metadata or {})
+                for chunk_id, text, metadata in zip(ids, texts or [], metadatas or [])
+            ]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"] or [], results["metadatas"] or [])
+        ]
     
-    def rebuild_from_documents(self, all_chunks: List[Any], all_metas: List[Dict[str, Any]]) -> None:
-        """Reconstruye la base de datos desde cero para eliminar registros huérfanos."""
-        try:
-            print("[ChromaDB] Iniciando reconstrucción completa de la base de datos...")
+    def rebuild_from_stream(
+        self,
+        documents: Iterable[Tuple[List[Document], List[Dict[str, Any]], List[str]]],
+        total_documents: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, int]:
+        """
+        Reconstruye la base en una colección nueva, documento a documento, y la activa al final.
+        
+        Cada documento se procesa en lotes de EMBEDDING_BATCH_SIZE; los vectores que ya
+        existen en la colección actual (mismo id y mismo texto) se reutilizan y solo se
+        embeben los que faltan. Los lotes a embeber se envían a un pool compartido, con
+        hasta EMBEDDING_CONCURRENCY en vuelo también entre documentos. La colección
+        anterior sigue atendiendo consultas hasta el cambio, que es atómico, y después
+        se elimina.
+        
+        Args:
+            documents: Iterable de (chunks, metadatos, ids) por documento
+            total_documents: Número total de documentos (solo para informar progreso)
+            on_progress: Callback opcional que recibe las estadísticas tras cada documento
             
-            # Estrategia: eliminar colección y recrear para limpiar completamente embeddings_queue
-            collection_name = "langchain"  # Nombre por defecto de langchain-chroma
+        Returns:
+            Estadísticas: documents, chunks, reused, embedded
+        """
+        with self._rebuild_lock, self._write_lock:
+            print("[ChromaDB] Iniciando reconstrucción incremental de la base de datos...")
+            old_db = self.db
+            new_name = f"{DEFAULT_COLLECTION}_{uuid.uuid4().hex[:8]}"
+            new_db = self._open_collection(new_name)
+            stats = {"documents": 0, "chunks": 0, "reused": 0, "embedded": 0}
+            batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+            workers = max(1, settings.EMBEDDING_CONCURRENCY)
             
             try:
-                # Intentar eliminar la colección existente si existe
-                if hasattr(self.db, '_client'):
-                    client = self.db._client  # type: ignore[attr-defined]
-                    if hasattr(client, 'delete_collection'):
-                        try:
-                            client.delete_collection(name=collection_name)  # type: ignore[attr-defined]
-                            print("[ChromaDB] Colección existente eliminada")
-                        except Exception:
-                            print("[ChromaDB] No se pudo eliminar colección (puede no existir)")
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as executor:
+                    in_flight: Dict[Future[List[List[float]]], Tuple[List[str], List[str], List[Dict[str, Any]]]] = {}
+                    
+                    def drain() -> None:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            batch_ids, batch_texts, batch_metas = in_flight.pop(future)
+                            vectors = future.result()
+                            with track_stage("vector_upsert", items=len(batch_ids)):
+                                self._upsert_batch(new_db, batch_ids, vectors, batch_texts, batch_metas)
+                    
+                    try:
+                        for chunks, metas, ids in documents:
+                            self._validate_insertion_data(chunks, metas, ids)
+                            texts = [d.page_content for d in chunks]
+                            normalized_metadatas = self._normalize_metadata(metas)
+                            
+                            for start in range(0, len(ids), batch_size):
+                                end = min(start + batch_size, len(ids))
+                                reused = self._reuse_stored_vectors(old_db, new_db, ids[start:end], texts[start:end], normalized_metadatas[start:end])
+                                missing = [i for i in range(start, end) if ids[i] not in reused]
+                                if missing:
+                                    missing_texts = [texts[i] for i in missing]
+                                    future = executor.submit(contextvars.copy_context().run, self._embed_documents, missing_texts)
+                                    in_flight[future] = ([ids[i] for i in missing], missing_texts, [normalized_metadatas[i] for i in missing])
+                                    if len(in_flight) >= workers:
+                                        drain()
+                                stats["reused"] += len(reused)
+                                stats["embedded"] += len(missing)
+                            
+                            stats["documents"] += 1
+                            stats["chunks"] += len(ids)
+                            total = f"/{total_documents}" if total_documents is not None else ""
+                            print(f"[ChromaDB] Reconstrucción: {stats['documents']}{total} documentos, {stats['chunks']} chunks ({stats['reused']} vectores reutilizados)")
+                            if on_progress:
+                                on_progress(dict(stats))
+                        while in_flight:
+                            drain()
+                    except Exception:
+                        for pending in in_flight:
+                            pending.cancel()
+                        raise
             except Exception as e:
-                print(f"[ChromaDB] Error al eliminar colección: {str(e)}")
+                print(f"[ChromaDB] Error durante reconstrucción, se conserva la colección actual: {str(e)}")
+                try:
+                    new_db.delete_collection()
+                except Exception:
+                    pass
+                raise
+            
+            # Cambio atómico: las consultas pasan a la colección nueva en una sola asignación
+            self._write_active_collection(new_name)
+            self._db = new_db
+            self.collection_name = new_name
+            self._active_mtime = self._active_collection_mtime()
+            self._generation += 1
             
-            # Crear nueva base de datos limpia
-            if all_chunks and all_metas:
-                print(f"[ChromaDB] Recreando base con {len(all_chunks)} chunks...")
-                new_db = Chroma.from_documents(  # type: ignore[misc]
-                    all_chunks, 
-                    embedding=self.embeddings, 
-                    persist_directory=self.persist_directory
-                )
-                self.db = new_db
-                print("[ChromaDB] Reconstrucción completada exitosamente")
-            else:
-                # Si no hay documentos, crear base vacía
-                print("[ChromaDB] Creando base de datos vacía...")
-                self.db = Chroma(
-                    persist_directory=self.persist_directory, 
-                    embedding_function=self.embeddings
-                )
-                print("[ChromaDB] Base de datos vacía creada")
-                
-        except Exception as e:
-            print(f"[ChromaDB] Error durante reconstrucción: {str(e)}")
-            # Fallback: intentar recrear base vacía
             try:
-                self.db = Chroma(
-                    persist_directory=self.persist_directory, 
-                    embedding_function=self.embeddings
-                )
-                print("[ChromaDB] Fallback: base de datos vacía creada")
-            except Exception as fallback_error:
-                print(f"[ChromaDB] Error crítico en fallback: {str(fallback_error)}")
-                raise
-    
-    def is_persisted(self) -> bool:
-        """Verifica si la base de datos está persistida."""
-        return os.path.isdir(self.persist_directory) and bool(os.listdir(self.persist_directory))
+                old_db.delete_collection()
+            except Exception as e:
+                print(f"[ChromaDB] No se pudo eliminar la colección anterior: {str(e)}")
+            
+            print("[ChromaDB] Reconstrucción completada exitosamente")
+            return stats
     
-    def get_embeddings(self):
-        """Retorna la instancia de embeddings."""
-        return self.embeddings
+    def _reuse_stored_vectors(self, old_db: Chroma, new_db: Chroma, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> Set[str]:
+        """Copia a la colección nueva los vectores ya almacenados cuyo texto no cambió."""
+        try:
+            stored = old_db._collection.get(ids=ids, include=["embeddings", "documents"])  # type: ignore[attr-defined]
+        except Exception:
+            return set()
+        
+        stored_embeddings = stored.get("embeddings")
+        stored_documents = stored.get("documents")
+        if stored_embeddings is None or stored_documents is None:
+            return set()
+        
+        by_id = {stored_id: (emb, doc) for stored_id, emb, doc in zip(stored["ids"], stored_embeddings, stored_documents)}
+        reuse_ids: List[str] = []
+        reuse_embeddings: List[Any] = []
+        reuse_texts: List[str] = []
+        reuse_metas: List[Dict[str, Any]] = []
+        for chunk_id, text, meta in zip(ids, texts, metadatas):
+            found = by_id.get(chunk_id)
+            if found is not None and found[1] == text:
+                reuse_ids.append(chunk_id)
+                reuse_embeddings.append(found[0])
+                reuse_texts.append(text)
+                reuse_metas.append(meta)
+        
+        if reuse_ids:
+            self._upsert_batch(new_db, reuse_ids, reuse_embeddings, reuse_texts, reuse_metas)
+        return set(reuse_ids)
     
     def verify_document_deleted(self, doc_id: str) -> bool:
         """
@@ -234,15 +358,9 @@ class ChromaDBManager:
             True si el documento fue completamente eliminado
         """
         try:
-            results = self.db.get(
-                where={"doc_id": doc_id}, 
-                include=["metadatas", "documents"]
-            )
-            
-            if not results or not results.get("ids"):
-                return True  # No se encontraron documentos, eliminación exitosa
-            
-            remaining_count = len(results["ids"])
+            remaining_count = self.count_document_chunks(doc_id)
+            if remaining_count == 0:
+                return True
             print(f"[ChromaDB] ADVERTENCIA: {remaining_count} chunks del documento {doc_id} aún existen")
             return False
             
@@ -261,104 +379,36 @@ class ChromaDBManager:
             Número de chunks encontrados
         """
         try:
-            results = self.db.get(
-                where={"doc_id": doc_id}, 
-                include=["metadatas"]
-            )
-            
-            if not results or not results.get("ids"):
-                return 0
-            
-            return len(results["ids"])
+            # include=[]: solo IDs, sin cargar textos, metadatos ni vectores
+            results = self.db._collection.get(where={"doc_id": doc_id}, include=[])  # type: ignore[attr-defined]
+            return len(results.get("ids") or [])
             
         except Exception:
             return 0
     
-    def cleanup_embeddings_queue(self) -> bool:
+    def scan_document_chunks(self, page_size: int = 1000) -> Dict[str, List[str]]:
         """
-        Limpia la cola de embeddings que podrían quedar después de eliminaciones.
-        Implementa múltiples estrategias para evitar vectores vacíos en embeddings_queue.
+        Recorre la colección y agrupa los IDs de chunks por doc_id.
         
-        Returns:
-            True si la limpieza fue exitosa
-        """
-        try:
-            print("[ChromaDB] Iniciando limpieza intensiva de cola de embeddings...")
-            
-            # Estrategia 1: Forzar persistencia múltiple
-            success_count = 0
-            for attempt in range(3):
-                try:
-                    if hasattr(self.db, '_client'):
-                        client = self.db._client  # type: ignore[attr-defined]
-                        
-                        # Intentar diferentes métodos de limpieza
-                        if hasattr(client, 'persist'):
-                            client.persist()  # type: ignore[attr-defined]
-                            success_count += 1
-                            
-                        # Pequeña pausa entre intentos
-                        import time
-                        time.sleep(0.1)
-                        
-                except Exception as e:
-                    print(f"[ChromaDB] Intento {attempt + 1} de limpieza falló: {str(e)}")
-                    continue
-            
-            if success_count > 0:
-                print(f"[ChromaDB] Cola de embeddings limpiada exitosamente ({success_count}/3 intentos)")
-                
-                # Estrategia 2: Verificar que no hay registros huérfanos
-                try:
-                    # Intentar obtener registros con metadata vacía o inconsistente
-                    all_records = self.db.get(include=["metadatas", "documents"])
-                    if all_records and all_records.get("ids"):
-                        empty_metadata_count = 0
-                        for metadata in all_records.get("metadatas", []):
-                            if not metadata or not metadata.get("doc_id"):
-                                empty_metadata_count += 1
-                        
-                        if empty_metadata_count > 0:
-                            print(f"[ChromaDB] ADVERTENCIA: {empty_metadata_count} registros con metadata vacía detectados")
-                            # Estos registros problemáticos requerirían reconstrucción de la base
-                            return False
-                        
-                except Exception as e:
-                    print(f"[ChromaDB] Error al verificar registros huérfanos: {str(e)}")
-                
-                return True
-            else:
-                print("[ChromaDB] No se pudo acceder a métodos de limpieza de cola")
-                return False
-                
-        except Exception as e:
-            print(f"[ChromaDB] Error al limpiar cola de embeddings: {str(e)}")
-            return False
-    
-    def get_document_hash(self, doc_id: str) -> Optional[str]:
-        """
-        Obtiene un hash del documento para detectar duplicados.
+        Solo pide metadatos, por páginas, así que está pensado para el reconciliador
+        en segundo plano, no para el camino de las peticiones.
         
         Args:
-            doc_id: ID del documento
+            page_size: Registros por consulta
             
         Returns:
-            Hash del contenido del documento o None si no existe
+            IDs de chunks agrupados por doc_id ("" si no tienen doc_id)
         """
-        try:
-            results = self.db.get(
-                where={"doc_id": doc_id}, 
-                include=["documents", "metadatas"]
-            )
-            
-            if not results or not results.get("documents"):
-                return None
-            
-            # Crear hash basado en el contenido de todos los chunks
-            import hashlib
-            content = "".join(results["documents"])
-            return hashlib.md5(content.encode()).hexdigest()
-            
-        except Exception as e:
-            print(f"[ChromaDB] Error al obtener hash del documento: {str(e)}")
-            return None
+        chunks_by_doc: Dict[str, List[str]] = {}
+        collection = self.db._collection  # type: ignore[attr-defined]
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            for chunk_id, metadata in zip(ids, page.get("metadatas") or []):
+                doc_id = (metadata or {}).get("doc_id") or ""
+                chunks_by_doc.setdefault(str(doc_id), []).append(chunk_id)
+            offset += len(ids)
+        return chunks_by_doc
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+import time
+from array import array
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Máximo de parámetros por consulta IN (...) para no superar el límite de SQLite
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings con una caché persistente en disco.
+
+    Las claves son sha256(modelo + texto), de modo que un mismo chunk nunca se
+    vuelve a embeber mientras siga en caché (reconstrucciones, re-subidas de un
+    PDF borrado, etc.). Los vectores se guardan como float32 en SQLite y se
+    expulsan por LRU cuando el tamaño total supera max_bytes.
+
+    Los embeddings de consultas usan otro task type en Gemini, así que solo se
+    cachean si cache_queries=True y siempre bajo un espacio de claves distinto.
+    """
+
+    def __init__(self, inner: Embeddings, db_path: str, model: str, max_bytes: int, cache_queries: bool = False):
+        self.inner = inner
+        self.db_path = db_path
+        self.model = model
+        self.max_bytes = max_bytes
+        self.cache_queries = cache_queries
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " nbytes INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+        self._total_bytes: int = row[0]
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows],
+                    )
+            self._conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            for key, blob in rows:
+                previous = self._conn.execute("SELECT nbytes FROM embeddings WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_access) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), now),
+                )
+                self._total_bytes += len(blob) - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Expulsa las entradas menos usadas hasta quedar por debajo del 90% del límite."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Otros workers escriben en el mismo archivo: recalcular el tamaño real antes de expulsar
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        victims: List[str] = []
+        freed = 0
+        for key, nbytes in self._conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_access"):
+            if self._total_bytes - freed <= target:
+                break
+            victims.append(key)
+            freed += nbytes
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key in victims])
+        self._total_bytes -= freed
+        print(f"[EmbeddingCache] Expulsadas {len(victims)} entradas ({freed} bytes)")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        # Embeber solo los textos que faltan (una vez por texto distinto)
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        with self._lock:
+            self.hits += len(texts) - sum(1 for key in keys if key in missing)
+            self.misses += sum(1 for key in keys if key in missing)
+
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        if not self.cache_queries:
+            return self.inner.embed_query(text)
+
+        key = self._key(f"query\0{text}")
+        cached = self._lookup([key])
+        if key in cached:
+            with self._lock:
+                self.hits += 1
+            return cached[key]
+
+        with self._lock:
+            self.misses += 1
+        vector = self.inner.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Varias consultas a la vez: las que no están en caché se embeben en un solo lote."""
+        from src.db.embeddings import embed_query_batch
+
+        if not self.cache_queries:
+            return embed_query_batch(self.inner, texts)
+
+        keys = [self._key(f"query\0{text}") for text in texts]
+        cached = self._lookup(list(set(keys)))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        with self._lock:
+            self.hits += len(texts) - sum(1 for key in keys if key in missing)
+            self.misses += sum(1 for key in keys if key in missing)
+
+        if missing:
+            computed = dict(zip(missing.keys(), embed_query_batch(self.inner, list(missing.values()))))
+            self._store(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna estadísticas de la caché.
+
+        Returns:
+            Diccionario con hits, misses, hit_rate, bytes y entries
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "entries": entries,
+            }
+
+    def close(self) -> None:
+        """Cierra la conexión SQLite."""
+        with self._lock:
+            self._conn.close()
+
+
+def cache_model_name(embeddings: Embeddings, fallback: Optional[str] = None) -> str:
+    """Nombre del modelo para la clave de caché (distinto por proveedor y dimensión)."""
+    size = getattr(embeddings, "size", None)
+    if size is not None:
+        return f"{type(embeddings).__name__}-{size}"
+    return getattr(embeddings, "model", None) or fallback or type(embeddings).__name__
@@ -0,0 +1,136 @@
+import hashlib
+import math
+import random
+import re
+import sys
+import time
+from typing import TYPE_CHECKING, List, Optional, Protocol, TypeGuard, runtime_checkable
+
+from langchain_core.embeddings import Embeddings
+
+from src.config import settings
+
+if TYPE_CHECKING:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@runtime_checkable
+class QueryBatchEmbeddings(Protocol):
+    """Embeddings que calculan varias consultas en una sola llamada (FakeEmbeddings, CachedEmbeddings)."""
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]: ...
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embeddings locales y deterministas (sin red) para pruebas y benchmarks.
+
+    Usa el "hashing trick" sobre las palabras del texto, así que textos con
+    vocabulario parecido producen vectores cercanos. La latencia simulada
+    permite medir la concurrencia del pipeline de ingesta sin la API de Google.
+    """
+
+    def __init__(self, size: int = 256, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.size = size
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def _simulate_latency(self) -> None:
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for token in _TOKEN_RE.findall(text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._simulate_latency()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._simulate_latency()
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Varias consultas en una sola "llamada" (una sola latencia simulada)."""
+        self._simulate_latency()
+        return [self._embed(text) for text in texts]
+
+
+def embed_query_batch(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embebe varias consultas en una sola petición cuando el proveedor lo permite.
+
+    Gemini acepta un lote con task_type="retrieval_query" (el mismo que usa su
+    embed_query); FakeEmbeddings y CachedEmbeddings exponen embed_queries. Con
+    cualquier otro proveedor se hace una llamada por consulta.
+
+    Args:
+        embeddings: Modelo de embeddings
+        texts: Consultas
+
+    Returns:
+        Un vector por consulta, en el mismo orden
+    """
+    if not texts:
+        return []
+    if isinstance(embeddings, QueryBatchEmbeddings):
+        return embeddings.embed_queries(texts)
+    if _is_google_embeddings(embeddings):
+        return embeddings.embed_documents(texts, task_type="retrieval_query")
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def _is_google_embeddings(embeddings: Embeddings) -> "TypeGuard[GoogleGenerativeAIEmbeddings]":
+    # Solo puede serlo si el SDK ya está importado; así no se importa con otros proveedores
+    module = sys.modules.get("langchain_google_genai")
+    return module is not None and isinstance(embeddings, module.GoogleGenerativeAIEmbeddings)
+
+
+def build_embeddings(cache_path: Optional[str] = None) -> Embeddings:
+    """
+    Crea el modelo de embeddings según settings.EMBEDDING_PROVIDER.
+
+    Args:
+        cache_path: Ruta del archivo SQLite de la caché persistente de embeddings
+            (None o EMBEDDING_CACHE_ENABLED=False para no cachear)
+
+    Returns:
+        Embeddings de Google Gemini ("google") o locales deterministas ("fake")
+    """
+    embeddings: Embeddings
+    if settings.EMBEDDING_PROVIDER == "fake":
+        embeddings = FakeEmbeddings(
+            size=settings.FAKE_EMBEDDING_SIZE,
+            latency_ms=settings.FAKE_EMBEDDING_LATENCY_MS,
+            jitter_ms=settings.FAKE_EMBEDDING_JITTER_MS,
+        )
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        embeddings = GoogleGenerativeAIEmbeddings(
+            model=settings.EMBEDDING_MODEL,
+            google_api_key=settings.GOOGLE_API_KEY,
+            transport="rest",
+        )
+
+    if cache_path and settings.EMBEDDING_CACHE_ENABLED:
+        from src.db.embedding_cache import CachedEmbeddings, cache_model_name
+
+        embeddings = CachedEmbeddings(
+            embeddings,
+            db_path=cache_path,
+            model=cache_model_name(embeddings, settings.EMBEDDING_MODEL),
+            max_bytes=settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+            cache_queries=settings.QUERY_EMBEDDING_DISK_CACHE,
+        )
+
+    return embeddings
@@ -0,0 +1,424 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterable, Callable
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import settings
+from src.db.vector_store import VectorStore
+from src.utils.doc_ids import is_valid_doc_id, validate_doc_id
+from src.utils.file_lock import FileLock
+from src.utils.metrics import track_stage
+
+VECTORS_DIR = "vectors"
+REBUILD_LOCK_FILE = "rebuild.lock"
+
+
+def _normalize_rows(vectors: Any) -> np.ndarray:
+    """Convierte a float32 y normaliza cada fila (la similitud coseno queda como producto escalar)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class _StoredDocument:
+    """Matriz (mapeada en memoria) y registros de un documento ya publicado."""
+
+    def __init__(self, mtime_ns: int, matrix: np.ndarray, records: List[Dict[str, Any]]):
+        self.mtime_ns = mtime_ns
+        self.matrix = matrix
+        self.records = records
+
+
+class _DocumentWriter:
+    """
+    Escribe los vectores de un documento lote a lote y los publica al final.
+
+    Los vectores se añaden a un archivo binario temporal y los registros (id, texto
+    y metadatos) a un JSONL temporal; commit() convierte el binario en un .npy y
+    reemplaza los archivos publicados con os.replace, así que los lectores ven el
+    documento anterior o el nuevo completo, nunca uno a medias.
+    """
+
+    def __init__(self, store: "NumpyVectorStore", doc_id: str):
+        self.store = store
+        self.doc_id = doc_id
+        self.rows = 0
+        self.dim: Optional[int] = None
+        self._raw_path = f"{store.matrix_path(doc_id)}.f32.tmp"
+        self._records_tmp = f"{store.records_path(doc_id)}.tmp"
+        self._raw = open(self._raw_path, "wb")
+        self._records = open(self._records_tmp, "w", encoding="utf-8")
+
+    def add(self, ids: List[str], vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Dimensión de embeddings inconsistente: {vectors.shape[1]} != {self.dim}")
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(self._raw)
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            self._records.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False))
+            self._records.write("\n")
+        self.rows += len(ids)
+
+    def commit(self) -> None:
+        self._raw.close()
+        self._records.close()
+        matrix_path = self.store.matrix_path(self.doc_id)
+        matrix_tmp = f"{matrix_path}.tmp"
+        try:
+            raw = np.memmap(self._raw_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim or 0))
+            # np.save copia desde el memmap sin cargar la matriz entera en memoria
+            with open(matrix_tmp, "wb") as f:
+                np.save(f, raw)
+            del raw
+            # Primero los registros y después la matriz: su mtime es la versión del documento
+            os.replace(self._records_tmp, self.store.records_path(self.doc_id))
+            os.replace(matrix_tmp, matrix_path)
+        finally:
+            for path in (self._raw_path, self._records_tmp, matrix_tmp):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def abort(self) -> None:
+        self._raw.close()
+        self._records.close()
+        for path in (self._raw_path, self._records_tmp):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Almacén vectorial en proceso con NumPy.
+
+    Cada documento se guarda como una matriz float32 de vectores normalizados en
+    {persist_directory}/vectors/{doc_id}.npy, junto a un {doc_id}.jsonl con IDs,
+    textos y metadatos. Las matrices se abren mapeadas en memoria (sin coste de
+    arranque) y la búsqueda es exacta: similitud coseno vectorizada y top-k con
+    argpartition. Pensado para pocos documentos, donde un índice HNSW sobra.
+
+    Limitación frente a Chroma: los lotes de una ingesta se escriben en archivos
+    temporales y el documento se publica entero al terminar, así que no aparece en
+    las búsquedas hasta que termina de indexarse (el progreso sí avanza por lotes).
+    Volver a indexarlo reemplaza todos sus chunks. Con varios workers, cada proceso
+    detecta por mtime los documentos publicados por otro.
+    """
+
+    name = "NumpyStore"
+
+    def __init__(self, persist_directory: str):
+        super().__init__(persist_directory)
+        self.directory = os.path.join(persist_directory, VECTORS_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Solo un worker reconstruye a la vez
+        self._rebuild_lock = FileLock(os.path.join(persist_directory, REBUILD_LOCK_FILE))
+        # Escritores abiertos por doc_id: cada ingesta solo publica o descarta los suyos
+        self._writers: Dict[str, _DocumentWriter] = {}
+        self._documents: Dict[str, _StoredDocument] = {}
+        self._cache_lock = Lock()
+
+    def matrix_path(self, doc_id: str) -> str:
+        """
+        Ruta de la matriz publicada de un documento.
+
+        Raises:
+            ValueError: Si doc_id no es un UUID (evita rutas fuera del directorio)
+        """
+        return os.path.join(self.directory, f"{validate_doc_id(doc_id)}.npy")
+
+    def records_path(self, doc_id: str) -> str:
+        """
+        Ruta de los registros (id, texto, metadatos) publicados de un documento.
+
+        Raises:
+            ValueError: Si doc_id no es un UUID (evita rutas fuera del directorio)
+        """
+        return os.path.join(self.directory, f"{validate_doc_id(doc_id)}.jsonl")
+
+    def list_documents(self) -> List[str]:
+        """Retorna los doc_ids con vectores publicados."""
+        doc_ids = [name[:-len(".npy")] for name in os.listdir(self.directory) if name.endswith(".npy")]
+        return [doc_id for doc_id in doc_ids if is_valid_doc_id(doc_id)]
+
+    def _load(self, doc_id: str) -> Optional[_StoredDocument]:
+        """Abre (o reutiliza si no cambió en disco) la matriz y los registros de un documento."""
+        if not is_valid_doc_id(doc_id):
+            return None
+        try:
+            mtime_ns = os.stat(self.matrix_path(doc_id)).st_mtime_ns
+        except FileNotFoundError:
+            with self._cache_lock:
+                self._documents.pop(doc_id, None)
+            return None
+
+        with self._cache_lock:
+            cached = self._documents.get(doc_id)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            return cached
+
+        try:
+            matrix = np.load(self.matrix_path(doc_id), mmap_mode="r")
+            with open(self.records_path(doc_id), "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except (FileNotFoundError, ValueError):
+            # Otro proceso está publicando o eliminando el documento
+            return None
+        if matrix.shape[0] != len(records):
+            return None
+
+        stored = _StoredDocument(mtime_ns, matrix, records)
+        with self._cache_lock:
+            self._documents[doc_id] = stored
+        return stored
+
+    def warm_up(self) -> Dict[str, Any]:
+        """Abre las matrices de todos los documentos y las recorre para traerlas a la caché de páginas."""
+        documents = 0
+        chunks = 0
+        for doc_id in self.list_documents():
+            stored = self._load(doc_id)
+            if stored is None:
+                continue
+            float(np.sum(stored.matrix))
+            documents += 1
+            chunks += len(stored.records)
+        return {"documents": documents, "chunks": chunks}
+
+    # ---------- escritura ----------
+    def _store_batch(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Añade el lote al archivo temporal de su documento (se publica en _finish_stream)."""
+        vectors = _normalize_rows(embeddings)
+        by_doc: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            by_doc.setdefault(metadata["doc_id"], []).append(i)
+        for doc_id, rows in by_doc.items():
+            writer = self._writers.get(doc_id)
+            if writer is None:
+                writer = self._writers[doc_id] = _DocumentWriter(self, doc_id)
+            writer.add([ids[i] for i in rows], vectors[rows], [texts[i] for i in rows], [metadatas[i] for i in rows])
+
+    def _finish_stream(self, doc_ids: Set[str]) -> None:
+        for doc_id in doc_ids:
+            writer = self._writers.pop(doc_id, None)
+            if writer is not None:
+                writer.commit()
+
+    def _abort_stream(self, doc_ids: Set[str]) -> None:
+        for doc_id in doc_ids:
+            writer = self._writers.pop(doc_id, None)
+            if writer is not None:
+                writer.abort()
+
+    def _write_document(self, doc_id: str, ids: List[str], vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Publica de una vez todos los chunks de un documento."""
+        writer = _DocumentWriter(self, doc_id)
+        try:
+            writer.add(ids, vectors, texts, metadatas)
+            writer.commit()
+        except Exception:
+            writer.abort()
+            raise
+
+    def rebuild_from_stream(
+        self,
+        documents: Iterable[Tuple[List[Document], List[Dict[str, Any]], List[str]]],
+        total_documents: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, int]:
+        """
+        Reescribe cada documento indicado y elimina los demás.
+
+        Los vectores ya guardados (mismo id y mismo texto) se reutilizan y solo se
+        embeben los que faltan. Cada documento se publica por separado, así que las
+        consultas siguen atendiéndose durante la reconstrucción.
+
+        Args:
+            documents: Iterable de (chunks, metadatos, ids) por documento
+            total_documents: Número total de documentos (solo para informar progreso)
+            on_progress: Callback opcional que recibe las estadísticas tras cada documento
+
+        Returns:
+            Estadísticas: documents, chunks, reused, embedded
+        """
+        with self._rebuild_lock, self._write_lock:
+            print(f"[{self.name}] Iniciando reconstrucción de los vectores...")
+            stats = {"documents": 0, "chunks": 0, "reused": 0, "embedded": 0}
+            batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+            rebuilt: Set[str] = set()
+
+            with ThreadPoolExecutor(max_workers=max(1, settings.EMBEDDING_CONCURRENCY), thread_name_prefix="embed") as executor:
+                for chunks, metas, ids in documents:
+                    self._validate_insertion_data(chunks, metas, ids)
+                    texts = [d.page_content for d in chunks]
+                    normalized_metadatas = self._normalize_metadata(metas)
+                    doc_id = normalized_metadatas[0]["doc_id"]
+
+                    stored = self._load(doc_id)
+                    previous = {record["id"]: (record["text"], row) for row, record in enumerate(stored.records)} if stored else {}
+                    vectors: List[Optional[np.ndarray]] = [None] * len(ids)
+                    for i, (chunk_id, text) in enumerate(zip(ids, texts)):
+                        found = previous.get(chunk_id)
+                        if found is not None and found[0] == text and stored is not None:
+                            vectors[i] = stored.matrix[found[1]]
+                    missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+                    batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+                    embedded = executor.map(self._embed_documents, [[texts[i] for i in rows] for rows in batches])
+                    for rows, batch_vectors in zip(batches, embedded):
+                        for i, vector in zip(rows, _normalize_rows(batch_vectors)):
+                            vectors[i] = vector
+
+                    self._write_document(doc_id, ids, np.stack(vectors), texts, normalized_metadatas)  # type: ignore[arg-type]
+                    rebuilt.add(doc_id)
+                    stats["reused"] += len(ids) - len(missing)
+                    stats["embedded"] += len(missing)
+                    stats["documents"] += 1
+                    stats["chunks"] += len(ids)
+                    total = f"/{total_documents}" if total_documents is not None else ""
+                    print(f"[{self.name}] Reconstrucción: {stats['documents']}{total} documentos, {stats['chunks']} chunks ({stats['reused']} vectores reutilizados)")
+                    if on_progress:
+                        on_progress(dict(stats))
+
+            for doc_id in self.list_documents():
+                if doc_id not in rebuilt:
+                    self._remove_document(doc_id)
+
+            print(f"[{self.name}] Reconstrucción completada exitosamente")
+            return stats
+
+    # ---------- borrado ----------
+    def _remove_document(self, doc_id: str) -> None:
+        for path in (self.matrix_path(doc_id), self.records_path(doc_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._cache_lock:
+            self._documents.pop(doc_id, None)
+
+    def delete_document_chunks(self, doc_id: str, chunk_count: int, verify: bool = False) -> None:
+        """
+        Elimina los chunks de un documento (sus dos archivos; chunk_count no hace falta).
+
+        Raises:
+            RuntimeError: Si falla la eliminación o la verificación encuentra restos
+        """
+        try:
+            with self._write_lock, track_stage("vector_delete"):
+                self._remove_document(doc_id)
+        except OSError as e:
+            raise RuntimeError(f"Error al eliminar documentos de {self.name}: {str(e)}")
+        if not verify:
+            return
+        with track_stage("delete_verify"):
+            remaining = self.count_document_chunks(doc_id)
+        if remaining:
+            raise RuntimeError(f"Quedan chunks del documento {doc_id} tras eliminarlo")
+
+    def delete_by_metadata(self, where: Dict[str, Any]) -> None:
+        """
+        Elimina los chunks de un documento. Solo se admite el filtro {"doc_id": ...}.
+
+        Raises:
+            ValueError: Si el filtro no es por doc_id
+        """
+        if set(where) != {"doc_id"}:
+            raise ValueError(f"Filtro no soportado por {self.name}: {where}")
+        self.delete_document_chunks(where["doc_id"], 0)
+        print(f"[{self.name}] Eliminados los chunks con filtro: {where}")
+
+    def delete_ids(self, ids: List[str]) -> None:
+        """Elimina chunks por ID reescribiendo los documentos afectados."""
+        pending = set(ids)
+        with self._write_lock:
+            for doc_id in self.list_documents():
+                stored = self._load(doc_id)
+                if not pending or stored is None:
+                    continue
+                keep = [row for row, record in enumerate(stored.records) if record["id"] not in pending]
+                if len(keep) == len(stored.records):
+                    continue
+                pending.difference_update(record["id"] for record in stored.records)
+                if not keep:
+                    self._remove_document(doc_id)
+                    continue
+                records = [stored.records[row] for row in keep]
+                self._write_document(
+                    doc_id,
+                    [record["id"] for record in records],
+                    np.asarray(stored.matrix[keep]),
+                    [record["text"] for record in records],
+                    [record["metadata"] for record in records],
+                )
+
+    # ---------- lectura ----------
+    def search_by_vectors(self, vectors: List[List[float]], k: int, where: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """
+        Busca los k chunks más similares a cada vector (coseno exacto).
+
+        Todas las consultas se puntúan con un único producto de matrices por documento.
+
+        Args:
+            vectors: Embeddings de las consultas
+            k: Número de resultados por consulta
+            where: Filtro opcional; solo se admite {"doc_id": ...}
+
+        Returns:
+            Por consulta, lista de documentos ordenados por similitud
+
+        Raises:
+            ValueError: Si el filtro no es por doc_id
+        """
+        if where and set(where) != {"doc_id"}:
+            raise ValueError(f"Filtro no soportado por {self.name}: {where}")
+        doc_ids = [where["doc_id"]] if where else self.list_documents()
+        stored_docs = [doc for doc in (self._load(doc_id) for doc_id in doc_ids) if doc is not None and doc.records]
+        if not vectors:
+            return []
+        if not stored_docs or k <= 0:
+            return [[] for _ in vectors]
+
+        query_matrix = _normalize_rows(vectors)
+        # (chunks, consultas): una columna de puntuaciones por consulta
+        scores = np.concatenate([doc.matrix @ query_matrix.T for doc in stored_docs])
+
+        # Posición global -> (documento, fila)
+        offsets = np.cumsum([0] + [len(doc.records) for doc in stored_docs])
+        results: List[List[Document]] = []
+        for column in scores.T:
+            if k < len(column):
+                top = np.argpartition(-column, k - 1)[:k]
+            else:
+                top = np.arange(len(column))
+            top = top[np.argsort(-column[top], kind="stable")]
+
+            documents: List[Document] = []
+            for top_position in top:
+                position = int(top_position)
+                doc_index = int(np.searchsorted(offsets, position, side="right")) - 1
+                record = stored_docs[doc_index].records[position - int(offsets[doc_index])]
+                documents.append(Document(page_content=record["text"], metadata=dict(record["metadata"]), id=record["id"]))
+            results.append(documents)
+        return results
+
+    def count_document_chunks(self, doc_id: str) -> int:
+        """Cuenta los chunks publicados de un documento."""
+        stored = self._load(doc_id)
+        return len(stored.records) if stored is not None else 0
+
+    def scan_document_chunks(self) -> Dict[str, List[str]]:
+        """Agrupa los IDs de chunks por doc_id."""
+        chunks_by_doc: Dict[str, List[str]] = {}
+        for doc_id in self.list_documents():
+            stored = self._load(doc_id)
+            if stored is not None and stored.records:
+                chunks_by_doc[doc_id] = [record["id"] for record in stored.records]
+        return chunks_by_doc
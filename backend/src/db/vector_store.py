@@ -0,0 +1,354 @@
+import os
+import asyncio
+import contextvars
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, Future, FIRST_COMPLETED
+from threading import RLock
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Set, Tuple, Iterable, Callable
+from langchain_core.documents import Document
+
+from src.config import settings
+from src.utils.lru_cache import LRUCache
+from src.utils.answer_cache import normalize_question
+from src.utils.metrics import track_stage
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+
+class VectorStore(ABC):
+    """
+    Interfaz común de los almacenes vectoriales.
+
+    Reúne lo que no depende del backend: embeddings con caché en disco, caché LRU
+    de consultas, validación de metadatos y el pipeline de inserción en streaming.
+    Cada backend implementa cómo se guardan, borran, cuentan y buscan los chunks.
+    """
+
+    name = "VectorStore"  # prefijo de los mensajes de log
+
+    def __init__(self, persist_directory: str):
+        self.persist_directory = persist_directory
+        os.makedirs(persist_directory, exist_ok=True)
+
+        # Serializa cada escritura (un lote, un borrado) con las reconstrucciones; no se
+        # mantiene durante todo un documento, así varias ingestas avanzan a la vez
+        self._write_lock = RLock()
+        # Se incrementa cuando una reconstrucción reemplaza el almacén: una inserción en
+        # streaming que la atraviesa habría dejado lotes en el almacén anterior
+        self._generation = 0
+
+        # Inicializar embeddings (Gemini o locales según EMBEDDING_PROVIDER) con caché en disco;
+        # se importan aquí porque arrastran langchain_core.runnables y langsmith
+        from src.db.embeddings import build_embeddings
+        self.embeddings: "Embeddings" = build_embeddings(os.path.join(persist_directory, "embedding_cache.sqlite3"))
+
+        # Caché LRU de embeddings de consultas: preguntas repetidas no vuelven a la red
+        self.query_cache: LRUCache[List[float]] = LRUCache(settings.QUERY_EMBEDDING_CACHE_SIZE)
+
+    # ---------- escritura ----------
+    def add_document_stream(
+        self,
+        batches: Iterable[Tuple[List[Document], List[Dict[str, Any]], List[str]]],
+        on_progress: Optional[Callable[[str, int], None]] = None,
+    ) -> int:
+        """
+        Añade un documento a medida que se generan sus lotes de chunks.
+
+        Cada lote se envía a embeber en cuanto llega, mientras el generador sigue
+        leyendo páginas; como mucho hay EMBEDDING_CONCURRENCY lotes en vuelo, así
+        que la memoria depende del tamaño de lote y no del documento. Cada lote se
+        guarda con _store_batch al terminar de embeberse.
+
+        El bloqueo de escritura solo se toma para guardar cada lote y para cerrar el
+        documento, de modo que varias ingestas se ejecutan en paralelo. Si una
+        reconstrucción reemplaza el almacén mientras tanto, la inserción falla (y el
+        trabajo de indexación se reintenta) en lugar de perder lotes.
+
+        Args:
+            batches: Iterable de (chunks, metadatos, ids) por lote
+            on_progress: Callback opcional (etapa, cantidad) con "chunks_embedded" y "chunks_stored"
+
+        Returns:
+            Número total de chunks insertados
+        """
+        workers = max(1, settings.EMBEDDING_CONCURRENCY)
+        inserted = 0
+        doc_ids: Set[str] = set()
+        generation = self._generation
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as executor:
+                in_flight: Dict[Future[List[List[float]]], Tuple[List[str], List[str], List[Dict[str, Any]]]] = {}
+
+                def drain(return_when: str) -> int:
+                    done, _ = wait(in_flight, return_when=return_when)
+                    count = 0
+                    for future in done:
+                        batch_ids, batch_texts, batch_metas = in_flight.pop(future)
+                        vectors = future.result()
+                        if on_progress:
+                            on_progress("chunks_embedded", len(batch_ids))
+                        with self._write_lock, track_stage("vector_upsert", items=len(batch_ids)):
+                            self._check_generation(generation)
+                            self._store_batch(batch_ids, vectors, batch_texts, batch_metas)
+                        if on_progress:
+                            on_progress("chunks_stored", len(batch_ids))
+                        count += len(batch_ids)
+                    return count
+
+                try:
+                    for chunks, metadatas, ids in batches:
+                        self._validate_insertion_data(chunks, metadatas, ids)
+                        texts = [d.page_content for d in chunks]
+                        normalized_metadatas = self._normalize_metadata(metadatas)
+                        doc_ids.update(metadata["doc_id"] for metadata in normalized_metadatas)
+                        # Copia el contexto para que los spans de embed cuelguen del perfil activo, si lo hay
+                        future = executor.submit(contextvars.copy_context().run, self._embed_documents, texts)
+                        in_flight[future] = (ids, texts, normalized_metadatas)
+                        if len(in_flight) >= workers:
+                            inserted += drain(FIRST_COMPLETED)
+                    while in_flight:
+                        inserted += drain(FIRST_COMPLETED)
+                    with self._write_lock:
+                        self._check_generation(generation)
+                        self._finish_stream(doc_ids)
+                except Exception:
+                    for pending in in_flight:
+                        pending.cancel()
+                    with self._write_lock:
+                        self._abort_stream(doc_ids)
+                    raise
+        except Exception as e:
+            raise RuntimeError(f"Error al añadir documentos a {self.name}: {str(e)}")
+
+        print(f"[{self.name}] Inserción en streaming completada: {inserted} chunks")
+        return inserted
+
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embebe un lote de textos registrando la etapa "embed"."""
+        with track_stage("embed", items=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    @abstractmethod
+    def _store_batch(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Guarda un lote con embeddings ya calculados."""
+
+    def _check_generation(self, generation: int) -> None:
+        """Falla si el almacén se reconstruyó desde que empezó una inserción (con _write_lock tomado)."""
+        if self._generation != generation:
+            raise RuntimeError(f"{self.name} se reconstruyó durante la inserción")
+
+    def _finish_stream(self, doc_ids: Set[str]) -> None:
+        """Se llama (con _write_lock tomado) cuando add_document_stream guardó todos los lotes de doc_ids."""
+
+    def _abort_stream(self, doc_ids: Set[str]) -> None:
+        """Se llama (con _write_lock tomado) si add_document_stream falla a mitad de doc_ids."""
+
+    def _validate_insertion_data(self, chunks: List[Document], metadatas: List[Dict[str, Any]], ids: List[str]) -> None:
+        """Valida que los datos de inserción sean consistentes."""
+        if len(chunks) != len(metadatas) or len(chunks) != len(ids):
+            raise ValueError(f"Longitudes inconsistentes: chunks={len(chunks)}, metadatas={len(metadatas)}, ids={len(ids)}")
+
+        if not chunks:
+            raise ValueError("No hay chunks para insertar")
+
+        # Verificar que los IDs sean únicos
+        if len(set(ids)) != len(ids):
+            raise ValueError("IDs duplicados encontrados")
+
+        # Verificar que los metadatos tengan las claves requeridas
+        required_keys = {"doc_id", "filename", "chunk_index"}
+        for i, metadata in enumerate(metadatas):
+            missing_keys = required_keys - set(metadata.keys())
+            if missing_keys:
+                raise ValueError(f"Metadatos incompletos en chunk {i}: faltan {missing_keys}")
+
+    def _normalize_metadata(self, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Normaliza metadatos para asegurar tipos consistentes."""
+        normalized: List[Dict[str, Any]] = []
+        for metadata in metadatas:
+            # Crear copia y asegurar que todos los valores sean strings
+            normalized_meta: Dict[str, Any] = {}
+            for key, value in metadata.items():
+                if isinstance(value, (int, float, bool)):
+                    normalized_meta[key] = str(value)
+                elif isinstance(value, str):
+                    normalized_meta[key] = value
+                else:
+                    normalized_meta[key] = str(value)
+            normalized.append(normalized_meta)
+        return normalized
+
+    @abstractmethod
+    def rebuild_from_stream(
+        self,
+        documents: Iterable[Tuple[List[Document], List[Dict[str, Any]], List[str]]],
+        total_documents: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, int]:
+        """
+        Reconstruye el almacén con exactamente los documentos indicados.
+
+        Returns:
+            Estadísticas: documents, chunks, reused, embedded
+        """
+
+    # ---------- borrado ----------
+    @abstractmethod
+    def delete_document_chunks(self, doc_id: str, chunk_count: int, verify: bool = False) -> None:
+        """Elimina los chunks de un documento usando sus IDs deterministas ({doc_id}_{i})."""
+
+    @abstractmethod
+    def delete_by_metadata(self, where: Dict[str, Any]) -> None:
+        """Elimina chunks por metadata (p.ej. {"doc_id": ...}) cuando no se conocen sus IDs."""
+
+    @abstractmethod
+    def delete_ids(self, ids: List[str]) -> None:
+        """Elimina chunks por ID."""
+
+    # ---------- lectura ----------
+    @abstractmethod
+    def search_by_vectors(self, vectors: List[List[float]], k: int, where: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """
+        Busca los k chunks más similares a cada vector de consulta.
+
+        Args:
+            vectors: Embeddings de las consultas
+            k: Número de resultados por consulta
+            where: Filtro de metadata opcional (p.ej. {"doc_id": ...})
+
+        Returns:
+            Por consulta (en el mismo orden), lista de documentos ordenados por similitud
+        """
+
+    def search(self, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        Busca los k chunks más similares a la consulta.
+
+        Args:
+            query: Texto de la consulta
+            k: Número de resultados
+            where: Filtro de metadata opcional (p.ej. {"doc_id": ...})
+
+        Returns:
+            Lista de documentos ordenados por similitud
+        """
+        return self.search_by_vectors([self.embed_query(query)], k, where)[0]
+
+    def search_many(self, queries: List[str], k: int, where: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """
+        Busca varias consultas a la vez: un lote de embeddings y una búsqueda conjunta.
+
+        Args:
+            queries: Textos de las consultas
+            k: Número de resultados por consulta
+            where: Filtro de metadata opcional
+
+        Returns:
+            Por consulta (en el mismo orden), lista de documentos ordenados por similitud
+        """
+        return self.search_by_vectors(self.embed_queries(queries), k, where)
+
+    async def asearch(self, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Versión asíncrona de search (se ejecuta en un hilo para no bloquear el event loop)."""
+        return await asyncio.to_thread(self.search, query, k, where)
+
+    @abstractmethod
+    def count_document_chunks(self, doc_id: str) -> int:
+        """Cuenta cuántos chunks existen para un documento específico."""
+
+    @abstractmethod
+    def scan_document_chunks(self) -> Dict[str, List[str]]:
+        """Agrupa los IDs de todos los chunks almacenados por doc_id ("" si no tienen doc_id)."""
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embebe una consulta usando la caché LRU de consultas.
+
+        La clave es la pregunta normalizada (minúsculas, espacios y signos de
+        interrogación), así que variaciones triviales reutilizan el mismo vector.
+        """
+        key = normalize_question(query)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            with track_stage("embed_query", items=1):
+                vector = self.embeddings.embed_query(query)
+            self.query_cache.put(key, vector)
+        return vector
+
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Carga en memoria lo necesario para que la primera búsqueda no pague el arranque en frío.
+
+        Returns:
+            Datos informativos del backend (p.ej. chunks cargados)
+        """
+        return {}
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embebe varias consultas usando la caché LRU y un único lote para las que faltan.
+
+        Las consultas que normalizan igual se embeben una sola vez.
+        """
+        keys = [normalize_question(query) for query in queries]
+        vectors: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, query in zip(keys, queries):
+            if key in vectors or key in missing:
+                continue
+            vector = self.query_cache.get(key)
+            if vector is None:
+                missing[key] = query
+            else:
+                vectors[key] = vector
+        if missing:
+            from src.db.embeddings import embed_query_batch
+            with track_stage("embed_query", items=len(missing)):
+                computed = embed_query_batch(self.embeddings, list(missing.values()))
+            for key, vector in zip(missing, computed):
+                self.query_cache.put(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    def is_persisted(self) -> bool:
+        """Verifica si la base de datos está persistida."""
+        return os.path.isdir(self.persist_directory) and bool(os.listdir(self.persist_directory))
+
+    def get_embeddings(self) -> "Embeddings":
+        """Retorna la instancia de embeddings."""
+        return self.embeddings
+
+    def embedding_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Retorna las estadísticas de la caché de embeddings, o None si está desactivada."""
+        from src.db.embedding_cache import CachedEmbeddings
+        return self.embeddings.stats() if isinstance(self.embeddings, CachedEmbeddings) else None
+
+    def query_cache_stats(self) -> Dict[str, Any]:
+        """Retorna las estadísticas de la caché de embeddings de consultas."""
+        return self.query_cache.stats()
+
+
+def create_vector_store(persist_directory: str) -> VectorStore:
+    """
+    Crea el almacén vectorial configurado en VECTOR_BACKEND.
+
+    Args:
+        persist_directory: Directorio de persistencia
+
+    Returns:
+        ChromaDBManager ("chroma") o NumpyVectorStore ("numpy")
+
+    Raises:
+        ValueError: Si el backend no es válido
+    """
+    backend = settings.VECTOR_BACKEND.lower()
+    if backend == "chroma":
+        from src.db.chroma_db import ChromaDBManager
+        return ChromaDBManager(persist_directory)
+    if backend == "numpy":
+        from src.db.numpy_store import NumpyVectorStore
+        return NumpyVectorStore(persist_directory)
+    raise ValueError(f"VECTOR_BACKEND no válido: {settings.VECTOR_BACKEND} (opciones: {', '.join(VECTOR_BACKENDS)})")
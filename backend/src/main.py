@@ -1,13 +1,45 @@
 # src/main.py
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.routes.rag_routes import router as rag_router
+from src.routes.metrics_routes import router as metrics_router
+from src.routes.profiling_routes import router as profiling_router
+from src.routes.health_routes import router as health_router
+from src.services.rag_service import get_or_create_rag_service
 from src.config import settings
+from src.utils.profiling import ProfilingMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    """
+    Construye y calienta el servicio antes de aceptar peticiones (uvicorn no abre el
+    puerto hasta que termina el arranque), así la primera petición no paga el arranque en frío.
+    """
+    app.state.ready = False
+    started = time.perf_counter()
+    # Fuera del event loop: crear Chroma, embeddings y el LLM es bloqueante
+    service = await asyncio.to_thread(get_or_create_rag_service, app)
+    app.state.warmup = await asyncio.to_thread(service.warm_up) if settings.STARTUP_WARMUP else None
+    app.state.startup_seconds = round(time.perf_counter() - started, 3)
+    app.state.ready = True
+    print(f"[App] Servicio listo en {app.state.startup_seconds} s")
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        await asyncio.to_thread(service.close)
+
 
-app = FastAPI(title="Habla con tu PDF - API")
+app = FastAPI(title="Habla con tu PDF - API", lifespan=lifespan)
 
-# validar API key al arrancar
-if not settings.GOOGLE_API_KEY:
+# validar API key al arrancar (no hace falta si embeddings y chat son locales)
+if not settings.GOOGLE_API_KEY and "google" in (settings.EMBEDDING_PROVIDER, settings.CHAT_PROVIDER):
     raise RuntimeError("Falta GOOGLE_API_KEY en .env. Añade tu clave y vuelve a ejecutar.")
 
 # Lista de orígenes permitidos
@@ -23,8 +55,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # ["GET", "POST"] si quieres limitar
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "X-Profile-Status"],
 )
 
+# Perfilado bajo demanda (X-Profile-Token); sin PROFILING_TOKEN no hace nada
+app.add_middleware(ProfilingMiddleware, exclude_paths=("/rag/profiles",))
+
 
 # incluir las rutas RAG
 app.include_router(rag_router, prefix="/rag", tags=["RAG"])
+
+# perfiles guardados por el perfilado bajo demanda
+app.include_router(profiling_router, prefix="/rag", tags=["Profiling"])
+
+# métricas en formato Prometheus (/metrics)
+app.include_router(metrics_router)
+
+# readiness (/ready) para balanceadores y orquestadores
+app.include_router(health_router)
@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 
 class AskRequest(BaseModel):
     question: str
@@ -9,6 +9,18 @@ class AskRequest(BaseModel):
 class AskResponse(BaseModel):
     answer: str
 
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    doc_id: Optional[str] = None
+
+class AskBatchItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+
+class AskBatchResponse(BaseModel):
+    answers: List[AskBatchItem]
+
 class UploadResponse(BaseModel):
     uploaded: bool
     message: str
@@ -33,3 +45,65 @@ class StatusResponse(BaseModel):
 class DeleteResponse(BaseModel):
     deleted: bool
     doc_id: str
+
+class CacheStatsResponse(BaseModel):
+    answers: Optional[Dict[str, Any]] = None
+    embeddings: Optional[Dict[str, Any]] = None
+    queries: Optional[Dict[str, Any]] = None
+
+class ProgressResponse(BaseModel):
+    doc_id: str
+    status: str
+    stage: str
+    total_pages: Optional[int] = None
+    pages_extracted: int = 0
+    chunks_split: int = 0
+    chunks_embedded: int = 0
+    chunks_stored: int = 0
+    percent: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    started_at: Optional[float] = None
+    updated_at: Optional[float] = None
+    finished: bool = False
+
+class ReconcileResponse(BaseModel):
+    started_at: str
+    duration_ms: float
+    documents: int
+    chroma_chunks: int
+    orphan_chunks: int
+    orphan_documents: List[str]
+    extra_chunks: int
+    orphan_bm25: List[str]
+    orphan_files: List[str]
+    stale_temp_files: int
+    incomplete_documents: List[str]
+    missing_files: List[str]
+    reindexed: List[str]
+    stale_processing: List[str]
+    pruned_failed_jobs: int = 0
+
+class RebuildResponse(BaseModel):
+    started_at: str
+    status: str
+    duration_ms: Optional[float] = None
+    total_documents: int
+    documents: int
+    chunks: int
+    reused: int
+    embedded: int
+    missing_files: List[str]
+    error: Optional[str] = None
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    startup_seconds: Optional[float] = None
+    warmup: Optional[Dict[str, Any]] = None
+
+class ProfileSummary(BaseModel):
+    id: str
+    name: str
+    mode: str
+    started_at: str
+    duration_ms: float
+    status_code: Optional[int] = None
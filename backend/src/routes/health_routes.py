@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from src.models.schemas import ReadinessResponse
+
+router = APIRouter()
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+def readiness(request: Request):
+    """
+    Readiness: 200 cuando el servicio está construido y calentado, 503 mientras arranca
+    o se detiene. No crea el servicio (a diferencia de las rutas que usan get_rag_service).
+    """
+    state = request.app.state
+    if not getattr(state, "ready", False):
+        return JSONResponse(status_code=503, content=ReadinessResponse(ready=False).model_dump())
+    return ReadinessResponse(
+        ready=True,
+        startup_seconds=getattr(state, "startup_seconds", None),
+        warmup=getattr(state, "warmup", None),
+    )
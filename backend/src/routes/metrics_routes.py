@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+
+from src.config import settings
+from src.services.rag_service import RAGService, get_rag_service
+from src.utils.metrics import registry, CONTENT_TYPE
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics(service: RAGService = Depends(get_rag_service)):
+    """
+    Métricas del proceso en formato de texto de Prometheus.
+
+    Incluye histogramas de duración por etapa (rag_stage_duration_seconds), elementos
+    procesados, preguntas en curso y la profundidad de la cola de indexación. Es una
+    función síncrona para que los recolectores (consultas SQLite) no bloqueen el event loop.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
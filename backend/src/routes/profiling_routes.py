@@ -0,0 +1,52 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from src.models.schemas import ProfileSummary
+from src.utils.profiling import Profiler, get_profiler
+
+router = APIRouter()
+
+
+def require_profiling_admin(x_profile_token: Optional[str] = Header(default=None)) -> Profiler:
+    """Dependency: exige el token de administración (PROFILING_TOKEN) en X-Profile-Token."""
+    profiler = get_profiler()
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiler.authorize(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    return profiler
+
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+def list_profiles(profiler: Profiler = Depends(require_profiling_admin)):
+    """Perfiles guardados, del más reciente al más antiguo."""
+    return profiler.store.list()
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, profiler: Profiler = Depends(require_profiling_admin)):
+    """Perfil completo: árbol de spans y funciones más costosas."""
+    report = profiler.store.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+
+@router.get("/profiles/{profile_id}/flamegraph")
+def download_flamegraph(profile_id: str, profiler: Profiler = Depends(require_profiling_admin)):
+    """Pilas muestreadas en formato folded (flamegraph.pl, speedscope)."""
+    path = profiler.store.file_path(profile_id, ".folded")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Flamegraph not found (profile missing or recorded with cprofile)")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+
+@router.get("/profiles/{profile_id}/pstats")
+def download_pstats(profile_id: str, profiler: Profiler = Depends(require_profiling_admin)):
+    """Estadísticas de cProfile (.prof) para pstats o snakeviz."""
+    path = profiler.store.file_path(profile_id, ".prof")
+    if path is None:
+        raise HTTPException(status_code=404, detail="pstats not found (profile missing or recorded with sampling)")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile, File, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse
-from typing import cast, List
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import cast, Dict, List, Any, AsyncIterator
+import json
+import asyncio
 
+from src.config import settings
 from src.services.rag_service import RAGService, get_rag_service
-from src.models.schemas import AskRequest, AskResponse, UploadResponse, StatusResponse, DeleteResponse, DocumentEntry
+from src.utils import InvalidPDFError, FileTooLargeError
+from src.models.schemas import AskRequest, AskResponse, AskBatchRequest, AskBatchResponse, AskBatchItem, UploadResponse, StatusResponse, DeleteResponse, DocumentEntry, CacheStatsResponse, ProgressResponse, ReconcileResponse, RebuildResponse
 
 router = APIRouter()
 
@@ -11,43 +16,104 @@ router = APIRouter()
 @router.post("/ask", response_model=AskResponse)
 async def ask(payload: AskRequest, service: RAGService = Depends(get_rag_service)):
     try:
-        answer = service.ask(payload.question, doc_id=payload.doc_id)
+        answer = await service.aask(payload.question, doc_id=payload.doc_id)
         return AskResponse(answer=answer)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@router.post("/ask/batch", response_model=AskBatchResponse)
+async def ask_batch(payload: AskBatchRequest, service: RAGService = Depends(get_rag_service)):
+    """
+    Responde varias preguntas en una sola petición, en el mismo orden.
+
+    Cada elemento lleva su respuesta o su error; un fallo en una pregunta no hace
+    fallar la petición.
+    """
+    if not payload.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if len(payload.questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions: {len(payload.questions)} (max {settings.ASK_BATCH_MAX_QUESTIONS})",
+        )
+    try:
+        results = await service.aask_batch(payload.questions, doc_id=payload.doc_id)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    return AskBatchResponse(answers=[AskBatchItem(question=question, **result) for question, result in zip(payload.questions, results)])
+
+
+def _format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/ask/stream")
+async def ask_stream(payload: AskRequest, service: RAGService = Depends(get_rag_service)):
+    """
+    Responde una pregunta como Server-Sent Events.
+
+    Emite primero el evento "sources" con los chunks recuperados, luego eventos
+    "token" con la respuesta a medida que la genera Gemini, y por último "done"
+    (o "error" si algo falla a mitad del stream).
+    """
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for item in service.astream_answer(payload.question, doc_id=payload.doc_id):
+                yield _format_sse(item["event"], item["data"])
+        except Exception as exc:
+            yield _format_sse("error", {"detail": str(exc)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _duplicate_response(entry: Dict[str, Any]) -> UploadResponse:
+    print(f"[Upload] Archivo duplicado detectado, reutilizando: {entry['doc_id']}")
+    return UploadResponse(
+        uploaded=True,
+        message=f"Archivo duplicado detectado. Reutilizando documento existente: {entry['filename']}",
+        doc_id=entry["doc_id"],
+    )
+
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_pdf(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     service: RAGService = Depends(get_rag_service),
 ):
     try:
-        # Usar FileManager para manejar el archivo
-        dest_path, original_name = service.file_manager.save_uploaded_file(file)
-
-        # Verificar si es un archivo duplicado ANTES de crear entrada
-        file_hash = service.file_manager.calculate_file_hash(dest_path)
-        if file_hash:
-            duplicate_entry = service.index_manager.find_duplicate_by_hash(file_hash)
-            if duplicate_entry:
-                # Eliminar archivo duplicado inmediatamente
-                service.file_manager.delete_file(dest_path)
-                print(f"[Upload] Archivo duplicado detectado, reutilizando: {duplicate_entry['doc_id']}")
-                return UploadResponse(
-                    uploaded=True, 
-                    message=f"Archivo duplicado detectado. Reutilizando documento existente: {duplicate_entry['filename']}", 
-                    doc_id=duplicate_entry['doc_id']
-                )
-
-        # Crear entrada preliminar y obtener doc_id
-        doc_id = service.create_pending_entry(dest_path, original_name)
-
-        # Programar indexación en background pasando doc_id para que se actualice la entrada
-        background_tasks.add_task(service.add_pdf_from_path, dest_path, original_name, doc_id)
-
-        return UploadResponse(uploaded=True, message="Upload received; indexing scheduled", doc_id=doc_id)
+        # Copiar a temporal calculando el hash en la misma pasada (fuera del event loop)
+        try:
+            temp_path, original_name, file_hash, _ = await run_in_threadpool(
+                service.file_manager.receive_upload, file, settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+            )
+        except FileTooLargeError as exc:
+            raise HTTPException(status_code=413, detail=str(exc))
+        except InvalidPDFError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        # Verificar si es un archivo duplicado ANTES de moverlo a data/pdfs
+        duplicate_entry = await run_in_threadpool(service.index_manager.find_duplicate_by_hash, file_hash)
+        if duplicate_entry:
+            await run_in_threadpool(service.file_manager.delete_file, temp_path)
+            return _duplicate_response(duplicate_entry)
+
+        dest_path = await run_in_threadpool(service.file_manager.commit_upload, temp_path, original_name, file_hash)
+
+        # Crear entrada preliminar (ya con el hash) y encolar su indexación (lee el PDF para contar páginas).
+        # Si otra subida simultánea del mismo archivo ganó la carrera, se reutiliza su documento
+        entry, created = await run_in_threadpool(service.create_pending_entry, dest_path, original_name, 0, file_hash)
+        if not created:
+            await run_in_threadpool(service.file_manager.delete_file, dest_path)
+            return _duplicate_response(entry)
+
+        return UploadResponse(uploaded=True, message="Upload received; indexing queued", doc_id=entry["doc_id"])
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -62,6 +128,51 @@ def status(service: RAGService = Depends(get_rag_service)):
     )
 
 
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+def cache_stats(service: RAGService = Depends(get_rag_service)):
+    stats = service.cache_stats()
+    return CacheStatsResponse(answers=stats["answers"], embeddings=stats["embeddings"], queries=stats["queries"])
+
+
+@router.get("/reconcile", response_model=ReconcileResponse)
+def reconcile_report(service: RAGService = Depends(get_rag_service)):
+    """Último informe del reconciliador entre índice, disco y Chroma."""
+    report = service.reconciler.last_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="No reconciliation has run yet")
+    return ReconcileResponse(**report)
+
+
+@router.post("/reconcile", response_model=ReconcileResponse)
+def reconcile(service: RAGService = Depends(get_rag_service)):
+    """Ejecuta una ronda de reconciliación ahora y devuelve el informe."""
+    report = service.reconciler.run_once()
+    if report is None:
+        raise HTTPException(status_code=409, detail="Reconciliation already running")
+    return ReconcileResponse(**report)
+
+
+@router.get("/vectors/rebuild", response_model=RebuildResponse)
+def rebuild_report(service: RAGService = Depends(get_rag_service)):
+    """Informe de la última reconstrucción del almacén vectorial (o su progreso si sigue en curso)."""
+    report = service.rebuilder.last_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="No rebuild has run yet")
+    return RebuildResponse(**report)
+
+
+@router.post("/vectors/rebuild", response_model=RebuildResponse)
+def rebuild_vectors(service: RAGService = Depends(get_rag_service)):
+    """Reconstruye el almacén vectorial desde los PDFs reutilizando los vectores guardados."""
+    try:
+        report = service.rebuilder.run_once()
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    if report is None:
+        raise HTTPException(status_code=409, detail="Rebuild already running")
+    return RebuildResponse(**report)
+
+
 @router.delete("/documents/{doc_id}", response_model=DeleteResponse)
 def delete_document(doc_id: str, service: RAGService = Depends(get_rag_service)):
     ok = service.delete_document(doc_id)
@@ -70,6 +181,50 @@ def delete_document(doc_id: str, service: RAGService = Depends(get_rag_service))
     return DeleteResponse(deleted=True, doc_id=doc_id)
 
 
+@router.get("/documents/{doc_id}/progress", response_model=ProgressResponse)
+def document_progress(doc_id: str, service: RAGService = Depends(get_rag_service)):
+    """Progreso de indexación de un documento (lectura puntual, sin limpieza de /status)."""
+    progress = service.get_progress(doc_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return ProgressResponse(**progress)
+
+
+@router.get("/documents/{doc_id}/progress/stream")
+async def document_progress_stream(doc_id: str, service: RAGService = Depends(get_rag_service)):
+    """
+    Progreso de indexación como Server-Sent Events.
+
+    Emite un evento "progress" cada vez que cambian los contadores y termina con
+    "done" cuando el documento queda listo o falla ("error" si desaparece).
+    """
+    progress = await run_in_threadpool(service.get_progress, doc_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    async def event_stream() -> AsyncIterator[str]:
+        current = progress
+        last_sent = None
+        while True:
+            if current is None:
+                yield _format_sse("error", {"detail": "Document not found"})
+                return
+            if current != last_sent:
+                yield _format_sse("progress", current)
+                last_sent = current
+            if current["status"] != "processing":
+                yield _format_sse("done", {"doc_id": doc_id, "status": current["status"]})
+                return
+            await asyncio.sleep(settings.PROGRESS_STREAM_INTERVAL_SECONDS)
+            current = await run_in_threadpool(service.get_progress, doc_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/documents/{doc_id}/download")
 def download_document(doc_id: str, service: RAGService = Depends(get_rag_service)):
     """
@@ -0,0 +1,291 @@
+import os
+import time
+import uuid
+import sqlite3
+from contextlib import contextmanager
+from threading import Event, Lock, RLock, Thread
+from typing import Any, Callable, Dict, Generator, List, Optional, Set
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    filename TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    locked_by TEXT,
+    locked_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, priority, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_doc_id ON jobs(doc_id);
+"""
+
+# Estados de un trabajo; los terminados con éxito se eliminan de la tabla y los fallidos,
+# cuyo available_at pasa a ser el momento del fallo definitivo, tras un periodo de retención
+QUEUED = "queued"
+RUNNING = "running"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Cola persistente de trabajos de indexación en SQLite (modo WAL).
+
+    Un trabajo se reclama con un "lease": si el proceso que lo ejecuta muere,
+    el lease expira y otro worker lo retoma, de modo que los trabajos sobreviven
+    a reinicios. Los fallos se reintentan con backoff exponencial hasta
+    max_attempts; los de mayor prioridad se reclaman primero.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 300, retry_backoff_seconds: float = 5.0):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._lock = RLock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        """Transacción con bloqueo de escritura inmediato."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, doc_id: str, path: str, filename: Optional[str] = None, priority: int = 0, max_attempts: int = 3) -> str:
+        """
+        Encola la indexación de un documento.
+
+        Args:
+            doc_id: ID del documento ya registrado en el índice
+            path: Ruta del PDF
+            filename: Nombre original del archivo
+            priority: Prioridad (mayor se procesa antes)
+            max_attempts: Intentos antes de marcar el trabajo como fallido
+
+        Returns:
+            ID del trabajo
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, doc_id, path, filename, priority, status, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, doc_id, path, filename, priority, QUEUED, max(1, max_attempts), now, now),
+            )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Reclama el siguiente trabajo disponible (o uno cuyo lease expiró).
+
+        Args:
+            worker_id: Identificador del worker que lo ejecutará
+
+        Returns:
+            El trabajo reclamado o None si la cola está vacía
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND locked_at < ?) "
+                "ORDER BY priority DESC, available_at, created_at LIMIT 1",
+                (QUEUED, now, RUNNING, now - self.lease_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["status"] == RUNNING:
+                print(f"[JobQueue] Retomando trabajo abandonado {row['job_id']} (doc_id={row['doc_id']})")
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, locked_by = ?, locked_at = ? WHERE job_id = ?",
+                (RUNNING, worker_id, now, row["job_id"]),
+            )
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        """Renueva el lease de los trabajos en ejecución."""
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET locked_at = ? WHERE job_id = ? AND status = ?",
+                [(time.time(), job_id, RUNNING) for job_id in job_ids],
+            )
+
+    def complete(self, job_id: str) -> None:
+        """Elimina un trabajo terminado con éxito."""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def fail(self, job_id: str, error: str) -> bool:
+        """
+        Registra un fallo y reprograma el trabajo si le quedan intentos.
+
+        Args:
+            job_id: ID del trabajo
+            error: Descripción del error
+
+        Returns:
+            True si el trabajo se reintentará
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            if row["attempts"] < row["max_attempts"]:
+                delay = self.retry_backoff_seconds * (2 ** (row["attempts"] - 1))
+                conn.execute(
+                    "UPDATE jobs SET status = ?, available_at = ?, locked_by = NULL, locked_at = NULL, last_error = ? WHERE job_id = ?",
+                    (QUEUED, time.time() + delay, error, job_id),
+                )
+                return True
+            conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, locked_by = NULL, locked_at = NULL, last_error = ? WHERE job_id = ?",
+                (FAILED, time.time(), error, job_id),
+            )
+            return False
+
+    def prune_failed(self, older_than_seconds: float) -> int:
+        """
+        Elimina los trabajos fallidos definitivamente hace más de older_than_seconds.
+
+        Args:
+            older_than_seconds: Tiempo que se conserva un trabajo fallido (y su last_error)
+
+        Returns:
+            Número de trabajos eliminados
+        """
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status = ? AND available_at < ?",
+                (FAILED, time.time() - older_than_seconds),
+            ).rowcount
+
+    def cancel_document(self, doc_id: str) -> int:
+        """Elimina los trabajos de un documento. Retorna cuántos se eliminaron."""
+        with self._lock:
+            return self._conn.execute("DELETE FROM jobs WHERE doc_id = ?", (doc_id,)).rowcount
+
+    def has_active_job(self, doc_id: str) -> bool:
+        """Indica si el documento tiene un trabajo pendiente o en ejecución con lease vigente."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE doc_id = ? AND (status = ? OR (status = ? AND locked_at >= ?)) LIMIT 1",
+                (doc_id, QUEUED, RUNNING, time.time() - self.lease_seconds),
+            ).fetchone()
+        return row is not None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna el número de trabajos por estado.
+
+        Returns:
+            Diccionario con queued, running y failed
+        """
+        counts = {QUEUED: 0, RUNNING: 0, FAILED: 0}
+        with self._lock:
+            for row in self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+                counts[row["status"]] = row["n"]
+        return counts
+
+
+class IndexingWorkerPool:
+    """
+    Pool de hilos que consume la JobQueue y ejecuta el handler de cada trabajo.
+
+    El número de hilos limita cuántos PDFs se indexan a la vez en este proceso;
+    las ráfagas de subidas esperan en la cola en lugar de competir con /ask.
+    """
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Dict[str, Any]], None], workers: int = 2, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(0, workers)
+        self.poll_interval = poll_interval
+        self._wakeup = Event()
+        self._stopping = Event()
+        self._threads: List[Thread] = []
+        self._running: Set[str] = set()
+        self._running_lock = Lock()
+        self._worker_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    def start(self) -> None:
+        """Arranca los hilos de indexación y el de renovación de leases."""
+        if self._threads or self.workers == 0:
+            return
+        for i in range(self.workers):
+            thread = Thread(target=self._run, args=(f"{self._worker_prefix}-{i}",), name=f"indexing-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = Thread(target=self._heartbeat, name="indexing-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        print(f"[IndexingWorkerPool] {self.workers} workers de indexación iniciados")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Detiene los hilos; los trabajos en curso terminan o se retoman tras expirar su lease."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """Despierta a los workers tras encolar un trabajo en este proceso."""
+        self._wakeup.set()
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(worker_id)
+            except Exception as e:
+                print(f"[IndexingWorkerPool] Error al reclamar trabajo: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            with self._running_lock:
+                self._running.add(job["job_id"])
+            try:
+                self.handler(job)
+                self.queue.complete(job["job_id"])
+            except Exception as e:
+                retry = self.queue.fail(job["job_id"], str(e))
+                print(f"[IndexingWorkerPool] Trabajo {job['job_id']} (doc_id={job['doc_id']}) falló en el intento {job['attempts']}: {str(e)}"
+                      + (" - se reintentará" if retry else " - sin más reintentos"))
+            finally:
+                with self._running_lock:
+                    self._running.discard(job["job_id"])
+
+    def _heartbeat(self) -> None:
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not self._stopping.wait(interval):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                self.queue.heartbeat(running)
+            except Exception as e:
+                print(f"[IndexingWorkerPool] Error al renovar leases: {str(e)}")
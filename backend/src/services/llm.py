@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.config import settings
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modelo de chat local y determinista (sin red) para pruebas y benchmarks.
+
+    La respuesta se construye con palabras del propio prompt elegidas a partir
+    de su hash, así que el mismo prompt produce siempre la misma respuesta. La
+    latencia simulada (con jitter) se aplica antes del primer token; en modo
+    asíncrono usa asyncio.sleep para no ocupar hilos, como una llamada de red.
+    """
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    response_words: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+    def _words(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(message.text() for message in messages)
+        vocabulary = _WORD_RE.findall(prompt) or ["respuesta"]
+        seed = int.from_bytes(hashlib.md5(prompt.encode("utf-8")).digest()[:8], "little")
+        rng = random.Random(seed)
+        return [rng.choice(vocabulary) for _ in range(max(1, self.response_words))]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(self._words(messages))))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(self._words(messages))))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._delay())
+        for i, word in enumerate(self._words(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._delay())
+        for i, word in enumerate(self._words(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+
+def build_chat_model() -> BaseChatModel:
+    """
+    Crea el modelo de chat según settings.CHAT_PROVIDER.
+
+    Returns:
+        ChatGoogleGenerativeAI ("google") o el modelo local determinista ("fake")
+    """
+    if settings.CHAT_PROVIDER == "fake":
+        return FakeChatModel(
+            latency_ms=settings.FAKE_CHAT_LATENCY_MS,
+            jitter_ms=settings.FAKE_CHAT_JITTER_MS,
+            response_words=settings.FAKE_CHAT_RESPONSE_WORDS,
+        )
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=settings.CHAT_MODEL,
+        google_api_key=settings.GOOGLE_API_KEY,
+    )
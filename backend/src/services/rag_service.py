@@ -1,44 +1,116 @@
 import os
+import time
 import uuid
-from typing import Optional, Dict, List, Any, Union
+import asyncio
+from threading import Lock
+from typing import TYPE_CHECKING, Optional, Dict, List, Any, Union, AsyncIterator, Iterator, Tuple, Hashable, cast
 
 from fastapi import Request
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import RetrievalQA
+from langchain_core.documents import Document
 
 from src.config import settings
-from src.db.chroma_db import ChromaDBManager
-from src.utils import PDFProcessor, FileManager, IndexManager
+from src.db.vector_store import create_vector_store
+from src.services.job_queue import JobQueue, IndexingWorkerPool
+from src.services.reconciler import Reconciler
+from src.services.rebuilder import VectorRebuilder
+from src.utils import PDFProcessor, FileManager, IndexManager, ParsedDocumentCache, AnswerCache, BM25Store
+from src.utils.answer_cache import normalize_question
+from src.utils.bm25_index import BM25Writer, reciprocal_rank_fusion
+from src.utils.progress_tracker import IngestionProgress, PAGES_EXTRACTED, CHUNKS_SPLIT
+from src.utils import metrics
+from src.utils.metrics import track_stage
+from src.utils.profiling import get_profiler, record_span
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import Runnable
 
 PDF_STORE_DIR = "data/pdfs"
 CHROMA_DIR = settings.CHROMA_PERSIST_DIR  # p.e. "./chroma_db"
-INDEX_FILE = os.path.join(CHROMA_DIR, "docs_index.json")
+INDEX_FILE = os.path.join(CHROMA_DIR, "docs_index.json")  # formato antiguo, se migra a SQLite
+INDEX_DB = os.path.join(CHROMA_DIR, "docs_index.sqlite3")
+BM25_DIR = os.path.join(CHROMA_DIR, "bm25")
+JOBS_DB = os.path.join(CHROMA_DIR, "jobs.sqlite3")
 MAX_DOCS = 5
 
+# Mismo prompt que la cadena "stuff" de RetrievalQA, pero aplicado a documentos ya recuperados
+QA_TEMPLATE = (
+    "Use the following pieces of context to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\n"
+    "Question: {question}\n"
+    "Helpful Answer:"
+)
+
 
 class RAGService:
     def __init__(self):
-        # Inicializar utilities
-        self.pdf_processor = PDFProcessor()
-        self.file_manager = FileManager(PDF_STORE_DIR)
-        self.index_manager = IndexManager(INDEX_FILE)
+        # Inicializar utilities (comparten la caché de PDFs parseados)
+        self.document_cache = ParsedDocumentCache(settings.PARSE_CACHE_MAX_ENTRIES)
+        self.pdf_processor = PDFProcessor(self.document_cache)
+        self.file_manager = FileManager(PDF_STORE_DIR, self.document_cache)
+        self.index_manager = IndexManager(INDEX_DB, legacy_json_path=INDEX_FILE, version_refresh_seconds=settings.ANSWER_CACHE_VERSION_REFRESH_SECONDS)
+        
+        # Almacén vectorial (Chroma o NumPy según VECTOR_BACKEND)
+        self.vector_store = create_vector_store(CHROMA_DIR)
+        
+        # Índice léxico BM25 por documento para búsqueda híbrida
+        self.bm25_store = BM25Store(BM25_DIR, settings.BM25_K1, settings.BM25_B)
+        
+        # LLM para respuesta (Gemini o local según CHAT_PROVIDER); LangChain y el SDK
+        # de Google se importan aquí y no al importar el módulo
+        from langchain_core.prompts import PromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        from src.services.llm import build_chat_model
+        self.llm = build_chat_model()
+        
+        # Cadena prompt -> LLM construida una sola vez y reutilizada en cada pregunta
+        self.qa_prompt = PromptTemplate.from_template(QA_TEMPLATE)
+        self.answer_chain: "Runnable[Dict[str, Any], str]" = self.qa_prompt | self.llm | StrOutputParser()
+        
+        # Caché de respuestas (se invalida al añadir o eliminar documentos)
+        self.answer_cache: Optional[AnswerCache] = (
+            AnswerCache(settings.ANSWER_CACHE_MAX_ENTRIES, settings.ANSWER_CACHE_TTL_SECONDS, version_store=self.index_manager)
+            if settings.ANSWER_CACHE_ENABLED else None
+        )
         
-        # Inicializar ChromaDB manager
-        self.chroma_db = ChromaDBManager(CHROMA_DIR)
+        # Limita las preguntas en vuelo por worker para no saturar la API de Gemini
+        self._ask_semaphore = asyncio.Semaphore(settings.ASK_MAX_CONCURRENCY)
         
-        # LLM para respuesta
-        self.llm = ChatGoogleGenerativeAI(
-            model=settings.CHAT_MODEL,
-            google_api_key=settings.GOOGLE_API_KEY
+        # Cola persistente de indexación consumida por un pool de hilos de tamaño fijo
+        self.job_queue = JobQueue(JOBS_DB, settings.INDEXING_JOB_LEASE_SECONDS, settings.INDEXING_RETRY_BACKOFF_SECONDS)
+        self.indexing_pool = IndexingWorkerPool(
+            self.job_queue,
+            self._process_indexing_job,
+            settings.INDEXING_WORKERS,
+            settings.INDEXING_POLL_INTERVAL_SECONDS,
         )
+        self.indexing_pool.start()
+        
+        # Limpieza periódica de chunks e índices huérfanos (fuera del camino de las peticiones)
+        self.reconciler = Reconciler(self, settings.RECONCILE_INTERVAL_SECONDS)
+        self.reconciler.start()
+        
+        # Reconstrucción del almacén vectorial bajo demanda (POST /rag/vectors/rebuild)
+        self.rebuilder = VectorRebuilder(self)
+        
+        # Gauges que se calculan al exportar /metrics (cola de indexación, documentos por estado)
+        metrics.registry.set_collector("rag_service", self._collect_metrics)
 
     # Los métodos _load_index, _save_index y _split_pdf ahora están en utilities
     
     # ---------- index (docs metadata) ----------
-    def create_pending_entry(self, source_path: str, filename: Optional[str] = None) -> str:
+    def create_pending_entry(self, source_path: str, filename: Optional[str] = None, priority: int = 0, file_hash: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
         """
-        Crea una entrada preliminar en el índice con status='processing' y devuelve el doc_id.
-        La tarea de indexación podrá usar ese doc_id para actualizar la misma entrada.
+        Crea una entrada preliminar en el índice con status='processing' y encola su
+        indexación. El trabajo de indexación actualizará la misma entrada.
+
+        El hash se guarda ya en la entrada preliminar, así una subida repetida del mismo
+        archivo se detecta como duplicada mientras el original está en cola o en proceso.
+        La comprobación y la inserción son atómicas: si otro documento no fallido tiene
+        el mismo hash no se crea nada y se devuelve ese documento.
+
+        Returns:
+            (entrada, creada): la entrada nueva y True, o la del duplicado y False
         """
         if not self.file_manager.file_exists(source_path):
             raise FileNotFoundError(f"El archivo {source_path} no existe")
@@ -52,9 +124,31 @@ class RAGService:
             pages_count = self.pdf_processor.count_pdf_pages(source_path)
         except Exception:
             pages_count = None
+        file_hash = file_hash or self.file_manager.calculate_file_hash(source_path)
 
-        self.index_manager.create_entry(doc_id, safe_filename, source_path, "processing", file_size, pages_count)
-        return doc_id
+        if file_hash:
+            entry, created = self.index_manager.create_entry_unless_duplicate(doc_id, safe_filename, source_path, file_hash, "processing", file_size, pages_count)
+            if not created:
+                return entry, False
+        else:
+            entry = self.index_manager.create_entry(doc_id, safe_filename, source_path, "processing", file_size, pages_count)
+        # Una subida perfilada también perfila su indexación (si la ejecuta este proceso)
+        get_profiler().follow_job(doc_id)
+        self.job_queue.enqueue(doc_id, source_path, safe_filename, priority, settings.INDEXING_MAX_ATTEMPTS)
+        self.indexing_pool.notify()
+        return entry, True
+
+    def _process_indexing_job(self, job: Dict[str, Any]) -> None:
+        """Ejecuta un trabajo de la cola de indexación."""
+        entry = self.index_manager.get_entry(job["doc_id"])
+        if entry is None:
+            print(f"[RAGService] Documento {job['doc_id']} eliminado antes de indexarse, se descarta el trabajo")
+            return
+        if entry.get("status") != "processing":
+            # Reintento tras un fallo: vuelve a mostrarse como en proceso
+            self.index_manager.update_entry(job["doc_id"], status="processing")
+        with get_profiler().profile_job(job["doc_id"], f"index {job['doc_id']}"):
+            self.add_pdf_from_path(job["path"], job.get("filename"), job["doc_id"])
 
     # ---------- add / upload ----------
     def add_pdf_from_path(self, source_path: str, filename: Optional[str] = None, doc_id: Optional[str] = None) -> Dict[str, Any]:
@@ -67,75 +161,87 @@ class RAGService:
             raise FileNotFoundError(f"El archivo {source_path} no existe")
 
         # si no se pasó doc_id, generar uno (comportamiento antiguo)
+        safe_filename = filename or self.file_manager.get_base_filename(source_path)
         if doc_id is None:
             doc_id = str(uuid.uuid4())
-            safe_filename = filename or self.file_manager.get_base_filename(source_path)
-            # Obtener el tamaño del archivo y páginas
             file_size = self.file_manager.get_file_size(source_path)
             try:
                 pages_count = self.pdf_processor.count_pdf_pages(source_path)
             except Exception:
                 pages_count = None
-            self.index_manager.create_entry(doc_id, safe_filename, source_path, "processing", file_size, pages_count)
+            file_hash = self.file_manager.calculate_file_hash(source_path)
+            self.index_manager.create_entry(doc_id, safe_filename, source_path, "processing", file_size, pages_count, file_hash)
         else:
-            safe_filename = filename or self.file_manager.get_base_filename(source_path)
-            # Si ya existe la entrada pero no tiene tamaño o páginas, agregarlos
+            # Si ya existe la entrada pero no tiene tamaño, páginas o hash, agregarlos
             entry = self.index_manager.get_entry(doc_id)
-            if entry:
-                if entry.get("size") is None:
-                    file_size = self.file_manager.get_file_size(source_path)
-                    if file_size is not None:
-                        self.index_manager.add_file_size(doc_id, file_size)
-                
-                if entry.get("pages") is None:
-                    try:
-                        pages_count = self.pdf_processor.count_pdf_pages(source_path)
-                        self.index_manager.add_pages_count(doc_id, pages_count)
-                    except Exception:
-                        pass
+            if entry and entry.get("size") is None:
+                file_size = self.file_manager.get_file_size(source_path)
+                if file_size is not None:
+                    self.index_manager.add_file_size(doc_id, file_size)
+            if entry and entry.get("pages") is None:
+                try:
+                    self.index_manager.add_pages_count(doc_id, self.pdf_processor.count_pdf_pages(source_path))
+                except Exception:
+                    pass
+            if entry and not entry.get("file_hash"):
+                file_hash = self.file_manager.calculate_file_hash(source_path)
+                if file_hash:
+                    self.index_manager.add_file_hash(doc_id, file_hash)
 
         print(f"[RAGService] Iniciando indexación de {safe_filename} (doc_id={doc_id})")
 
-        # chunking usando PDFProcessor - usar get_pdf_info para eficiencia
+        # Pipeline en streaming: páginas -> chunks -> lotes -> embeddings -> Chroma/BM25.
+        # Los lotes ya insertados son consultables mientras se leen las páginas siguientes.
+        entry = self.index_manager.get_entry(doc_id)
+        progress = IngestionProgress(
+            doc_id,
+            entry.get("pages") if entry else None,
+            self.index_manager.save_progress,
+            settings.PROGRESS_FLUSH_INTERVAL_SECONDS,
+        )
+        progress.flush(force=True)
+        bm25_writer = self.bm25_store.open_writer(doc_id)
         try:
-            pdf_info = self.pdf_processor.get_pdf_info(source_path)
-            chunks = pdf_info["chunks"]
-            pages_count = pdf_info["pages"]
-            
-            # Actualizar páginas si no se había guardado antes
-            entry = self.index_manager.get_entry(doc_id)
-            if entry and entry.get("pages") is None:
-                self.index_manager.add_pages_count(doc_id, pages_count)
-                
+            with track_stage("ingest") as stage:
+                chunks_count = self.vector_store.add_document_stream(
+                    self._iter_chunk_batches(doc_id, safe_filename, source_path, bm25_writer, progress),
+                    on_progress=progress.add,
+                )
+                stage.items = chunks_count
+            if chunks_count == 0:
+                raise RuntimeError("No se pudieron extraer chunks del PDF")
         except Exception:
+            metrics.DOCUMENTS_INDEXED.inc(result="failed")
+            progress.flush(force=True)
+            bm25_writer.abort()
             self.index_manager.mark_as_failed(doc_id)
+            # No dejar chunks parciales en Chroma (un reintento los volverá a insertar)
+            try:
+                self.vector_store.delete_by_metadata({"doc_id": doc_id})
+            except Exception as e:
+                print(f"[RAGService] No se pudieron limpiar chunks parciales de {doc_id}: {str(e)}")
             raise
 
-        # generar metadatos e IDs usando PDFProcessor
-        metadatas = self.pdf_processor.create_metadata(doc_id, safe_filename, len(chunks))
-        ids = self.pdf_processor.generate_chunk_ids(doc_id, len(chunks))
-
-        # añadir a Chroma usando ChromaDBManager
+        # índice léxico (si falla, la búsqueda vectorial sigue funcionando)
         try:
-            self.chroma_db.add_documents(chunks, metadatas, ids)
-        except Exception:
-            self.index_manager.mark_as_failed(doc_id)
-            raise
+            with track_stage("bm25_write"):
+                bm25_writer.commit()
+        except Exception as e:
+            print(f"[RAGService] No se pudo crear el índice BM25 de {doc_id}: {str(e)}")
 
         # actualizar entrada con datos finales usando IndexManager
-        self.index_manager.mark_as_completed(doc_id, len(chunks))
-        
-        # Agregar hash del archivo para detección de duplicados futuros
-        file_hash = self.file_manager.calculate_file_hash(source_path)
-        if file_hash:
-            self.index_manager.add_file_hash(doc_id, file_hash)
+        self.index_manager.mark_as_completed(doc_id, chunks_count)
+        metrics.DOCUMENTS_INDEXED.inc(result="ready")
+        progress.finish()
+        self._invalidate_answers(doc_id)
 
-        print(f"[RAGService] Indexación completada: {safe_filename} (doc_id={doc_id}, chunks={len(chunks)})")
+        print(f"[RAGService] Indexación completada: {safe_filename} (doc_id={doc_id}, chunks={chunks_count})")
 
         # mantener límite usando IndexManager
-        deleted_doc_id = self.index_manager.enforce_max_documents(MAX_DOCS, doc_id)
-        if deleted_doc_id:
-            self.delete_document(deleted_doc_id)
+        evicted_entry = self.index_manager.enforce_max_documents(MAX_DOCS, doc_id)
+        if evicted_entry:
+            print(f"[RAGService] Límite de {MAX_DOCS} documentos alcanzado, eliminando {evicted_entry['doc_id']}")
+            self._purge_document(evicted_entry)
 
         # Obtener información del archivo para el retorno
         file_size = self.file_manager.get_file_size(source_path)
@@ -145,142 +251,518 @@ class RAGService:
         return {
             "doc_id": doc_id,
             "filename": safe_filename,
-            "chunks": len(chunks),
+            "chunks": chunks_count,
             "path": source_path,
             "status": "ready",
             "size": file_size,
             "pages": pages_count,
         }
 
+    def _iter_chunk_batches(
+        self,
+        doc_id: str,
+        filename: str,
+        source_path: str,
+        bm25_writer: Optional[BM25Writer] = None,
+        progress: Optional[IngestionProgress] = None,
+    ) -> Iterator[Tuple[List[Document], List[Dict[str, Any]], List[str]]]:
+        """
+        Agrupa los chunks del PDF en lotes de EMBEDDING_BATCH_SIZE con sus metadatos e IDs.
+        
+        Args:
+            doc_id: ID del documento
+            filename: Nombre del archivo
+            source_path: Ruta del PDF
+            bm25_writer: Si se indica, cada lote se añade también al índice léxico
+            progress: Si se indica, cuenta las páginas extraídas y los chunks generados
+            
+        Yields:
+            Tuplas (chunks, metadatos, ids) por lote
+        """
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        batch: List[Document] = []
+        start = 0
+        
+        def make_batch() -> Tuple[List[Document], List[Dict[str, Any]], List[str]]:
+            metadatas = self.pdf_processor.create_batch_metadata(doc_id, filename, start, len(batch))
+            ids = self.pdf_processor.generate_chunk_ids(doc_id, len(batch), start)
+            if bm25_writer is not None:
+                bm25_writer.add(ids, [c.page_content for c in batch], metadatas)
+            return batch, metadatas, ids
+        
+        pages = self.pdf_processor.iter_pages(source_path)
+        if progress is not None:
+            pages = progress.track(PAGES_EXTRACTED, pages)
+        chunks = self.pdf_processor.split_pages(pages)
+        if progress is not None:
+            chunks = progress.track(CHUNKS_SPLIT, chunks)
+        
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield make_batch()
+                start += len(batch)
+                batch = []
+        if batch:
+            yield make_batch()
+
+    def load_document_chunks(self, doc_id: str, filename: str, source_path: str) -> Tuple[List[Document], List[Dict[str, Any]], List[str]]:
+        """
+        Vuelve a trocear un PDF y retorna todos sus chunks con los mismos metadatos e IDs
+        que al indexarlo (para reconstruir el almacén vectorial).
+        
+        Returns:
+            Tupla (chunks, metadatos, ids) del documento completo
+        """
+        chunks: List[Document] = []
+        metadatas: List[Dict[str, Any]] = []
+        ids: List[str] = []
+        for batch_chunks, batch_metadatas, batch_ids in self._iter_chunk_batches(doc_id, filename, source_path):
+            chunks.extend(batch_chunks)
+            metadatas.extend(batch_metadatas)
+            ids.extend(batch_ids)
+        return chunks, metadatas, ids
+
     # ---------- delete ----------
     def delete_document(self, doc_id: str) -> bool:
-        # Buscar entrada usando IndexManager
-        entry = self.index_manager.get_entry(doc_id)
-        if not entry:
-            print(f"[RAGService] Documento {doc_id} no encontrado en el índice")
-            return False
+        with track_stage("delete"):
+            # Eliminar del índice usando IndexManager (a partir de aquí el documento ya no existe para la API)
+            entry = self.index_manager.delete_entry(doc_id)
+            if not entry:
+                print(f"[RAGService] Documento {doc_id} no encontrado en el índice")
+                return False
 
-        # Verificar cuántos chunks existen antes de eliminar
-        chunks_before = self.chroma_db.count_document_chunks(doc_id)
-        print(f"[RAGService] Eliminando documento {doc_id} ({chunks_before} chunks)")
+            self._purge_document(entry)
+            return True
 
-        # Eliminar del índice usando IndexManager
-        deleted_entry = self.index_manager.delete_entry(doc_id)
-        if not deleted_entry:
-            print(f"[RAGService] Error al eliminar entrada del índice: {doc_id}")
-            return False
+    def _purge_document(self, entry: Dict[str, Any]) -> None:
+        """
+        Elimina los datos de un documento ya quitado del índice: chunks, BM25, cachés y PDF.
+        
+        Los chunks se borran por sus IDs deterministas sin consultar la colección. Si algo
+        queda (fallo de Chroma, indexación aún en curso), el reconciliador lo limpiará.
+        """
+        doc_id = entry["doc_id"]
+        chunks = entry.get("chunks") or 0
+        print(f"[RAGService] Eliminando documento {doc_id} ({chunks} chunks)")
+        
+        self._invalidate_answers(doc_id)
+        self.job_queue.cancel_document(doc_id)
 
-        # intentar borrar embeddings por metadata usando ChromaDBManager
         try:
-            self.chroma_db.delete_by_metadata({"doc_id": doc_id})
-            
-            # Verificar que la eliminación fue exitosa
-            if not self.chroma_db.verify_document_deleted(doc_id):
-                print(f"[RAGService] ADVERTENCIA: Eliminación incompleta de embeddings para {doc_id}")
-                # fallback: reconstruir la BD desde index
-                print(f"[RAGService] Reconstruyendo base de datos como fallback...")
-                self._rebuild_chroma_from_index()
-                
+            if entry.get("status") == "ready" and chunks:
+                self.vector_store.delete_document_chunks(doc_id, chunks, verify=settings.DELETE_VERIFY)
+            else:
+                # Indexación incompleta: el número de chunks en Chroma no se conoce
+                self.vector_store.delete_by_metadata({"doc_id": doc_id})
         except Exception as e:
-            print(f"[RAGService] Error al eliminar embeddings: {str(e)}")
-            # fallback: reconstruir la BD desde index
-            print(f"[RAGService] Reconstruyendo base de datos como fallback...")
-            self._rebuild_chroma_from_index()
+            print(f"[RAGService] Error al eliminar embeddings de {doc_id}, el reconciliador los limpiará: {str(e)}")
 
-        # borrar archivo pdf del disco usando FileManager
+        # borrar índice léxico y archivo pdf del disco usando FileManager
+        self.bm25_store.delete_document(doc_id)
+        self.document_cache.invalidate(entry.get("path"))
         file_deleted = self.file_manager.delete_file(entry.get("path"))
         if file_deleted:
             print(f"[RAGService] Archivo físico eliminado: {entry.get('path')}")
         else:
             print(f"[RAGService] No se pudo eliminar archivo físico: {entry.get('path')}")
-
-        # Limpiar cola de embeddings para evitar rastros
-        queue_cleaned = self.chroma_db.cleanup_embeddings_queue()
-        
-        # Si la limpieza detecta registros huérfanos, reconstruir la base
-        if not queue_cleaned:
-            print(f"[RAGService] Detectados registros huérfanos, iniciando reconstrucción preventiva...")
-            self._rebuild_chroma_from_index()
         
         print(f"[RAGService] Documento eliminado completamente: {doc_id}")
-        return True
-
-    def _rebuild_chroma_from_index(self):
-        all_chunks: List[Any] = []
-        all_metas: List[Dict[str, Any]] = []
-        for entry in self.index_manager.get_all_entries():
-            chunks = self.pdf_processor.load_and_split_pdf(entry["path"])
-            metas = self.pdf_processor.create_metadata(entry["doc_id"], entry["filename"], len(chunks))
-            all_chunks.extend(chunks)
-            all_metas.extend(metas)
-        self.chroma_db.rebuild_from_documents(all_chunks, all_metas)
 
     # ---------- ask ----------
+    @staticmethod
+    def _no_results_message(doc_id: Optional[str]) -> str:
+        return f"No encontré información para el documento con id '{doc_id}'." if doc_id else "No encontré información relevante."
+
+    @staticmethod
+    def _build_chain_inputs(question: str, docs: List[Document]) -> Dict[str, str]:
+        return {
+            "context": "\n\n".join(doc.page_content for doc in docs),
+            "question": question,
+        }
+
+    # ---------- answer cache ----------
+    def _answer_key(self, question: str, doc_id: Optional[str], k: int) -> Optional[Any]:
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.make_key(question, doc_id, k, settings.CHAT_MODEL)
+
+    def _cached_answer(self, key: Optional[Any]) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None or key is None:
+            return None
+        return self.answer_cache.get(key)
+
+    def _store_answer(self, key: Optional[Any], answer: str, docs: List[Document]) -> None:
+        if self.answer_cache is not None and key is not None:
+            self.answer_cache.put(key, answer, self._serialize_sources(docs))
+
+    def _invalidate_answers(self, doc_id: str) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_document(doc_id)
+
+    # ---------- retrieval ----------
+    @staticmethod
+    def _candidate_count(k: int) -> int:
+        return max(k, k * settings.HYBRID_CANDIDATE_FACTOR) if settings.HYBRID_SEARCH_ENABLED else k
+
+    def _fuse(self, question: str, vector_docs: List[Document], doc_id: Optional[str], k: int) -> List[Document]:
+        """Combina resultados vectoriales y BM25 con Reciprocal Rank Fusion."""
+        if not settings.HYBRID_SEARCH_ENABLED:
+            return vector_docs[:k]
+        with track_stage("bm25_search"):
+            lexical_docs = self.bm25_store.search(question, self._candidate_count(k), doc_id)
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], k, settings.RRF_K)
+
+    def _retrieve(self, question: str, doc_id: Optional[str], k: int) -> List[Document]:
+        with track_stage("retrieval"):
+            with track_stage("vector_search"):
+                vector_docs = self.vector_store.search(question, self._candidate_count(k), {"doc_id": doc_id} if doc_id else None)
+            return self._fuse(question, vector_docs, doc_id, k)
+
+    async def _aretrieve(self, question: str, doc_id: Optional[str], k: int) -> List[Document]:
+        # Búsqueda vectorial y BM25 en el mismo hilo: ninguna de las dos bloquea el event loop
+        return await asyncio.to_thread(self._retrieve, question, doc_id, k)
+
     def ask(self, question: str, doc_id: Optional[str] = None, k: Optional[int] = None) -> str:
+        with metrics.track_ask() as outcome:
+            k = k or settings.K
+            key = self._answer_key(question, doc_id, k)
+            cached = self._cached_answer(key)
+            if cached is not None:
+                outcome.result = "cached"
+                return cached["answer"]
+
+            # Una sola recuperación (vectorial + léxica): los documentos se pasan directamente al prompt
+            docs = self._retrieve(question, doc_id, k)
+
+            if not docs:
+                outcome.result = "no_results"
+                answer = self._no_results_message(doc_id)
+            else:
+                with track_stage("llm"):
+                    answer = self.answer_chain.invoke(self._build_chain_inputs(question, docs))
+
+            self._store_answer(key, answer, docs)
+            return answer
+
+    async def aask(self, question: str, doc_id: Optional[str] = None, k: Optional[int] = None) -> str:
+        """Versión asíncrona de ask: la recuperación y la llamada al LLM no bloquean el event loop."""
+        with metrics.track_ask() as outcome:
+            k = k or settings.K
+            key = self._answer_key(question, doc_id, k)
+            cached = self._cached_answer(key)
+            if cached is not None:
+                outcome.result = "cached"
+                return cached["answer"]
+
+            async with self._ask_semaphore:
+                docs = await self._aretrieve(question, doc_id, k)
+
+                if not docs:
+                    outcome.result = "no_results"
+                    answer = self._no_results_message(doc_id)
+                else:
+                    with track_stage("llm"):
+                        answer = await self.answer_chain.ainvoke(self._build_chain_inputs(question, docs))
+
+            self._store_answer(key, answer, docs)
+            return answer
+
+    def _retrieve_many(self, questions: List[str], doc_id: Optional[str], k: int) -> List[List[Document]]:
+        """Recuperación de varias preguntas: un lote de embeddings y una búsqueda vectorial conjunta."""
+        with track_stage("retrieval", items=len(questions)):
+            with track_stage("vector_search", items=len(questions)):
+                vector_results = self.vector_store.search_many(questions, self._candidate_count(k), {"doc_id": doc_id} if doc_id else None)
+            return [self._fuse(question, vector_docs, doc_id, k) for question, vector_docs in zip(questions, vector_results)]
+
+    async def aask_batch(self, questions: List[str], doc_id: Optional[str] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Responde varias preguntas sobre los mismos documentos en una sola llamada.
+
+        Las preguntas repetidas en el lote (misma clave de caché) se responden una sola
+        vez y las que están en caché, directamente. Para el resto, los embeddings
+        se calculan en un solo lote y las búsquedas vectoriales en una sola consulta;
+        después las llamadas al LLM se lanzan a la vez, como mucho ASK_BATCH_CONCURRENCY
+        por lote (y dentro del límite global ASK_MAX_CONCURRENCY). Un fallo en una
+        pregunta no afecta a las demás.
+
+        Args:
+            questions: Preguntas del usuario
+            doc_id: Documento al que limitar la búsqueda (opcional)
+            k: Número de chunks a recuperar por pregunta (por defecto settings.K)
+
+        Returns:
+            Por pregunta, en el mismo orden, {"answer": str} o {"error": str}
+        """
         k = k or settings.K
+        results: List[Dict[str, Any]] = [{} for _ in questions]
+        keys = [self._answer_key(question, doc_id, k) for question in questions]
+
+        # Cada pregunta repetida apunta a la primera con su misma clave (sin caché, la pregunta normalizada)
+        first: Dict[Hashable, int] = {}
+        duplicates: List[Tuple[int, int]] = []
+        pending: List[int] = []
+        for i, key in enumerate(keys):
+            dedupe_key: Hashable = key if key is not None else normalize_question(questions[i])
+            if dedupe_key in first:
+                duplicates.append((i, first[dedupe_key]))
+                continue
+            first[dedupe_key] = i
+            cached = self._cached_answer(key)
+            if cached is None:
+                pending.append(i)
+                continue
+            metrics.record_ask("cached")
+            results[i] = {"answer": cached["answer"]}
+
+        if pending:
+            await self._answer_pending(questions, keys, pending, results, doc_id, k)
+
+        for i, original in duplicates:
+            results[i] = dict(results[original])
+            metrics.record_ask("cached" if "answer" in results[i] else "error")
+        return results
+
+    async def _answer_pending(
+        self,
+        questions: List[str],
+        keys: List[Optional[Any]],
+        pending: List[int],
+        results: List[Dict[str, Any]],
+        doc_id: Optional[str],
+        k: int,
+    ) -> None:
+        """Recupera y responde las preguntas de aask_batch que no estaban en caché (rellena results)."""
+        try:
+            retrieved = await asyncio.to_thread(self._retrieve_many, [questions[i] for i in pending], doc_id, k)
+        except Exception as e:
+            print(f"[RAGService] Error en la recuperación del lote: {str(e)}")
+            for i in pending:
+                metrics.record_ask("error")
+                results[i] = {"error": f"Error en la recuperación: {str(e)}"}
+            return
+
+        batch_semaphore = asyncio.Semaphore(max(1, settings.ASK_BATCH_CONCURRENCY))
 
-        retriever = self.chroma_db.get_retriever({
-            "k": k,
-            "filter": {"doc_id": doc_id} if doc_id else None
-        })
+        async def answer(i: int, docs: List[Document]) -> None:
+            try:
+                with metrics.track_ask() as outcome:
+                    if not docs:
+                        outcome.result = "no_results"
+                        text = self._no_results_message(doc_id)
+                    else:
+                        async with batch_semaphore, self._ask_semaphore:
+                            with track_stage("llm"):
+                                text = await self.answer_chain.ainvoke(self._build_chain_inputs(questions[i], docs))
+                    self._store_answer(keys[i], text, docs)
+                results[i] = {"answer": text}
+            except Exception as e:
+                results[i] = {"error": str(e)}
 
-        # Recuperar documentos con invoke en lugar de get_relevant_documents
-        docs = retriever.invoke(question)
+        await asyncio.gather(*(answer(i, docs) for i, docs in zip(pending, retrieved)))
+
+    @staticmethod
+    def _serialize_source(doc: Document) -> Dict[str, Any]:
+        # LangChain declara metadata como dict sin parametrizar
+        metadata = cast(Dict[str, Any], doc.metadata)  # pyright: ignore[reportUnknownMemberType]
+        return {
+            "doc_id": metadata.get("doc_id"),
+            "filename": metadata.get("filename"),
+            "chunk_index": metadata.get("chunk_index"),
+            "snippet": doc.page_content[:200],
+        }
 
-        if not docs:
-            return f"No encontré información para el documento con id '{doc_id}'." if doc_id else "No encontré información relevante."
+    @classmethod
+    def _serialize_sources(cls, docs: List[Document]) -> List[Dict[str, Any]]:
+        return [cls._serialize_source(doc) for doc in docs]
 
-        # Usar invoke en lugar de run
-        qa = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            retriever=retriever,
-            chain_type="stuff"
+    async def astream_answer(self, question: str, doc_id: Optional[str] = None, k: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Responde una pregunta emitiendo eventos a medida que están disponibles.
+
+        Primero emite un evento "sources" con los chunks recuperados, después un
+        evento "token" por cada fragmento que devuelve el LLM y finalmente "done".
+
+        Args:
+            question: Pregunta del usuario
+            doc_id: Documento al que limitar la búsqueda (opcional)
+            k: Número de chunks a recuperar (por defecto settings.K)
+
+        Yields:
+            Diccionarios {"event": str, "data": Any}
+        """
+        with metrics.track_ask() as outcome:
+            k = k or settings.K
+            key = self._answer_key(question, doc_id, k)
+            cached = self._cached_answer(key)
+            if cached is not None:
+                outcome.result = "cached"
+                yield {"event": "sources", "data": cached["sources"]}
+                yield {"event": "token", "data": cached["answer"]}
+                yield {"event": "done", "data": {}}
+                return
+
+            async with self._ask_semaphore:
+                docs = await self._aretrieve(question, doc_id, k)
+                yield {"event": "sources", "data": self._serialize_sources(docs)}
+
+                if not docs:
+                    outcome.result = "no_results"
+                    answer = self._no_results_message(doc_id)
+                    yield {"event": "token", "data": answer}
+                else:
+                    parts: List[str] = []
+                    started = time.perf_counter()
+                    async for token in self.answer_chain.astream(self._build_chain_inputs(question, docs)):
+                        if token:
+                            if not parts:
+                                metrics.observe_stage("llm_first_token", time.perf_counter() - started)
+                                record_span("llm_first_token", started)
+                            parts.append(token)
+                            yield {"event": "token", "data": token}
+                    metrics.observe_stage("llm", time.perf_counter() - started)
+                    record_span("llm", started, tokens=len(parts))
+                    answer = "".join(parts)
+
+            self._store_answer(key, answer, docs)
+            yield {"event": "done", "data": {}}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Estadísticas de las cachés de respuestas, de embeddings y de consultas."""
+        return {
+            "answers": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "embeddings": self.vector_store.embedding_cache_stats(),
+            "queries": self.vector_store.query_cache_stats(),
+        }
+
+    # ---------- metrics ----------
+    def _collect_metrics(self) -> None:
+        """Actualiza los gauges de profundidad de la cola y de documentos por estado."""
+        for state, count in self.job_queue.stats().items():
+            metrics.INDEXING_QUEUE_JOBS.set(count, state=state)
+        counts = {"processing": 0, "ready": 0, "failed": 0}
+        for entry in self.index_manager.get_all_entries():
+            status = entry.get("status", "processing")
+            counts[status] = counts.get(status, 0) + 1
+        for status, count in counts.items():
+            metrics.DOCUMENTS.set(count, status=status)
+
+    # ---------- progress ----------
+    def get_progress(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el progreso de indexación de un documento.
+        
+        Args:
+            doc_id: ID del documento
+            
+        Returns:
+            Contadores de progreso con status y stage ("queued", "indexing", "ready"
+            o "failed"), o None si el documento no existe
+        """
+        entry = self.index_manager.get_entry(doc_id)
+        if entry is None:
+            return None
+        
+        status = entry.get("status", "processing")
+        progress = self.index_manager.get_progress(doc_id)
+        if progress is None:
+            # Documentos indexados antes de existir el seguimiento, o aún en cola
+            done = entry.get("chunks", 0) if status == "ready" else 0
+            progress = {
+                "pages_extracted": (entry.get("pages") or 0) if status == "ready" else 0,
+                "chunks_split": done,
+                "chunks_embedded": done,
+                "chunks_stored": done,
+                "total_pages": entry.get("pages"),
+                "percent": 100.0 if status == "ready" else None,
+                "eta_seconds": 0.0 if status == "ready" else None,
+                "started_at": None,
+                "updated_at": None,
+                "finished": status == "ready",
+            }
+        
+        if status == "processing":
+            stage = "indexing" if progress.get("started_at") else "queued"
+        else:
+            stage = status
+        return {"doc_id": doc_id, "status": status, "stage": stage, **progress}
+
+    # ---------- arranque / parada ----------
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Precarga lo que la primera petición pagaría en frío: índice SQLite, colección e
+        índice HNSW (o matrices NumPy), índices BM25 y pypdf.
+
+        Un paso que falla se registra y no impide los demás: el servicio sigue siendo
+        usable, solo que ese paso se cargará en la primera petición que lo necesite.
+
+        Returns:
+            Por paso: duración en ms y resultado (o error)
+        """
+        def load_pdf_library() -> str:
+            import pypdf
+            return pypdf.__version__
+
+        steps = (
+            ("index", self.index_manager.count_entries),
+            ("vector_store", self.vector_store.warm_up),
+            ("bm25", self.bm25_store.warm_up),
+            ("pdf", load_pdf_library),
         )
+        report: Dict[str, Any] = {}
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                report[name] = {"result": step()}
+            except Exception as e:
+                print(f"[RAGService] Error en el calentamiento ({name}): {str(e)}")
+                report[name] = {"error": str(e)}
+            report[name]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"[RAGService] Calentamiento completado: " + ", ".join(f"{name} {step['ms']} ms" for name, step in report.items()))
+        return report
 
-        result = qa.invoke({"query": question})
-        return result["result"] if isinstance(result, dict) else result  # type: ignore[return-value]
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Detiene los hilos de indexación y el reconciliador (los trabajos en curso se retoman tras su lease)."""
+        self.indexing_pool.stop(timeout)
+        self.reconciler.stop(timeout)
 
     # ---------- status ----------
     def status(self) -> Dict[str, Union[List[Dict[str, Any]], int, bool]]:
-        # Limpiar documentos en processing que pueden haber fallado
-        self._cleanup_stale_processing_documents()
-        
+        # Solo lecturas: la limpieza de documentos obsoletos la hace el reconciliador
         return {
             "documents": self.index_manager.get_all_entries(),
             "total": self.index_manager.count_entries(),
-            "chroma_persisted": self.chroma_db.is_persisted(),
+            "chroma_persisted": self.vector_store.is_persisted(),
         }
-    
-    def _cleanup_stale_processing_documents(self) -> None:
-        """Limpia documentos que quedaron en estado 'processing' por más de 5 minutos."""
-        from datetime import datetime, timezone, timedelta
-        
-        processing_docs = self.index_manager.find_entries_by_status("processing")
-        current_time = datetime.now(timezone.utc)
-        
-        for doc in processing_docs:
-            try:
-                uploaded_at = datetime.fromisoformat(doc["uploaded_at"].replace('Z', '+00:00'))
-                if current_time - uploaded_at > timedelta(minutes=5):
-                    print(f"[RAGService] Limpiando documento obsoleto: {doc['doc_id']}")
-                    self.index_manager.mark_as_failed(doc["doc_id"])
-                    # Intentar eliminar archivo huérfano
-                    self.file_manager.delete_file(doc.get("path"))
-            except Exception as e:
-                print(f"[RAGService] Error al limpiar documento {doc['doc_id']}: {str(e)}")
-                continue
 
 
 
-def get_rag_service(request: Request) -> RAGService:
-    """Dependency: retorna la instancia singleton guardada en app.state.rag_service."""
-    service = getattr(request.app.state, "rag_service", None)
+_service_lock = Lock()
+
+
+def get_or_create_rag_service(app: Any) -> RAGService:
+    """Retorna el singleton de app.state.rag_service, creándolo si no existe."""
+    service = getattr(app.state, "rag_service", None)
     if service is None:
-        service = create_rag_service_singleton()
-        request.app.state.rag_service = service
+        # Doble comprobación: las primeras peticiones concurrentes no deben crear varias instancias
+        with _service_lock:
+            service = getattr(app.state, "rag_service", None)
+            if service is None:
+                service = create_rag_service_singleton()
+                app.state.rag_service = service
     return service
 
 
+def get_rag_service(request: Request) -> RAGService:
+    """
+    Dependency: retorna la instancia singleton guardada en app.state.rag_service.
+
+    Normalmente la crea el lifespan de la aplicación al arrancar; si no se ejecutó
+    (p.ej. un TestClient usado sin "with"), se crea en la primera petición.
+    """
+    return get_or_create_rag_service(request.app)
+
+
 # factory para dependencia (mejor registrar singleton en main via app.state)
 def create_rag_service_singleton():
     return RAGService()
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.utils.file_lock import FileLock
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+REBUILD_SERVICE_LOCK_FILE = "vector_rebuild.lock"
+REBUILD_REPORT_FILE = "vector_rebuild_report.json"
+
+
+class VectorRebuilder:
+    """
+    Reconstrucción del almacén vectorial a partir de los PDFs de los documentos listos.
+
+    Vuelve a leer y trocear cada PDF (los IDs de chunk son deterministas) y se lo pasa
+    a rebuild_from_stream, que reutiliza los vectores guardados con el mismo id y texto
+    y solo embebe los que faltan. Sirve para compactar el almacén, eliminar restos que
+    el reconciliador no ve o recuperar vectores tras cambiar el troceado.
+
+    Los documentos listos cuyo PDF ya no existe no pueden reconstruirse: sus vectores
+    desaparecen con la reconstrucción y se marcan como fallidos. Un documento que
+    termina de indexarse durante la reconstrucción puede quedar fuera; el reconciliador
+    lo detecta como incompleto y lo reencola.
+
+    Con varios workers solo uno reconstruye a la vez. El informe se guarda en disco
+    tras cada documento, así GET /rag/vectors/rebuild muestra el progreso desde
+    cualquier worker.
+    """
+
+    def __init__(self, service: "RAGService"):
+        self.service = service
+        self._lock = FileLock(os.path.join(service.vector_store.persist_directory, REBUILD_SERVICE_LOCK_FILE))
+        self._report_path = os.path.join(service.vector_store.persist_directory, REBUILD_REPORT_FILE)
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """
+        Reconstruye el almacén vectorial y guarda el informe.
+
+        Returns:
+            Informe de la reconstrucción o None si otro proceso está reconstruyendo
+
+        Raises:
+            RuntimeError: Si la reconstrucción falla (el informe queda como "failed")
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._rebuild()
+        finally:
+            self._lock.release()
+
+    def last_report(self) -> Optional[Dict[str, Any]]:
+        """Retorna el último informe guardado (de cualquier worker) o None."""
+        try:
+            with open(self._report_path, "r", encoding="utf-8") as f:
+                report: Dict[str, Any] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if report.get("status") == "running" and self._lock.acquire(blocking=False):
+            # Nadie tiene el lock: el proceso que reconstruía terminó sin cerrar el informe
+            self._lock.release()
+            report["status"] = "interrupted"
+        return report
+
+    def _save_report(self, report: Dict[str, Any]) -> None:
+        tmp_path = f"{self._report_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp_path, self._report_path)
+
+    def _rebuild(self) -> Dict[str, Any]:
+        started = time.time()
+        index_manager = self.service.index_manager
+        file_manager = self.service.file_manager
+
+        entries: List[Dict[str, Any]] = []
+        missing_files: List[str] = []
+        for entry in index_manager.get_all_entries():
+            if entry.get("status") != "ready":
+                continue
+            if entry.get("path") and file_manager.file_exists(entry["path"]):
+                entries.append(entry)
+            else:
+                missing_files.append(entry["doc_id"])
+
+        report: Dict[str, Any] = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "status": "running",
+            "duration_ms": None,
+            "total_documents": len(entries),
+            "documents": 0,
+            "chunks": 0,
+            "reused": 0,
+            "embedded": 0,
+            "missing_files": missing_files,
+            "error": None,
+        }
+        self._save_report(report)
+
+        def on_progress(stats: Dict[str, int]) -> None:
+            report.update(stats)
+            self._save_report(report)
+
+        try:
+            stats = self.service.vector_store.rebuild_from_stream(self._iter_documents(entries), len(entries), on_progress)
+        except Exception as e:
+            report["status"] = "failed"
+            report["error"] = str(e)
+            report["duration_ms"] = round((time.time() - started) * 1000, 1)
+            self._save_report(report)
+            raise RuntimeError(f"Error al reconstruir el almacén vectorial: {str(e)}")
+
+        # Sus vectores ya no están en el almacén y sin PDF no pueden volver a indexarse
+        for doc_id in missing_files:
+            index_manager.mark_as_failed(doc_id)
+            print(f"[Rebuilder] Documento {doc_id} sin PDF, marcado como fallido")
+
+        report.update(stats)
+        report["status"] = "completed"
+        report["duration_ms"] = round((time.time() - started) * 1000, 1)
+        self._save_report(report)
+        print(
+            f"[Rebuilder] Reconstrucción completada en {report['duration_ms']} ms: "
+            f"{report['documents']} documentos, {report['reused']} vectores reutilizados, {report['embedded']} embebidos"
+        )
+        return report
+
+    def _iter_documents(self, entries: List[Dict[str, Any]]) -> Iterator[Tuple[List[Document], List[Dict[str, Any]], List[str]]]:
+        """Vuelve a trocear el PDF de cada documento, uno a uno (solo un documento en memoria)."""
+        for entry in entries:
+            chunks, metadatas, ids = self.service.load_document_chunks(entry["doc_id"], entry.get("filename") or entry["doc_id"], entry["path"])
+            if ids:
+                yield chunks, metadatas, ids
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+from datetime import datetime, timezone, timedelta
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from src.config import settings
+from src.utils.file_lock import FileLock
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+RECONCILE_LOCK_FILE = "reconcile.lock"
+RECONCILE_REPORT_FILE = "reconcile_report.json"
+# Documentos en "processing" sin trabajo vivo durante más de este tiempo se marcan como fallidos
+STALE_PROCESSING_AFTER = timedelta(minutes=5)
+
+
+class Reconciler:
+    """
+    Reconciliación periódica en segundo plano entre el índice, los PDFs en disco y Chroma.
+
+    Compara doc_ids y número de chunks de los tres almacenes (Chroma solo con
+    consultas de metadatos) y repara de forma incremental:
+
+    - chunks y índices BM25 de documentos que ya no están en el índice: se eliminan
+    - chunks de más (IDs fuera del rango registrado): se eliminan
+    - documentos listos con chunks o BM25 incompletos: se reencolan para indexarse
+    - PDFs y temporales que ningún documento referencia: se eliminan tras un margen
+    - documentos en "processing" sin trabajo de indexación vivo: se marcan como fallidos
+    - trabajos de indexación fallidos hace más de INDEXING_FAILED_JOB_RETENTION_SECONDS: se eliminan
+
+    Así las peticiones (status, delete) no pagan comprobaciones de integridad. Con
+    varios workers solo uno reconcilia a la vez; el último informe se guarda en disco.
+    """
+
+    def __init__(self, service: "RAGService", interval_seconds: float = 600):
+        self.service = service
+        self.interval_seconds = interval_seconds
+        self._lock = FileLock(os.path.join(service.vector_store.persist_directory, RECONCILE_LOCK_FILE))
+        self._report_path = os.path.join(service.vector_store.persist_directory, RECONCILE_REPORT_FILE)
+        self._stopping = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """Arranca el hilo de reconciliación (si el intervalo es mayor que 0)."""
+        if self._thread is not None or self.interval_seconds <= 0:
+            return
+        self._thread = Thread(target=self._run, name="reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Detiene el hilo de reconciliación."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Reconciler] Error durante la reconciliación: {str(e)}")
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """
+        Ejecuta una ronda de reconciliación y guarda el informe.
+
+        Returns:
+            Informe de la ronda o None si otro proceso está reconciliando
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            report = self._reconcile()
+            self._save_report(report)
+            return report
+        finally:
+            self._lock.release()
+
+    def last_report(self) -> Optional[Dict[str, Any]]:
+        """Retorna el último informe guardado (de cualquier worker) o None."""
+        try:
+            with open(self._report_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_report(self, report: Dict[str, Any]) -> None:
+        tmp_path = f"{self._report_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp_path, self._report_path)
+
+    def _is_orphan(self, doc_id: str) -> bool:
+        # Se vuelve a consultar el índice: el documento pudo crearse durante el recorrido
+        return not doc_id or self.service.index_manager.get_entry(doc_id) is None
+
+    def _reconcile(self) -> Dict[str, Any]:
+        started = time.time()
+        report: Dict[str, Any] = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "documents": 0,
+            "chroma_chunks": 0,
+            "orphan_chunks": 0,
+            "orphan_documents": [],
+            "extra_chunks": 0,
+            "orphan_bm25": [],
+            "orphan_files": [],
+            "stale_temp_files": 0,
+            "incomplete_documents": [],
+            "missing_files": [],
+            "reindexed": [],
+            "stale_processing": [],
+            "pruned_failed_jobs": 0,
+        }
+
+        self._check_chroma(report)
+        self._check_bm25(report)
+        self._check_files(report)
+        self._check_stale_processing(report)
+        self._prune_failed_jobs(report)
+
+        report["duration_ms"] = round((time.time() - started) * 1000, 1)
+        print(
+            f"[Reconciler] Ronda completada en {report['duration_ms']} ms: "
+            f"{report['orphan_chunks']} chunks huérfanos, {len(report['incomplete_documents'])} documentos incompletos, "
+            f"{len(report['orphan_files'])} archivos huérfanos"
+        )
+        return report
+
+    def _check_chroma(self, report: Dict[str, Any]) -> None:
+        """Compara chunks en Chroma con los documentos del índice."""
+        index_manager = self.service.index_manager
+        vector_store = self.service.vector_store
+        bm25_store = self.service.bm25_store
+
+        chunks_by_doc = vector_store.scan_document_chunks()
+        report["chroma_chunks"] = sum(len(ids) for ids in chunks_by_doc.values())
+        entries = {entry["doc_id"]: entry for entry in index_manager.get_all_entries()}
+        report["documents"] = len(entries)
+
+        for doc_id, chunk_ids in chunks_by_doc.items():
+            if doc_id in entries or not self._is_orphan(doc_id):
+                continue
+            vector_store.delete_ids(chunk_ids)
+            report["orphan_chunks"] += len(chunk_ids)
+            report["orphan_documents"].append(doc_id)
+            print(f"[Reconciler] Eliminados {len(chunk_ids)} chunks huérfanos de {doc_id or '(sin doc_id)'}")
+
+        repairs = 0
+        for doc_id, entry in entries.items():
+            if entry.get("status") != "ready":
+                continue
+            expected = entry.get("chunks") or 0
+            stored = chunks_by_doc.get(doc_id, [])
+
+            extra = [chunk_id for chunk_id in stored if self._chunk_position(doc_id, chunk_id) >= expected]
+            if extra:
+                vector_store.delete_ids(extra)
+                report["extra_chunks"] += len(extra)
+
+            if len(stored) - len(extra) >= expected and bm25_store.has_document(doc_id):
+                continue
+            report["incomplete_documents"].append(doc_id)
+
+            path = entry.get("path")
+            if not path or not self.service.file_manager.file_exists(path):
+                report["missing_files"].append(doc_id)
+                continue
+            if repairs >= settings.RECONCILE_MAX_REPAIRS or self.service.job_queue.has_active_job(doc_id):
+                continue
+            # Los IDs son deterministas: reindexar sobrescribe y completa los chunks que falten
+            self.service.job_queue.enqueue(doc_id, path, entry.get("filename"), priority=-1, max_attempts=settings.INDEXING_MAX_ATTEMPTS)
+            self.service.indexing_pool.notify()
+            report["reindexed"].append(doc_id)
+            repairs += 1
+            print(f"[Reconciler] Documento {doc_id} incompleto ({len(stored) - len(extra)}/{expected} chunks), reencolado")
+
+    @staticmethod
+    def _chunk_position(doc_id: str, chunk_id: str) -> int:
+        suffix = chunk_id[len(doc_id) + 1:] if chunk_id.startswith(f"{doc_id}_") else ""
+        return int(suffix) if suffix.isdigit() else -1
+
+    def _check_bm25(self, report: Dict[str, Any]) -> None:
+        """Elimina índices BM25 de documentos que ya no existen."""
+        bm25_store = self.service.bm25_store
+        for doc_id in bm25_store.list_documents():
+            if self._is_orphan(doc_id):
+                bm25_store.delete_document(doc_id)
+                report["orphan_bm25"].append(doc_id)
+                print(f"[Reconciler] Eliminado índice BM25 huérfano de {doc_id}")
+
+    def _check_files(self, report: Dict[str, Any]) -> None:
+        """Elimina PDFs y temporales que ningún documento referencia."""
+        file_manager = self.service.file_manager
+        grace = settings.RECONCILE_FILE_GRACE_SECONDS
+        referenced = {os.path.abspath(path) for path in self.service.index_manager.get_all_file_paths()}
+
+        for path in file_manager.list_files(min_age_seconds=grace):
+            if os.path.abspath(path) in referenced:
+                continue
+            # Releer el índice por si el archivo se registró durante la ronda
+            if os.path.abspath(path) in {os.path.abspath(p) for p in self.service.index_manager.get_all_file_paths()}:
+                continue
+            if file_manager.delete_file(path):
+                report["orphan_files"].append(os.path.basename(path))
+                print(f"[Reconciler] Eliminado archivo huérfano: {path}")
+
+        # Subidas interrumpidas que nunca se confirmaron
+        for path in file_manager.list_files(file_manager.temp_dir, min_age_seconds=grace):
+            if file_manager.delete_file(path):
+                report["stale_temp_files"] += 1
+
+    def _check_stale_processing(self, report: Dict[str, Any]) -> None:
+        """Marca como fallidos los documentos en "processing" sin trabajo de indexación vivo."""
+        index_manager = self.service.index_manager
+        current_time = datetime.now(timezone.utc)
+        for doc in index_manager.find_entries_by_status("processing"):
+            try:
+                uploaded_at = datetime.fromisoformat(doc["uploaded_at"].replace('Z', '+00:00'))
+                if current_time - uploaded_at <= STALE_PROCESSING_AFTER or self.service.job_queue.has_active_job(doc["doc_id"]):
+                    continue
+                print(f"[Reconciler] Documento sin indexación activa, marcado como fallido: {doc['doc_id']}")
+                index_manager.mark_as_failed(doc["doc_id"])
+                self.service.file_manager.delete_file(doc.get("path"))
+                report["stale_processing"].append(doc["doc_id"])
+            except Exception as e:
+                print(f"[Reconciler] Error al revisar documento {doc['doc_id']}: {str(e)}")
+
+    def _prune_failed_jobs(self, report: Dict[str, Any]) -> None:
+        """Elimina de la cola los trabajos fallidos que superan el periodo de retención."""
+        pruned = self.service.job_queue.prune_failed(settings.INDEXING_FAILED_JOB_RETENTION_SECONDS)
+        report["pruned_failed_jobs"] = pruned
+        if pruned:
+            print(f"[Reconciler] Eliminados {pruned} trabajos de indexación fallidos")
@@ -5,14 +5,34 @@ Este módulo contiene utilidades reutilizables para:
 - Procesamiento de PDFs
 - Gestión de archivos  
 - Manejo del índice de documentos
+- Caché de datos de PDFs y de respuestas
+- Índice léxico BM25
+- Bloqueo de archivos entre procesos
+- Métricas en formato Prometheus
+- Perfilado bajo demanda de peticiones
 """
 
 from .pdf_processor import PDFProcessor
-from .file_manager import FileManager
+from .file_manager import FileManager, InvalidPDFError, FileTooLargeError
 from .index_manager import IndexManager
+from .document_cache import ParsedDocument, ParsedDocumentCache
+from .answer_cache import AnswerCache
+from .bm25_index import BM25Store
+from .file_lock import FileLock
+from .metrics import MetricsRegistry
+from .profiling import Profiler
 
 __all__ = [
     "PDFProcessor",
     "FileManager", 
-    "IndexManager"
+    "InvalidPDFError",
+    "FileTooLargeError",
+    "IndexManager",
+    "ParsedDocument",
+    "ParsedDocumentCache",
+    "AnswerCache",
+    "BM25Store",
+    "FileLock",
+    "MetricsRegistry",
+    "Profiler"
 ]
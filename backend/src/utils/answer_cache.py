@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional, Protocol, Tuple
+
+from src.utils.lru_cache import LRUCache
+
+# Clave de versión para preguntas sin doc_id (buscan en todos los documentos)
+ALL_DOCUMENTS = "__all__"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Normaliza una pregunta para que variaciones triviales compartan entrada de caché."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.strip("¿?¡!.,;: ")
+
+
+class VersionStore(Protocol):
+    """Origen compartido de versiones de documento (p.ej. IndexManager)."""
+
+    def get_version(self, scope: str) -> int: ...
+
+    def bump_version(self, doc_id: str) -> None: ...
+
+
+class AnswerCache:
+    """
+    Caché de respuestas con TTL + LRU e invalidación por versión de documento.
+
+    La clave incluye la versión del documento consultado: al cambiar un documento
+    se incrementa su versión (y la global), de modo que las respuestas antiguas
+    dejan de ser alcanzables y además se eliminan de inmediato.
+
+    Si se pasa un version_store compartido (el índice SQLite), las versiones son
+    comunes a todos los workers y un cambio hecho en uno invalida la caché de los demás
+    (en cuanto estos refrescan su copia de las versiones).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600, version_store: Optional[VersionStore] = None):
+        self._entries: LRUCache[Dict[str, Any]] = LRUCache(max_entries, ttl_seconds)
+        self._versions: Dict[str, int] = {}
+        self._version_store = version_store
+        self._lock = Lock()
+
+    def _version(self, doc_id: Optional[str]) -> int:
+        if self._version_store is not None:
+            return self._version_store.get_version(doc_id or ALL_DOCUMENTS)
+        with self._lock:
+            return self._versions.get(doc_id or ALL_DOCUMENTS, 0)
+
+    def make_key(self, question: str, doc_id: Optional[str], k: int, model: str) -> Tuple[Hashable, ...]:
+        """
+        Construye la clave de caché de una pregunta.
+
+        Args:
+            question: Pregunta original
+            doc_id: Documento consultado (None = todos)
+            k: Número de chunks recuperados
+            model: Modelo de chat que genera la respuesta
+
+        Returns:
+            Tupla (pregunta normalizada, doc_id, versión, modelo, k)
+        """
+        return (normalize_question(question), doc_id, self._version(doc_id), model, k)
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Dict[str, Any]]:
+        """Retorna {"answer", "sources"} cacheado o None."""
+        return self._entries.get(key)
+
+    def put(self, key: Tuple[Hashable, ...], answer: str, sources: Any = None) -> None:
+        """Guarda una respuesta y sus fuentes."""
+        self._entries.put(key, {"answer": answer, "sources": sources or []})
+
+    def invalidate_document(self, doc_id: str) -> None:
+        """Invalida las respuestas de un documento y las consultas sobre todos los documentos."""
+        if self._version_store is not None:
+            self._version_store.bump_version(doc_id)
+        else:
+            with self._lock:
+                self._versions[doc_id] = self._versions.get(doc_id, 0) + 1
+                self._versions[ALL_DOCUMENTS] = self._versions.get(ALL_DOCUMENTS, 0) + 1
+        self._entries.pop_where(lambda key: isinstance(key, tuple) and key[1] in (doc_id, None))
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna entries, hits, misses y hit_rate."""
+        return self._entries.stats()
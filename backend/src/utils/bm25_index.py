@@ -0,0 +1,312 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, cast
+
+from langchain_core.documents import Document
+
+from src.utils.doc_ids import is_valid_doc_id, validate_doc_id
+
+# Mantiene juntos códigos como "E-404", "3.2.1" o "ISO/IEC" en un solo token
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokeniza en minúsculas y sin tildes para búsqueda léxica."""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(normalized)
+
+
+class BM25Index:
+    """Índice invertido BM25 de los chunks de un documento."""
+
+    def __init__(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.chunk_ids = chunk_ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((position, tf))
+        self.total_length = sum(self.lengths)
+        self.avg_length = (self.total_length / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query_terms: Sequence[str], k: int, corpus: Optional["CorpusStats"] = None) -> List[Tuple[int, float]]:
+        """
+        Puntúa los chunks contra los términos de la consulta.
+
+        Args:
+            query_terms: Términos ya tokenizados
+            k: Número máximo de resultados
+            corpus: Estadísticas de varios documentos; si se pasan, idf y longitud media
+                se calculan sobre todos ellos y las puntuaciones son comparables entre índices
+
+        Returns:
+            Lista de (posición del chunk, puntuación) ordenada de mayor a menor
+        """
+        if not self.lengths:
+            return []
+        n = corpus.document_count if corpus else len(self.lengths)
+        avg_length = corpus.avg_length if corpus else self.avg_length
+
+        scores: Dict[int, float] = {}
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = corpus.document_frequencies.get(term, len(postings)) if corpus else len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for position, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / (avg_length or 1))
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class CorpusStats:
+    """
+    Estadísticas BM25 de varios índices tratados como un solo corpus.
+
+    Cada documento tiene su propio índice, y su idf y longitud media dependen solo
+    de sus chunks: las puntuaciones de dos documentos no son comparables. Con estas
+    estadísticas comunes (número de chunks, frecuencia de cada término y longitud
+    media) todos los índices puntúan en la misma escala.
+    """
+
+    def __init__(self, indexes: Sequence[BM25Index], terms: Iterable[str]):
+        self.document_count = sum(len(index.lengths) for index in indexes)
+        total_length = sum(index.total_length for index in indexes)
+        self.avg_length = (total_length / self.document_count) if self.document_count else 0.0
+        self.document_frequencies: Dict[str, int] = {
+            term: sum(len(index.postings.get(term, ())) for index in indexes) for term in set(terms)
+        }
+
+
+class BM25Writer:
+    """
+    Escribe el índice léxico de un documento lote a lote (JSONL, un chunk por línea).
+
+    El archivo se escribe en un temporal y solo se publica con commit(), así que un
+    documento a medio indexar nunca aparece en las búsquedas.
+    """
+
+    def __init__(self, store: "BM25Store", doc_id: str):
+        self.store = store
+        self.doc_id = doc_id
+        self._tmp_path = store.temp_path(doc_id)
+        self._file = open(self._tmp_path, "w", encoding="utf-8")
+
+    def add(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Añade un lote de chunks."""
+        for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+            self._file.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False))
+            self._file.write("\n")
+
+    def commit(self) -> None:
+        """Publica el índice de forma atómica."""
+        self._file.close()
+        self.store.commit(self.doc_id, self._tmp_path)
+
+    def abort(self) -> None:
+        """Descarta lo escrito."""
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class BM25Store:
+    """
+    Índices BM25 por documento, persistidos junto a Chroma.
+
+    Cada documento se guarda como JSONL (id, texto y metadatos de cada chunk) y
+    el índice invertido se reconstruye en memoria la primera vez que se consulta.
+    La copia en memoria se valida contra el mtime del archivo, así que los cambios
+    hechos por otro worker se detectan en la siguiente consulta.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        os.makedirs(directory, exist_ok=True)
+        self._indexes: Dict[str, Tuple[int, BM25Index]] = {}
+        self._lock = Lock()
+
+    def _path(self, doc_id: str) -> str:
+        # doc_id llega de las peticiones: solo UUIDs, nunca rutas fuera del directorio
+        return os.path.join(self.directory, f"{validate_doc_id(doc_id)}.jsonl")
+
+    def temp_path(self, doc_id: str) -> str:
+        """Ruta temporal en la que un BM25Writer escribe antes de commit()."""
+        return f"{self._path(doc_id)}.tmp"
+
+    def commit(self, doc_id: str, tmp_path: str) -> None:
+        """
+        Publica de forma atómica un índice escrito en tmp_path.
+
+        Args:
+            doc_id: ID del documento
+            tmp_path: Archivo JSONL completo (ver temp_path)
+        """
+        os.replace(tmp_path, self._path(doc_id))
+        self.invalidate(doc_id)
+
+    def invalidate(self, doc_id: str) -> None:
+        """Descarta la copia en memoria del índice de un documento."""
+        with self._lock:
+            self._indexes.pop(doc_id, None)
+
+    def open_writer(self, doc_id: str) -> BM25Writer:
+        """
+        Abre un escritor incremental para el índice léxico de un documento.
+
+        Args:
+            doc_id: ID del documento
+
+        Returns:
+            BM25Writer; hay que llamar a commit() (o abort()) al terminar
+        """
+        return BM25Writer(self, doc_id)
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Elimina el índice léxico de un documento. Retorna True si existía."""
+        self.invalidate(doc_id)
+        try:
+            os.remove(self._path(doc_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def has_document(self, doc_id: str) -> bool:
+        """Indica si existe índice léxico para el documento."""
+        if not is_valid_doc_id(doc_id):
+            return False
+        return os.path.exists(self._path(doc_id))
+
+    def _read(self, path: str) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        with open(path, "r", encoding="utf-8") as f:
+            ids: List[str] = []
+            texts: List[str] = []
+            metadatas: List[Dict[str, Any]] = []
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    ids.append(item["id"])
+                    texts.append(item["text"])
+                    metadatas.append(item["metadata"])
+            return ids, texts, metadatas
+
+    def _get_index(self, doc_id: str) -> Optional[BM25Index]:
+        if not is_valid_doc_id(doc_id):
+            return None
+        path = self._path(doc_id)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.invalidate(doc_id)
+            return None
+
+        with self._lock:
+            cached = self._indexes.get(doc_id)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        try:
+            ids, texts, metadatas = self._read(path)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        index = BM25Index(ids, texts, metadatas, self.k1, self.b)
+        with self._lock:
+            self._indexes[doc_id] = (mtime_ns, index)
+        return index
+
+    def warm_up(self) -> int:
+        """Carga en memoria los índices de todos los documentos; retorna cuántos se cargaron."""
+        return sum(1 for doc_id in self.list_documents() if self._get_index(doc_id) is not None)
+
+    def list_documents(self) -> List[str]:
+        """Retorna los doc_id que tienen índice léxico."""
+        names = os.listdir(self.directory)
+        doc_ids = (name[:-len(".jsonl")] for name in names if name.endswith(".jsonl"))
+        return sorted(doc_id for doc_id in doc_ids if is_valid_doc_id(doc_id))
+
+    def search(self, query: str, k: int, doc_id: Optional[str] = None) -> List[Document]:
+        """
+        Busca chunks por coincidencia léxica (BM25).
+
+        Al buscar en todos los documentos, cada índice puntúa con las estadísticas
+        del conjunto (CorpusStats), así que los resultados se ordenan en una escala común.
+
+        Args:
+            query: Texto de la consulta
+            k: Número de resultados
+            doc_id: Documento al que limitar la búsqueda (opcional)
+
+        Returns:
+            Documentos ordenados por puntuación BM25
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        indexes: List[BM25Index] = []
+        for current_id in ([doc_id] if doc_id else self.list_documents()):
+            index = self._get_index(current_id)
+            if index is not None:
+                indexes.append(index)
+        corpus = CorpusStats(indexes, terms) if len(indexes) > 1 else None
+
+        scored: List[Tuple[float, Document]] = []
+        for index in indexes:
+            for position, score in index.search(terms, k, corpus):
+                scored.append((score, Document(
+                    id=index.chunk_ids[position],
+                    page_content=index.texts[position],
+                    metadata=index.metadatas[position],
+                )))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [doc for _, doc in scored[:k]]
+
+
+def _chunk_key(doc: Document) -> str:
+    if doc.id:
+        return doc.id
+    metadata = cast(Dict[str, Any], doc.metadata)  # pyright: ignore[reportUnknownMemberType]
+    return f"{metadata.get('doc_id')}_{metadata.get('chunk_index')}"
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Fusiona varias listas de resultados con Reciprocal Rank Fusion.
+
+    Args:
+        result_lists: Listas de documentos ordenadas por relevancia
+        k: Número de resultados a devolver
+        rrf_k: Constante de suavizado de RRF
+
+    Returns:
+        Los k documentos con mayor puntuación fusionada
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = _chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [docs[key] for key in ranked[:k]]
@@ -0,0 +1,27 @@
+import uuid
+
+
+def is_valid_doc_id(doc_id: str) -> bool:
+    """Indica si doc_id es un UUID en su forma canónica (como los genera RAGService)."""
+    try:
+        return str(uuid.UUID(doc_id)) == doc_id
+    except (ValueError, TypeError, AttributeError):
+        return False
+
+
+def validate_doc_id(doc_id: str) -> str:
+    """
+    Valida un doc_id antes de usarlo en una ruta de archivo.
+
+    Args:
+        doc_id: ID del documento
+
+    Returns:
+        El mismo doc_id
+
+    Raises:
+        ValueError: Si no es un UUID canónico (p.ej. contiene separadores de ruta)
+    """
+    if not is_valid_doc_id(doc_id):
+        raise ValueError(f"doc_id no válido: {doc_id!r}")
+    return doc_id
@@ -0,0 +1,73 @@
+import os
+from threading import Lock
+from typing import Optional, Tuple
+
+from src.utils.lru_cache import LRUCache
+
+
+class ParsedDocument:
+    """
+    Datos de un PDF que se calculan una sola vez por contenido: número de páginas y hash.
+
+    No guarda páginas, texto ni chunks: la ingesta en streaming los genera y consume
+    lote a lote, y tenerlos aquí obligaría a mantener el documento entero en memoria.
+    Una reindexación vuelve a leer el PDF (y reutiliza los vectores ya guardados).
+    """
+
+    def __init__(self, path: str, mtime_ns: int, size: int):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.page_count: Optional[int] = None
+        self.file_hash: Optional[str] = None
+        # Evita que dos hilos calculen lo mismo a la vez
+        self.lock = Lock()
+
+
+class ParsedDocumentCache:
+    """
+    Caché compartida de datos de PDFs, indexada por ruta absoluta.
+
+    Cada entrada guarda el mtime y tamaño del archivo: si cambian, la entrada
+    se descarta y los datos se vuelven a calcular.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self._entries: LRUCache[ParsedDocument] = LRUCache(max_entries)
+        self._lock = Lock()
+
+    @staticmethod
+    def _fingerprint(file_path: str) -> Tuple[str, int, int]:
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, file_path: str) -> ParsedDocument:
+        """
+        Obtiene (o crea vacía) la entrada de un archivo.
+
+        Args:
+            file_path: Ruta del archivo PDF
+
+        Returns:
+            Entrada de caché vigente para el contenido actual del archivo
+
+        Raises:
+            FileNotFoundError: Si el archivo no existe
+        """
+        key, mtime_ns, size = self._fingerprint(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.mtime_ns != mtime_ns or entry.size != size:
+                entry = ParsedDocument(file_path, mtime_ns, size)
+                self._entries.put(key, entry)
+            return entry
+
+    def invalidate(self, file_path: Optional[str]) -> None:
+        """Descarta la entrada de un archivo (p.ej. al eliminar el documento)."""
+        if not file_path:
+            return
+        self._entries.pop(os.path.abspath(file_path))
+
+    def clear(self) -> None:
+        """Vacía la caché."""
+        self._entries.clear()
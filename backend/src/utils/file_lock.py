@@ -0,0 +1,86 @@
+import os
+from threading import Lock
+from types import TracebackType
+from typing import IO, Any, Optional, Type
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+
+class FileLock:
+    """
+    Bloqueo exclusivo entre procesos basado en un archivo (flock / msvcrt).
+
+    Se usa para tareas que solo debe ejecutar un worker de uvicorn a la vez,
+    como la migración del índice o la reconstrucción de Chroma.
+
+    flock no excluye a otros hilos del mismo proceso que usen el mismo descriptor,
+    y una instancia se comparte entre hilos (p.ej. el reconciliador en segundo plano
+    y POST /rag/reconcile). Por eso cada instancia tiene además un threading.Lock:
+    solo el hilo que lo obtiene abre un descriptor nuevo y toma el flock.
+
+    Ejemplo:
+        with FileLock("chroma_db/rebuild.lock"):
+            ...
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = Lock()
+        # Descriptor de la adquisición en curso; solo lo toca el hilo que tiene _thread_lock
+        self._file: Optional[IO[Any]] = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Obtiene el lock.
+
+        Args:
+            blocking: Si es False, retorna de inmediato cuando otro hilo o proceso lo tiene
+
+        Returns:
+            True si se obtuvo el lock
+        """
+        if not self._thread_lock.acquire(blocking):
+            return False
+        file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)  # type: ignore[attr-defined]
+        except BaseException as exc:
+            file.close()
+            self._thread_lock.release()
+            if blocking or not isinstance(exc, OSError):
+                raise
+            return False
+        self._file = file
+        return True
+
+    def release(self) -> None:
+        """Libera el lock si está tomado."""
+        file = self._file
+        if file is None:
+            return
+        self._file = None
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)  # type: ignore[attr-defined]
+        finally:
+            file.close()
+            self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], tb: Optional[TracebackType]) -> None:
+        self.release()
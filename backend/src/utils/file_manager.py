@@ -1,36 +1,100 @@
 import os
-import shutil
+import time
 import uuid
+import hashlib
 from typing import Optional, List
 from fastapi import UploadFile
 
+from src.utils.document_cache import ParsedDocumentCache
+
+PDF_MAGIC = b"%PDF-"
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+
+
+class InvalidPDFError(ValueError):
+    """El archivo subido no es un PDF (no empieza con %PDF-)."""
+
+
+class FileTooLargeError(ValueError):
+    """El archivo subido supera el tamaño máximo permitido."""
+
 
 class FileManager:
     """Maneja operaciones de archivos PDF."""
     
-    def __init__(self, storage_dir: str):
+    def __init__(self, storage_dir: str, document_cache: Optional[ParsedDocumentCache] = None, temp_dir: Optional[str] = None):
         self.storage_dir = storage_dir
         os.makedirs(storage_dir, exist_ok=True)
+        # Las subidas se reciben fuera de storage_dir y solo se mueven allí al confirmarlas
+        self.temp_dir = temp_dir or os.path.join(os.path.dirname(os.path.abspath(storage_dir)), "tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+        # Caché compartida con PDFProcessor: el hash se calcula una vez por contenido
+        self.document_cache = document_cache or ParsedDocumentCache()
     
-    def save_uploaded_file(self, file: UploadFile) -> tuple[str, str]:
+    def receive_upload(self, file: UploadFile, max_size: Optional[int] = None) -> tuple[str, str, str, int]:
         """
-        Guarda un archivo subido y retorna la ruta y nombre original.
+        Copia una subida a un archivo temporal calculando su hash en la misma pasada.
+        
+        Valida la cabecera %PDF- en el primer bloque y corta la copia en cuanto se
+        supera max_size, de modo que un archivo inválido no se lee completo.
         
         Args:
             file: Archivo subido via FastAPI
+            max_size: Tamaño máximo en bytes (None para no limitar)
             
         Returns:
-            Tupla con (ruta_destino, nombre_original)
+            Tupla con (ruta_temporal, nombre_original, hash_md5, tamaño)
+            
+        Raises:
+            InvalidPDFError: Si el contenido no empieza con %PDF-
+            FileTooLargeError: Si el archivo supera max_size
         """
         original_name = file.filename or f"{uuid.uuid4()}.pdf"
-        dest_name = f"{uuid.uuid4()}_{original_name}"
-        dest_path = os.path.join(self.storage_dir, dest_name)
+        temp_path = os.path.join(self.temp_dir, f"{uuid.uuid4()}.part")
+        hash_md5 = hashlib.md5()
+        size = 0
+        
+        try:
+            with open(temp_path, "wb") as out_f:
+                first_block = True
+                for block in iter(lambda: file.file.read(UPLOAD_BUFFER_SIZE), b""):
+                    if first_block:
+                        if not block.startswith(PDF_MAGIC):
+                            raise InvalidPDFError(f"El archivo '{original_name}' no es un PDF válido")
+                        first_block = False
+                    size += len(block)
+                    if max_size is not None and size > max_size:
+                        raise FileTooLargeError(f"El archivo '{original_name}' supera el tamaño máximo de {max_size} bytes")
+                    hash_md5.update(block)
+                    out_f.write(block)
+                
+                if first_block:
+                    raise InvalidPDFError(f"El archivo '{original_name}' está vacío")
+        except Exception:
+            self.delete_file(temp_path)
+            raise
+        
+        return temp_path, original_name, hash_md5.hexdigest(), size
+    
+    def commit_upload(self, temp_path: str, original_name: str, file_hash: Optional[str] = None) -> str:
+        """
+        Mueve una subida temporal al directorio de almacenamiento.
         
-        # Guardar archivo en disco
-        with open(dest_path, "wb") as out_f:
-            shutil.copyfileobj(file.file, out_f)
+        Args:
+            temp_path: Ruta temporal retornada por receive_upload
+            original_name: Nombre original del archivo
+            file_hash: Hash ya calculado, para no volver a leer el archivo
+            
+        Returns:
+            Ruta definitiva del archivo
+        """
+        dest_path = self.create_full_path(self.generate_unique_filename(original_name))
+        os.replace(temp_path, dest_path)
         
-        return dest_path, original_name
+        if file_hash:
+            self.document_cache.get(dest_path).file_hash = file_hash
+        
+        return dest_path
     
     def delete_file(self, file_path: Optional[str]) -> bool:
         """
@@ -54,6 +118,29 @@ class FileManager:
         
         return False
     
+    def list_files(self, directory: Optional[str] = None, min_age_seconds: float = 0) -> List[str]:
+        """
+        Lista los archivos de un directorio gestionado.
+        
+        Args:
+            directory: Directorio a listar (por defecto storage_dir)
+            min_age_seconds: Solo archivos sin modificar desde hace al menos este tiempo
+            
+        Returns:
+            Rutas de los archivos (relativas igual que storage_dir)
+        """
+        directory = directory or self.storage_dir
+        cutoff = time.time() - min_age_seconds
+        files: List[str] = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.stat().st_mtime <= cutoff:
+                        files.append(os.path.join(directory, entry.name))
+        except FileNotFoundError:
+            pass
+        return files
+    
     def file_exists(self, file_path: str) -> bool:
         """
         Verifica si un archivo existe.
@@ -171,12 +258,14 @@ class FileManager:
             return None
         
         try:
-            import hashlib
-            hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+            entry = self.document_cache.get(file_path)
+            if entry.file_hash is None:
+                hash_md5 = hashlib.md5()
+                with open(file_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(UPLOAD_BUFFER_SIZE), b""):
+                        hash_md5.update(chunk)
+                entry.file_hash = hash_md5.hexdigest()
+            return entry.file_hash
         except Exception:
             return None
     
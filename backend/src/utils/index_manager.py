@@ -1,47 +1,147 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
+import time
+import sqlite3
+from typing import List, Dict, Any, Optional, Generator, Tuple
 from datetime import datetime, timezone
-from threading import Lock
+from contextlib import contextmanager
+from threading import RLock
+
+from src.utils.file_lock import FileLock
+from src.utils.metrics import track_stage
+
+# Columnas con tipo propio; cualquier otro campo se guarda en la columna JSON "extra"
+COLUMNS = ("doc_id", "filename", "uploaded_at", "indexed_at", "chunks", "path", "status", "file_hash", "size", "pages")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    indexed_at TEXT,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    path TEXT,
+    status TEXT NOT NULL,
+    file_hash TEXT,
+    size INTEGER,
+    pages INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_file_hash ON documents(file_hash);
+CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
+CREATE INDEX IF NOT EXISTS idx_documents_uploaded_at ON documents(uploaded_at);
+CREATE TABLE IF NOT EXISTS progress (
+    doc_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    scope TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+# Ámbito de versión que cambia con cualquier documento
+ALL_DOCUMENTS_SCOPE = "__all__"
 
 
 class IndexManager:
-    """Maneja el índice JSON de documentos."""
-    
-    def __init__(self, index_file_path: str):
-        self.index_file = index_file_path
-        self.index: List[Dict[str, Any]] = []
-        self._lock = Lock()
-        self._load_index()
-    
-    def _load_index(self) -> None:
-        """Carga el índice desde el archivo JSON."""
-        if os.path.exists(self.index_file):
+    """
+    Maneja el índice de documentos en SQLite (modo WAL).
+
+    El archivo SQLite es el único estado compartido: cada worker de uvicorn abre
+    su propia conexión y no guarda copias en memoria, así que todos ven los mismos
+    datos. Las escrituras compuestas usan BEGIN IMMEDIATE y esperan (busy timeout)
+    si otro proceso está escribiendo.
+    """
+
+    def __init__(self, index_db_path: str, legacy_json_path: Optional[str] = None, version_refresh_seconds: float = 1.0):
+        self.index_db = index_db_path
+        self._lock = RLock()
+        # Copia en memoria de la tabla versions: get_version se consulta en cada pregunta
+        # y no debe tocar SQLite; los cambios de otros workers se leen cada version_refresh_seconds
+        self.version_refresh_seconds = version_refresh_seconds
+        self._versions: Dict[str, int] = {}
+        self._versions_loaded_at = float("-inf")
+
+        os.makedirs(os.path.dirname(os.path.abspath(index_db_path)), exist_ok=True)
+        # isolation_level=None: autocommit; las operaciones compuestas abren su propia transacción
+        self._conn = sqlite3.connect(index_db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        if legacy_json_path:
+            # Solo un worker migra; los demás esperan y encuentran el JSON ya renombrado
+            with FileLock(f"{index_db_path}.lock"):
+                self._migrate_from_json(legacy_json_path)
+
+    @contextmanager
+    def _transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        """Transacción con bloqueo de escritura inmediato."""
+        with track_stage("index_write"), self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
             try:
-                with open(self.index_file, "r", encoding="utf-8") as f:
-                    self.index = json.load(f)
+                yield self._conn
             except Exception:
-                self.index = []
-                self._save_index()
-        else:
-            self.index = []
-            self._save_index()
-    
-    def _save_index(self) -> None:
-        """Guarda el índice en el archivo JSON."""
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _migrate_from_json(self, json_path: str) -> None:
+        """Importa una sola vez el antiguo docs_index.json y lo renombra a .migrated."""
+        if not os.path.exists(json_path):
+            return
+
         try:
-            # Crear directorio si no existe
-            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
-            
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump(self.index, f, indent=2, ensure_ascii=False)
+            with open(json_path, "r", encoding="utf-8") as f:
+                entries: List[Dict[str, Any]] = json.load(f)
         except Exception:
-            pass
-    
-    def create_entry(self, doc_id: str, filename: str, file_path: str, status: str = "processing", size: Optional[int] = None, pages: Optional[int] = None) -> Dict[str, Any]:
+            entries = []
+
+        with self._transaction() as conn:
+            for entry in entries:
+                if entry.get("doc_id"):
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO documents ({', '.join(COLUMNS)}, extra) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                        self._to_row(entry),
+                    )
+
+        os.replace(json_path, f"{json_path}.migrated")
+        print(f"[IndexManager] Migradas {len(entries)} entradas desde {json_path}")
+
+    @staticmethod
+    def _to_row(entry: Dict[str, Any]) -> List[Any]:
+        extra = {k: v for k, v in entry.items() if k not in COLUMNS}
+        row: List[Any] = [entry.get(column) for column in COLUMNS]
+        row[COLUMNS.index("chunks")] = entry.get("chunks") or 0
+        row.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+        return row
+
+    @staticmethod
+    def _to_entry(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        entry: Dict[str, Any] = {column: row[column] for column in COLUMNS}
+        if row["extra"]:
+            entry.update(json.loads(row["extra"]))
+        return entry
+
+    def _query(self, sql: str, params: tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [entry for entry in (self._to_entry(row) for row in rows) if entry is not None]
+
+    def _query_one(self, sql: str, params: tuple[Any, ...] = ()) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return self._to_entry(row)
+
+    def create_entry(self, doc_id: str, filename: str, file_path: str, status: str = "processing", size: Optional[int] = None, pages: Optional[int] = None, file_hash: Optional[str] = None) -> Dict[str, Any]:
         """
         Crea una nueva entrada en el índice.
-        
+
         Args:
             doc_id: ID único del documento
             filename: Nombre del archivo
@@ -49,11 +149,47 @@ class IndexManager:
             status: Estado inicial del documento
             size: Tamaño del archivo en bytes
             pages: Número de páginas del PDF
-            
+            file_hash: Hash MD5 del archivo (para detectar duplicados desde la subida)
+
         Returns:
             La entrada creada
         """
-        entry = {
+        entry = self._new_entry(doc_id, filename, file_path, status, size, pages, file_hash)
+        with track_stage("index_write"), self._lock:
+            self._insert(self._conn, entry)
+        return entry
+
+    def create_entry_unless_duplicate(self, doc_id: str, filename: str, file_path: str, file_hash: str, status: str = "processing", size: Optional[int] = None, pages: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Crea una entrada salvo que ya exista un documento no fallido con el mismo hash.
+
+        La búsqueda y la inserción van en la misma transacción BEGIN IMMEDIATE, así dos
+        subidas simultáneas del mismo archivo (en este u otro worker) no crean dos entradas.
+
+        Args:
+            doc_id: ID único del documento
+            filename: Nombre del archivo
+            file_path: Ruta del archivo
+            file_hash: Hash MD5 del archivo
+            status: Estado inicial del documento
+            size: Tamaño del archivo en bytes
+            pages: Número de páginas del PDF
+
+        Returns:
+            (entrada, creada): la entrada nueva y True, o la del duplicado y False
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE file_hash = ? AND status != 'failed' LIMIT 1", (file_hash,)).fetchone()
+            existing = self._to_entry(row)
+            if existing is not None:
+                return existing, False
+            entry = self._new_entry(doc_id, filename, file_path, status, size, pages, file_hash)
+            self._insert(conn, entry)
+        return entry, True
+
+    @staticmethod
+    def _new_entry(doc_id: str, filename: str, file_path: str, status: str, size: Optional[int], pages: Optional[int], file_hash: Optional[str]) -> Dict[str, Any]:
+        return {
             "doc_id": doc_id,
             "filename": filename,
             "uploaded_at": datetime.now(timezone.utc).isoformat(),
@@ -63,41 +199,52 @@ class IndexManager:
             "status": status,
             "size": size,
             "pages": pages,
+            "file_hash": file_hash,
         }
-        
-        with self._lock:
-            self.index.append(entry)
-            self._save_index()
-        
-        return entry
-    
+
+    def _insert(self, conn: sqlite3.Connection, entry: Dict[str, Any]) -> None:
+        conn.execute(
+            f"INSERT INTO documents ({', '.join(COLUMNS)}, extra) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+            self._to_row(entry),
+        )
+
     def update_entry(self, doc_id: str, **updates: Any) -> bool:
         """
         Actualiza una entrada existente.
-        
+
         Args:
             doc_id: ID del documento a actualizar
             **updates: Campos a actualizar
-            
+
         Returns:
             True si se actualizó exitosamente
         """
-        with self._lock:
-            for entry in self.index:
-                if entry["doc_id"] == doc_id:
-                    entry.update(updates)
-                    self._save_index()
-                    return True
-        return False
-    
+        columns = {k: v for k, v in updates.items() if k in COLUMNS and k != "doc_id"}
+        extra = {k: v for k, v in updates.items() if k not in COLUMNS}
+
+        with self._transaction() as conn:
+            row = conn.execute("SELECT extra FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return False
+
+            if extra:
+                merged: Dict[str, Any] = json.loads(row["extra"]) if row["extra"] else {}
+                merged.update(extra)
+                columns["extra"] = json.dumps(merged, ensure_ascii=False)
+
+            if columns:
+                assignments = ", ".join(f"{column} = ?" for column in columns)
+                conn.execute(f"UPDATE documents SET {assignments} WHERE doc_id = ?", (*columns.values(), doc_id))
+        return True
+
     def mark_as_completed(self, doc_id: str, chunks_count: int) -> bool:
         """
         Marca un documento como completamente indexado.
-        
+
         Args:
             doc_id: ID del documento
             chunks_count: Número de chunks procesados
-            
+
         Returns:
             True si se actualizó exitosamente
         """
@@ -107,202 +254,246 @@ class IndexManager:
             chunks=chunks_count,
             status="ready"
         )
-    
+
     def mark_as_failed(self, doc_id: str) -> bool:
         """
         Marca un documento como fallido.
-        
+
         Args:
             doc_id: ID del documento
-            
+
         Returns:
             True si se actualizó exitosamente
         """
         return self.update_entry(doc_id, status="failed")
-    
+
     def delete_entry(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         Elimina una entrada del índice.
-        
+
         Args:
             doc_id: ID del documento a eliminar
-            
+
         Returns:
             La entrada eliminada o None si no se encontró
         """
-        with self._lock:
-            for i, entry in enumerate(self.index):
-                if entry["doc_id"] == doc_id:
-                    deleted_entry = self.index.pop(i)
-                    self._save_index()
-                    return deleted_entry
-        return None
-    
+        with self._transaction() as conn:
+            entry = self._to_entry(conn.execute("SELECT * FROM documents WHERE doc_id = ?", (doc_id,)).fetchone())
+            if entry is not None:
+                conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+                conn.execute("DELETE FROM progress WHERE doc_id = ?", (doc_id,))
+        return entry
+
     def get_entry(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         Obtiene una entrada específica.
-        
+
         Args:
             doc_id: ID del documento
-            
+
         Returns:
             La entrada o None si no se encuentra
         """
-        for entry in self.index:
-            if entry["doc_id"] == doc_id:
-                return entry
-        return None
-    
+        return self._query_one("SELECT * FROM documents WHERE doc_id = ?", (doc_id,))
+
     def get_all_entries(self) -> List[Dict[str, Any]]:
         """
         Obtiene todas las entradas del índice.
-        
+
         Returns:
             Lista con todas las entradas
         """
-        return self.index.copy()
-    
+        return self._query("SELECT * FROM documents ORDER BY uploaded_at")
+
     def get_oldest_entry(self) -> Optional[Dict[str, Any]]:
         """
         Obtiene la entrada más antigua basada en uploaded_at.
-        
+
         Returns:
             La entrada más antigua o None si el índice está vacío
         """
-        if not self.index:
-            return None
-        
-        return min(self.index, key=lambda e: e["uploaded_at"])
-    
+        return self._query_one("SELECT * FROM documents ORDER BY uploaded_at LIMIT 1")
+
     def count_entries(self) -> int:
         """
         Cuenta el número total de entradas.
-        
+
         Returns:
             Número de entradas en el índice
         """
-        return len(self.index)
-    
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
     def cleanup_failed_entries(self) -> List[str]:
         """
         Elimina todas las entradas con status='failed'.
-        
+
         Returns:
             Lista de doc_ids eliminados
         """
-        removed_ids: List[str] = []
-        with self._lock:
-            original_count = len(self.index)
-            self.index = [e for e in self.index if e.get("status") != "failed"]
-            
-            if len(self.index) < original_count:
-                self._save_index()
-                            
+        with self._transaction() as conn:
+            removed_ids = [row["doc_id"] for row in conn.execute("SELECT doc_id FROM documents WHERE status = 'failed'")]
+            conn.execute("DELETE FROM documents WHERE status = 'failed'")
         return removed_ids
-    
-    def enforce_max_documents(self, max_docs: int, current_doc_id: Optional[str] = None) -> Optional[str]:
+
+    def enforce_max_documents(self, max_docs: int, current_doc_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Aplica el límite máximo de documentos eliminando el más antiguo si es necesario.
-        
+
         Args:
             max_docs: Número máximo de documentos permitidos
             current_doc_id: ID del documento recién agregado (no se eliminará)
-            
+
         Returns:
-            doc_id del documento eliminado o None si no se eliminó ninguno
+            Entrada del documento eliminado (para limpiar sus datos) o None si no se eliminó ninguno
         """
-        with self._lock:
-            if len(self.index) <= max_docs:
+        with self._transaction() as conn:
+            if conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] <= max_docs:
                 return None
-            
-            oldest = self.get_oldest_entry()
-            if not oldest:
+
+            oldest = conn.execute("SELECT * FROM documents ORDER BY uploaded_at LIMIT 1").fetchone()
+            if oldest is None:
                 return None
-            
+
             # No eliminar el documento recién agregado
             if current_doc_id and oldest["doc_id"] == current_doc_id:
                 return None
-            
+
             # Eliminar el documento más antiguo
-            deleted_entry = self.delete_entry(oldest["doc_id"])
-            return deleted_entry["doc_id"] if deleted_entry else None
-    
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (oldest["doc_id"],))
+            conn.execute("DELETE FROM progress WHERE doc_id = ?", (oldest["doc_id"],))
+            return self._to_entry(oldest)
+
     def find_entries_by_status(self, status: str) -> List[Dict[str, Any]]:
         """
         Encuentra todas las entradas con un estado específico.
-        
+
         Args:
             status: Estado a buscar (e.g., 'ready', 'processing', 'failed')
-            
+
         Returns:
             Lista de entradas con el estado especificado
         """
-        return [entry for entry in self.index if entry.get("status") == status]
-    
+        return self._query("SELECT * FROM documents WHERE status = ? ORDER BY uploaded_at", (status,))
+
     def add_file_hash(self, doc_id: str, file_hash: str) -> bool:
         """
         Agrega el hash de un archivo a su entrada en el índice.
-        
+
         Args:
             doc_id: ID del documento
             file_hash: Hash MD5 del archivo
-            
+
         Returns:
             True si se actualizó exitosamente
         """
         return self.update_entry(doc_id, file_hash=file_hash)
-    
+
     def add_file_size(self, doc_id: str, file_size: int) -> bool:
         """
         Agrega el tamaño de un archivo a su entrada en el índice.
-        
+
         Args:
             doc_id: ID del documento
             file_size: Tamaño del archivo en bytes
-            
+
         Returns:
             True si se actualizó exitosamente
         """
         return self.update_entry(doc_id, size=file_size)
-    
+
     def add_pages_count(self, doc_id: str, pages: int) -> bool:
         """
         Agrega la cantidad de páginas de un PDF a su entrada en el índice.
-        
+
         Args:
             doc_id: ID del documento
             pages: Número de páginas del PDF
-            
+
         Returns:
             True si se actualizó exitosamente
         """
         return self.update_entry(doc_id, pages=pages)
-    
+
     def find_duplicate_by_hash(self, file_hash: str) -> Optional[Dict[str, Any]]:
         """
         Busca un documento existente con el mismo hash de archivo.
-        
+
+        Incluye documentos en cola o en proceso; los fallidos no cuentan como duplicados
+        para que el archivo pueda volver a subirse.
+
         Args:
             file_hash: Hash MD5 del archivo a buscar
-            
+
         Returns:
             Entrada del documento duplicado o None si no existe
         """
-        for entry in self.index:
-            if entry.get("file_hash") == file_hash:
-                return entry
-        return None
-    
+        return self._query_one("SELECT * FROM documents WHERE file_hash = ? AND status != 'failed' LIMIT 1", (file_hash,))
+
     def get_all_file_paths(self) -> List[str]:
         """
         Obtiene todas las rutas de archivos en el índice.
-        
+
         Returns:
             Lista de rutas de archivos
         """
-        paths: List[str] = []
-        for entry in self.index:
-            path = entry.get("path")
-            if path:
-                paths.append(path)
-        return paths
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM documents WHERE path IS NOT NULL").fetchall()
+        return [row["path"] for row in rows]
+
+    def save_progress(self, doc_id: str, progress: Dict[str, Any]) -> None:
+        """
+        Guarda el progreso de indexación de un documento.
+
+        Args:
+            doc_id: ID del documento
+            progress: Estado del progreso (ver IngestionProgress.snapshot)
+        """
+        with track_stage("index_write"), self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO progress (doc_id, data, updated_at) VALUES (?, ?, ?)",
+                (doc_id, json.dumps(progress), progress.get("updated_at") or datetime.now(timezone.utc).timestamp()),
+            )
+
+    def get_progress(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene el último progreso guardado de un documento (o None)."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM progress WHERE doc_id = ?", (doc_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def _refresh_versions(self) -> None:
+        with self._lock:
+            rows = self._conn.execute("SELECT scope, version FROM versions").fetchall()
+            self._versions = {row["scope"]: row["version"] for row in rows}
+            self._versions_loaded_at = time.monotonic()
+
+    def get_version(self, scope: str) -> int:
+        """
+        Obtiene la versión de contenido de un documento (o de todo el índice).
+
+        Se lee de la copia en memoria; solo se recarga desde SQLite cuando tiene más
+        de version_refresh_seconds, así que un cambio hecho en otro worker tarda como
+        mucho ese tiempo en verse. Los cambios de este proceso se ven al instante.
+
+        Args:
+            scope: doc_id, o "__all__" para la versión global
+
+        Returns:
+            Versión actual (0 si nunca cambió)
+        """
+        if time.monotonic() - self._versions_loaded_at >= self.version_refresh_seconds:
+            self._refresh_versions()
+        return self._versions.get(scope, 0)
+
+    def bump_version(self, doc_id: str) -> None:
+        """Incrementa la versión del documento y la global (p.ej. al reindexar o eliminar)."""
+        bumped: Dict[str, int] = {}
+        with self._transaction() as conn:
+            for scope in (doc_id, ALL_DOCUMENTS_SCOPE):
+                conn.execute(
+                    "INSERT INTO versions (scope, version) VALUES (?, 1) "
+                    "ON CONFLICT(scope) DO UPDATE SET version = version + 1",
+                    (scope,),
+                )
+                bumped[scope] = conn.execute("SELECT version FROM versions WHERE scope = ?", (scope,)).fetchone()["version"]
+        self._versions.update(bumped)
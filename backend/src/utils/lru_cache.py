@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Caché LRU en memoria, segura entre hilos, con TTL opcional y contadores de aciertos."""
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        # Cada valor se guarda junto a su instante de expiración (None = no expira)
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], V]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """
+        Obtiene un valor y lo marca como usado recientemente.
+
+        Args:
+            key: Clave a buscar
+
+        Returns:
+            El valor o None si no está en caché
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (item[0] is not None and item[0] < time.monotonic()):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Guarda un valor expulsando el menos usado si se supera la capacidad."""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        """Elimina una clave y retorna su valor (o None)."""
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[1] if item is not None else None
+
+    def pop_where(self, predicate: Callable[[Hashable], bool]) -> List[Hashable]:
+        """
+        Elimina todas las claves que cumplan un predicado.
+
+        Args:
+            predicate: Función que recibe la clave y retorna True si debe eliminarse
+
+        Returns:
+            Lista de claves eliminadas
+        """
+        with self._lock:
+            removed = [key for key in self._data if predicate(key)]
+            for key in removed:
+                del self._data[key]
+            return removed
+
+    def clear(self) -> None:
+        """Vacía la caché."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna estadísticas de uso de la caché.
+
+        Returns:
+            Diccionario con entries, hits, misses y hit_rate
+        """
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
@@ -0,0 +1,295 @@
+import bisect
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, Generator, List, Optional, Sequence, Tuple
+
+from src.utils.profiling import span
+
+# Formato de exposición de texto de Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Cubren desde consultas en memoria (ms) hasta llamadas al LLM e ingestas de PDFs grandes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base de las métricas: nombre, ayuda, etiquetas y un lock por métrica."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Etiquetas de {self.name}: se esperaban {self.labelnames}, se recibieron {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Contador monótono."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja (elementos en curso, tamaño de colas)."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Generator[None, None, None]:
+        """Suma 1 mientras dura el bloque."""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Histograma con buckets acumulados, suma y número de observaciones."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiquetas: [cuentas por bucket (no acumuladas, la última es +Inf), suma]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), total[0]) for key, (counts, total) in self._values.items())
+        lines: List[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas del proceso y recolectores que se ejecutan al exportarlas.
+
+    Los valores son por proceso: con varios workers de uvicorn cada uno expone los
+    suyos, igual que el resto de clientes de Prometheus sin modo multiproceso.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], None]] = {}
+        self._lock = Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def set_collector(self, name: str, collector: Callable[[], None]) -> None:
+        """Registra (o reemplaza) una función que actualiza gauges justo antes de exportar."""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self) -> str:
+        """Exporta todas las métricas en el formato de texto de Prometheus."""
+        with self._lock:
+            collectors = list(self._collectors.items())
+            metrics = list(self._metrics.values())
+        for name, collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"[Metrics] Error en el recolector {name}: {str(e)}")
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_duration_seconds",
+    "Duración de cada etapa (pdf_load, split, embed, vector_upsert, retrieval, llm, index_write, delete_verify...)",
+    ("stage",),
+)
+STAGE_ITEMS = registry.counter("rag_stage_items_total", "Elementos procesados por etapa (páginas, chunks, textos)", ("stage",))
+STAGE_ERRORS = registry.counter("rag_stage_errors_total", "Etapas que terminaron con excepción", ("stage",))
+ASKS_IN_FLIGHT = registry.gauge("rag_asks_in_flight", "Preguntas en curso en este proceso")
+ASKS_TOTAL = registry.counter("rag_asks_total", "Preguntas por resultado (answered, cached, no_results, error, cancelled)", ("result",))
+DOCUMENTS_INDEXED = registry.counter("rag_documents_indexed_total", "Documentos indexados por resultado (ready, failed)", ("result",))
+INDEXING_QUEUE_JOBS = registry.gauge("rag_indexing_queue_jobs", "Trabajos en la cola de indexación por estado", ("state",))
+DOCUMENTS = registry.gauge("rag_documents", "Documentos en el índice por estado", ("status",))
+
+
+class StageTimer:
+    """Resultado de track_stage: permite fijar el número de elementos dentro del bloque."""
+
+    def __init__(self, stage: str, items: int = 0):
+        self.stage = stage
+        self.items = items
+        self.seconds: Optional[float] = None
+
+
+class AskOutcome:
+    """Resultado de una pregunta para rag_asks_total (se puede cambiar dentro de track_ask)."""
+
+    def __init__(self, result: str = "answered"):
+        self.result = result
+
+
+def observe_stage(stage: str, seconds: float, items: int = 0) -> None:
+    """Registra la duración de una etapa y, si se indica, los elementos procesados."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if items:
+        STAGE_ITEMS.inc(items, stage=stage)
+
+
+@contextmanager
+def track_stage(stage: str, items: int = 0) -> Generator[StageTimer, None, None]:
+    """
+    Mide la duración de un bloque como una observación de la etapa.
+
+    Si la petición se está perfilando, el bloque también aparece como span.
+
+    Args:
+        stage: Nombre de la etapa (etiqueta "stage")
+        items: Elementos procesados (también se puede fijar con timer.items dentro del bloque)
+
+    Yields:
+        StageTimer del bloque
+    """
+    timer = StageTimer(stage, items)
+    started = time.perf_counter()
+    with span(stage) as current:
+        try:
+            yield timer
+        except Exception:
+            STAGE_ERRORS.inc(stage=stage)
+            raise
+        finally:
+            timer.seconds = time.perf_counter() - started
+            observe_stage(stage, timer.seconds, timer.items)
+            if current is not None and timer.items:
+                current.attributes["items"] = timer.items
+
+
+@contextmanager
+def track_ask() -> Generator[AskOutcome, None, None]:
+    """
+    Cuenta una pregunta en curso (rag_asks_in_flight) y su resultado (rag_asks_total).
+
+    El resultado es "answered" salvo que se cambie dentro del bloque; una excepción
+    lo marca como "error" y una cancelación (cliente desconectado) como "cancelled".
+    """
+    outcome = AskOutcome()
+    ASKS_IN_FLIGHT.inc()
+    with span("ask") as current:
+        try:
+            yield outcome
+        except Exception:
+            outcome.result = "error"
+            raise
+        except BaseException:
+            outcome.result = "cancelled"
+            raise
+        finally:
+            ASKS_IN_FLIGHT.dec()
+            ASKS_TOTAL.inc(result=outcome.result)
+            if current is not None:
+                current.attributes["result"] = outcome.result
+
+
+def record_ask(result: str) -> None:
+    """Cuenta en rag_asks_total una pregunta resuelta sin trabajo (p.ej. desde la caché)."""
+    ASKS_TOTAL.inc(result=result)
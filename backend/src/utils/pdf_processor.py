@@ -1,87 +1,179 @@
-from typing import List, Dict, Any
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
+import math
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Deque, cast
+from langchain_core.documents import Document
 
 from src.config import settings
+from src.utils.document_cache import ParsedDocumentCache
+from src.utils.pdf_workers import build_splitter, extract_page_range, open_pdf, page_document, get_process_pool, process_pool_size, reset_process_pool
+from src.utils.metrics import track_stage
 
 
 class PDFProcessor:
     """Maneja el procesamiento y división de documentos PDF."""
     
-    def __init__(self):
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ".", " ", ""],
-        )
+    def __init__(self, document_cache: Optional[ParsedDocumentCache] = None):
+        self.splitter = build_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        # Caché compartida: el número de páginas y el hash se calculan una vez por contenido
+        self.document_cache = document_cache or ParsedDocumentCache(settings.PARSE_CACHE_MAX_ENTRIES)
     
-    def load_and_split_pdf(self, file_path: str) -> List[Document]:
+    @staticmethod
+    def _use_process_pool(page_count: int) -> bool:
+        """Solo compensa repartir entre procesos los PDFs grandes y con más de un núcleo."""
+        return process_pool_size() > 1 and page_count >= settings.PDF_PARALLEL_MIN_PAGES
+    
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
         """
-        Carga un PDF y lo divide en chunks.
+        Lee las páginas de un PDF de forma perezosa, en orden.
+        
+        Los PDFs grandes se extraen por rangos en el pool de procesos, con un número
+        acotado de rangos en vuelo; el resto página a página en el proceso actual.
         
         Args:
             file_path: Ruta al archivo PDF
             
-        Returns:
-            Lista de documentos divididos en chunks
-            
-        Raises:
-            FileNotFoundError: Si el archivo no existe
-            RuntimeError: Si no se pueden extraer chunks del PDF
+        Yields:
+            Un Document por página
         """
-        import os
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"El archivo {file_path} no existe")
+        reader = open_pdf(file_path)
+        page_count = len(reader.pages)
+        if not self._use_process_pool(page_count):
+            labels = reader.page_labels
+            for number in range(page_count):
+                with track_stage("pdf_load", items=1):
+                    page = page_document(reader, file_path, number, labels)
+                yield page
+            return
+        
+        del reader
+        yield from self._iter_pages_parallel(file_path, page_count)
+    
+    def _iter_pages_parallel(self, file_path: str, page_count: int) -> Iterator[Document]:
+        """Reparte rangos de páginas entre el pool de procesos y los entrega en orden."""
+        workers = process_pool_size()
+        range_size = max(1, min(settings.PDF_PAGES_PER_TASK, math.ceil(page_count / workers)))
+        ranges = deque((start, min(start + range_size, page_count)) for start in range(0, page_count, range_size))
+        print(f"[PDFProcessor] Procesando {page_count} páginas en {len(ranges)} rangos con {workers} procesos")
         
+        # Ventana de rangos en vuelo: los procesos trabajan por delante del consumidor sin cargar todo el PDF
+        in_flight: Deque[Tuple[int, Future[List[Document]]]] = deque()
+        next_page = 0
         try:
-            loader = PyPDFLoader(file_path)
-            docs = loader.load()
-            chunks = self.splitter.split_documents(docs)
+            pool = get_process_pool()
+            while ranges or in_flight:
+                while ranges and len(in_flight) < workers * 2:
+                    start, end = ranges.popleft()
+                    in_flight.append((end, pool.submit(extract_page_range, file_path, start, end)))
+                end, future = in_flight.popleft()
+                # Solo se mide la espera del rango: la extracción ocurre en paralelo en el pool
+                with track_stage("pdf_load") as stage:
+                    pages = future.result()
+                    stage.items = len(pages)
+                yield from pages
+                next_page = end
+        except BrokenProcessPool:
+            # Un proceso murió (p.ej. sin memoria): recrear el pool la próxima vez y seguir aquí
+            print(f"[PDFProcessor] Pool de procesos roto, procesando {file_path} en el proceso actual")
+            reset_process_pool()
+            for _, future in in_flight:
+                future.cancel()
+            reader = open_pdf(file_path)
+            labels = reader.page_labels
+            for number in range(next_page, page_count):
+                with track_stage("pdf_load", items=1):
+                    page = page_document(reader, file_path, number, labels)
+                yield page
+    
+    def split_pages(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        Divide páginas en chunks de forma incremental.
+        
+        El último trozo de cada página se arrastra y se une al texto de la siguiente,
+        así los chunks (y su solapamiento) continúan a través de los saltos de página
+        y solo hace falta tener en memoria una página más ese resto.
+        
+        Args:
+            pages: Páginas en orden (p.ej. de iter_pages)
             
-            if not chunks:
-                raise RuntimeError("No se pudieron extraer chunks del PDF")
-                
-            return chunks
+        Yields:
+            Chunks con los metadatos de la página en la que empiezan
+        """
+        carry = ""
+        carry_metadata: Dict[str, Any] = {}
+        for page in pages:
+            # LangChain declara metadata como dict sin parametrizar
+            page_metadata = cast(Dict[str, Any], page.metadata)  # pyright: ignore[reportUnknownMemberType]
+            if carry:
+                text = f"{carry}\n\n{page.page_content}" if page.page_content else carry
+                boundary = len(carry)
+            else:
+                text = page.page_content
+                carry_metadata = page_metadata
+                boundary = 0
             
-        except Exception as e:
-            raise RuntimeError(f"Error al procesar PDF {file_path}: {str(e)}")
+            with track_stage("split") as stage:
+                pieces = self.splitter.split_text(text)
+                stage.items = len(pieces)
+            if not pieces:
+                continue
+            
+            cursor = 0
+            for piece in pieces[:-1]:
+                position = text.find(piece, cursor)
+                position = cursor if position < 0 else position
+                cursor = position + 1
+                yield Document(page_content=piece, metadata=dict(carry_metadata if position < boundary else page_metadata))
+            
+            last_position = text.find(pieces[-1], cursor)
+            last_position = cursor if last_position < 0 else last_position
+            if last_position >= boundary:
+                carry_metadata = page_metadata
+            carry = pieces[-1]
+        
+        if carry:
+            yield Document(page_content=carry, metadata=dict(carry_metadata))
     
-    def create_metadata(self, doc_id: str, filename: str, num_chunks: int) -> List[Dict[str, Any]]:
+    def create_batch_metadata(self, doc_id: str, filename: str, start: int, count: int) -> List[Dict[str, Any]]:
         """
-        Crea metadatos para los chunks de un documento.
+        Crea metadatos para un lote de chunks durante la ingesta en streaming.
+        
+        El total de chunks no se conoce hasta terminar el documento, por lo que se omite
+        total_chunks (el total queda en el índice de documentos).
         
         Args:
             doc_id: ID único del documento
             filename: Nombre del archivo
-            num_chunks: Número de chunks
+            start: Índice del primer chunk del lote
+            count: Número de chunks del lote
             
         Returns:
-            Lista de metadatos para cada chunk
+            Lista de metadatos para cada chunk del lote
         """
         return [
             {
-                "doc_id": doc_id, 
-                "filename": filename, 
-                "chunk_index": str(i),  # Convertir a string para consistencia
-                "total_chunks": str(num_chunks),  # Total de chunks como string
-                "document_type": "pdf"  # Tipo de documento
-            } 
-            for i in range(num_chunks)
+                "doc_id": doc_id,
+                "filename": filename,
+                "chunk_index": str(i),
+                "document_type": "pdf"
+            }
+            for i in range(start, start + count)
         ]
     
-    def generate_chunk_ids(self, doc_id: str, num_chunks: int) -> List[str]:
+    def generate_chunk_ids(self, doc_id: str, num_chunks: int, start: int = 0) -> List[str]:
         """
         Genera IDs únicos para los chunks de un documento.
         
         Args:
             doc_id: ID único del documento
             num_chunks: Número de chunks
+            start: Índice del primer chunk (para lotes)
             
         Returns:
             Lista de IDs únicos para cada chunk
         """
-        return [f"{doc_id}_{i}" for i in range(num_chunks)]
+        return [f"{doc_id}_{i}" for i in range(start, start + num_chunks)]
     
     def count_pdf_pages(self, file_path: str) -> int:
         """
@@ -101,54 +193,17 @@ class PDFProcessor:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"El archivo {file_path} no existe")
         
-        try:
-            loader = PyPDFLoader(file_path)
-            docs = loader.load()
-            
-            # Cada documento en la lista representa una página
-            return len(docs)
-            
-        except Exception as e:
-            # Fallback: intentar con PyPDF2 directamente si PyPDFLoader falla
-            try:
-                try:
-                    import PyPDF2  # type: ignore
-                except ImportError:
-                    raise RuntimeError(f"Error al contar páginas del PDF {file_path}: PyPDF2 no disponible: {str(e)}")
-                
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)  # type: ignore
-                    return len(pdf_reader.pages)  # type: ignore
-            except Exception:
-                raise RuntimeError(f"Error al contar páginas del PDF {file_path}: {str(e)}")
-    
-    def get_pdf_info(self, file_path: str) -> Dict[str, Any]:
-        """
-        Obtiene información completa de un archivo PDF (páginas y chunks).
-        
-        Args:
-            file_path: Ruta al archivo PDF
-            
-        Returns:
-            Diccionario con información del PDF (pages, chunks)
-            
-        Raises:
-            FileNotFoundError: Si el archivo no existe
-            RuntimeError: Si no se puede procesar el PDF
-        """
-        import os
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"El archivo {file_path} no existe")
+        entry = self.document_cache.get(file_path)
+        if entry.page_count is not None:
+            return entry.page_count
         
         try:
-            loader = PyPDFLoader(file_path)
-            docs = loader.load()
-            chunks = self.splitter.split_documents(docs)
-            
-            return {
-                "pages": len(docs),
-                "chunks": chunks
-            }
+            # Contar páginas solo requiere la estructura del PDF, no extraer el texto
+            with entry.lock:
+                if entry.page_count is None:
+                    with track_stage("pdf_count_pages"):
+                        entry.page_count = len(open_pdf(file_path).pages)
+            return entry.page_count
             
         except Exception as e:
-            raise RuntimeError(f"Error al obtener información del PDF {file_path}: {str(e)}")
\ No newline at end of file
+            raise RuntimeError(f"Error al contar páginas del PDF {file_path}: {str(e)}")
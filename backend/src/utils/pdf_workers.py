@@ -0,0 +1,102 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import List, Optional, TYPE_CHECKING
+
+from langchain_core.documents import Document
+
+from src.config import settings
+
+if TYPE_CHECKING:
+    # pypdf y el splitter se importan al usarlos: los procesos "spawn" y el arranque no los pagan
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from pypdf import PdfReader
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+
+
+def build_splitter(chunk_size: int, chunk_overlap: int) -> "RecursiveCharacterTextSplitter":
+    """Splitter usado para todos los PDFs (mismo resultado en el proceso principal y en los workers)."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ".", " ", ""],
+    )
+
+
+def open_pdf(file_path: str) -> "PdfReader":
+    """Abre un PDF con pypdf (importado aquí para no cargarlo al importar el módulo)."""
+    from pypdf import PdfReader
+
+    return PdfReader(file_path)
+
+
+def page_document(reader: "PdfReader", file_path: str, number: int, labels: List[str]) -> Document:
+    """
+    Extrae una página como Document con los mismos metadatos básicos que PyPDFLoader.
+
+    Args:
+        reader: PdfReader ya abierto
+        file_path: Ruta al archivo PDF
+        number: Número de página (base 0)
+        labels: Etiquetas de página del PDF
+
+    Returns:
+        Document con el texto de la página y source, total_pages, page y page_label
+    """
+    return Document(
+        page_content=reader.pages[number].extract_text().strip(),
+        metadata={"source": file_path, "total_pages": len(reader.pages), "page": number, "page_label": labels[number]},
+    )
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[Document]:
+    """
+    Extrae el texto de un rango de páginas de un PDF. Se ejecuta en un proceso del pool.
+
+    Args:
+        file_path: Ruta al archivo PDF
+        start: Primera página (incluida, base 0)
+        end: Última página (excluida)
+
+    Returns:
+        Páginas del rango, en orden
+    """
+    reader = open_pdf(file_path)
+    labels = reader.page_labels
+    return [page_document(reader, file_path, number, labels) for number in range(start, min(end, len(reader.pages)))]
+
+
+def process_pool_size() -> int:
+    """Número de procesos del pool (PDF_PROCESS_WORKERS o, si es 0, los núcleos disponibles)."""
+    return settings.PDF_PROCESS_WORKERS or os.cpu_count() or 1
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Retorna el pool de procesos compartido, creándolo la primera vez.
+
+    Se usa el método "spawn" porque el proceso principal tiene hilos activos
+    (indexación, embeddings) y hacer fork con hilos no es seguro.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=process_pool_size(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def reset_process_pool() -> None:
+    """Descarta el pool (p.ej. tras un BrokenProcessPool) para que se cree uno nuevo."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,583 @@
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import asyncio
+import cProfile
+import pstats
+import threading
+from collections import Counter as CounterDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Any, Callable, Deque, Dict, Generator, List, Optional, Tuple, cast
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+
+SAMPLE_MODE = "sample"
+CPROFILE_MODE = "cprofile"
+PROFILE_MODES = (SAMPLE_MODE, CPROFILE_MODE)
+JOB_PROFILE_WAIT_SECONDS = 5.0
+
+# Hojas de pila de hilos en espera (bucle de eventos, pools sin trabajo): no se cuentan como muestras
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+
+
+class _Trace:
+    """Árbol de spans de una petición perfilada, con límite de spans."""
+
+    def __init__(self, name: str, max_spans: int):
+        self.max_spans = max_spans
+        self.spans = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.root = Span(self, name)
+
+    def admit(self) -> bool:
+        with self.lock:
+            if self.spans >= self.max_spans:
+                self.dropped += 1
+                return False
+            self.spans += 1
+            return True
+
+
+class Span:
+    """Intervalo con nombre dentro del árbol de una petición perfilada."""
+
+    __slots__ = ("trace", "name", "attributes", "thread", "start", "end", "children")
+
+    def __init__(self, trace: _Trace, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes or {}
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "thread": self.thread,
+        }
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("profiling_span", default=None)
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profiling_session", default=None)
+
+
+def current_session() -> Optional["ProfileSession"]:
+    """Sesión de perfilado de la petición actual, o None."""
+    return _current_session.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Generator[Optional[Span], None, None]:
+    """
+    Abre un span hijo del span actual si la petición se está perfilando.
+
+    Sin perfilado activo solo cuesta leer una ContextVar. El contexto se hereda en
+    asyncio.to_thread y run_in_threadpool, así que los spans de hilos auxiliares
+    cuelgan de la petición que los originó.
+
+    Args:
+        name: Nombre del span (p.ej. la etapa de track_stage)
+        **attributes: Atributos opcionales
+
+    Yields:
+        El span creado, o None si no hay perfilado activo
+    """
+    parent = _current_span.get()
+    if parent is None or not parent.trace.admit():
+        yield None
+        return
+    child = Span(parent.trace, name, attributes)
+    with parent.trace.lock:
+        parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def record_span(name: str, started: float, **attributes: Any) -> None:
+    """
+    Añade al span actual un span hijo ya terminado (de started a ahora).
+
+    Para intervalos que cruzan yields de un generador, donde abrir un span con
+    ContextVar filtraría el span al código que consume el generador.
+    """
+    parent = _current_span.get()
+    if parent is None or not parent.trace.admit():
+        return
+    child = Span(parent.trace, name, attributes)
+    child.start = started
+    child.end = time.perf_counter()
+    with parent.trace.lock:
+        parent.children.append(child)
+
+
+class _StackSampler(threading.Thread):
+    """Muestrea las pilas de todos los hilos (salvo las que están esperando) a intervalos fijos."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: "CounterDict[str]" = CounterDict()
+        self.samples = 0
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        # sys._current_frames es la API documentada de CPython para leer las pilas de otros hilos
+        current_frames = cast(Callable[[], Dict[int, FrameType]], getattr(sys, "_current_frames"))
+        while not self._stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack: List[str] = []
+                current: Any = frame
+                while current is not None:
+                    code = current.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    current = current.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self.join()
+
+
+class ProfileSession:
+    """
+    Perfilado de una petición: árbol de spans más un perfilador de muestreo o cProfile.
+
+    El muestreo ve todos los hilos del proceso (event loop, threadpool, embeddings);
+    cProfile solo el hilo que lo activa y, en endpoints asíncronos, también el trabajo
+    de otras peticiones que compartan el event loop durante la ventana.
+    """
+
+    def __init__(self, name: str, mode: str = SAMPLE_MODE, sample_interval: float = 0.005, max_spans: int = 5000):
+        self.id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.mode = mode if mode in PROFILE_MODES else SAMPLE_MODE
+        self.sample_interval = sample_interval
+        self.trace = _Trace(name, max_spans)
+        # Si es True, las indexaciones que encole esta petición también se perfilan (X-Profile-Indexing)
+        self.follow_jobs = False
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._tokens: Tuple[Any, Any] = (None, None)
+        self._sampler: Optional[_StackSampler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+
+    def start(self) -> None:
+        self._tokens = (_current_span.set(self.trace.root), _current_session.set(self))
+        if self.mode == CPROFILE_MODE:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._sampler = _StackSampler(self.sample_interval)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        self.trace.root.end = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        span_token, session_token = self._tokens
+        _current_session.reset(session_token)
+        _current_span.reset(span_token)
+
+    def report(self, **extra: Any) -> Dict[str, Any]:
+        """Resumen JSON: árbol de spans y funciones más costosas."""
+        root = self.trace.root
+        report: Dict[str, Any] = {
+            "id": self.id,
+            "name": self.name,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_ms": round(((root.end or time.perf_counter()) - root.start) * 1000, 3),
+            **extra,
+            "spans": root.to_dict(root.start),
+            "dropped_spans": self.trace.dropped,
+        }
+        if self._sampler is not None:
+            report["samples"] = self._sampler.samples
+            report["sample_interval_ms"] = self.sample_interval * 1000
+            report["top_functions"] = self._top_sampled_functions()
+        if self._cprofile is not None:
+            report["top_functions"] = self._top_cprofile_functions()
+        return report
+
+    def _top_sampled_functions(self, limit: int = 30) -> List[Dict[str, Any]]:
+        own: "CounterDict[str]" = CounterDict()
+        total: "CounterDict[str]" = CounterDict()
+        assert self._sampler is not None
+        for stack, count in self._sampler.stacks.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples = max(1, self._sampler.samples)
+        return [
+            {"function": function, "self_pct": round(100 * count / samples, 1), "total_pct": round(100 * total[function] / samples, 1)}
+            for function, count in own.most_common(limit)
+        ]
+
+    def _top_cprofile_functions(self, limit: int = 30) -> List[Dict[str, Any]]:
+        assert self._cprofile is not None
+        # pstats no declara el tipo de Stats.stats: (archivo, línea, función) -> (primitivas, llamadas, propio, acumulado, llamadores)
+        entries = cast(
+            Dict[Tuple[str, int, str], Tuple[int, int, float, float, Dict[Any, Any]]],
+            getattr(pstats.Stats(self._cprofile), "stats"),
+        )
+        rows: List[Tuple[float, Dict[str, Any]]] = []
+        for (filename, line, function), (_, calls, own_time, cumulative, _) in entries.items():
+            rows.append((cumulative, {
+                "function": f"{function} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "self_ms": round(own_time * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return [row for _, row in rows[:limit]]
+
+    def folded_stacks(self) -> Optional[str]:
+        """Pilas en formato "folded" (flamegraph.pl, speedscope) si se usó el muestreo."""
+        if self._sampler is None:
+            return None
+        return "".join(f"{stack} {count}\n" for stack, count in self._sampler.stacks.most_common())
+
+    def dump_cprofile(self, path: str) -> bool:
+        """Guarda las estadísticas de cProfile (snakeviz, pstats) si se usó cProfile."""
+        if self._cprofile is None:
+            return False
+        self._cprofile.dump_stats(path)
+        return True
+
+
+class ProfileStore:
+    """Guarda los perfiles en disco ({id}.json, .folded y .prof) y conserva solo los últimos."""
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max(1, max_profiles)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        # Los IDs solo contienen [0-9A-Za-z-]: evita rutas fuera del directorio
+        if not profile_id or not all(c.isalnum() or c == "-" for c in profile_id):
+            raise ValueError(f"ID de perfil no válido: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}{extension}")
+
+    def save(self, session: ProfileSession, report: Dict[str, Any]) -> None:
+        folded = session.folded_stacks()
+        if folded is not None:
+            with open(self._path(session.id, ".folded"), "w", encoding="utf-8") as f:
+                f.write(folded)
+        session.dump_cprofile(self._path(session.id, ".prof"))
+        tmp_path = self._path(session.id, ".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(session.id, ".json"))
+        self._prune()
+
+    def _prune(self) -> None:
+        profiles = sorted(self.list_ids())
+        for profile_id in profiles[:-self.max_profiles]:
+            for extension in (".json", ".folded", ".prof"):
+                try:
+                    os.remove(self._path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+    def list_ids(self) -> List[str]:
+        return [name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json")]
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Resumen de los perfiles guardados, del más reciente al más antiguo."""
+        summaries: List[Dict[str, Any]] = []
+        for profile_id in sorted(self.list_ids(), reverse=True):
+            report = self.get(profile_id)
+            if report is not None:
+                summaries.append({key: report.get(key) for key in ("id", "name", "mode", "started_at", "duration_ms", "status_code")})
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(profile_id, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def file_path(self, profile_id: str, extension: str) -> Optional[str]:
+        """Ruta de un artefacto (.folded o .prof) si existe."""
+        try:
+            path = self._path(profile_id, extension)
+        except ValueError:
+            return None
+        return path if os.path.exists(path) else None
+
+
+class RateLimiter:
+    """Ventana deslizante de un minuto: como mucho max_per_minute perfiles por proceso."""
+
+    def __init__(self, max_per_minute: int):
+        self.max_per_minute = max_per_minute
+        self._times: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._times and now - self._times[0] > 60:
+                self._times.popleft()
+            if len(self._times) >= self.max_per_minute:
+                return False
+            self._times.append(now)
+            return True
+
+
+class Profiler:
+    """
+    Perfilado bajo demanda: autoriza, limita y guarda los perfiles del proceso.
+
+    Solo hay un perfil activo a la vez por proceso (el muestreo ve todos los hilos y
+    cProfile no admite dos perfiladores simultáneos); las peticiones que llegan mientras
+    tanto se atienden sin perfilar.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        directory: str,
+        max_per_minute: int = 6,
+        max_stored: int = 50,
+        sample_interval_ms: float = 5.0,
+        max_spans: int = 5000,
+    ):
+        self.token = token or ""
+        self.directory = directory
+        self.sample_interval = max(0.001, sample_interval_ms / 1000)
+        self.max_spans = max_spans
+        self.limiter = RateLimiter(max_per_minute)
+        self.max_stored = max_stored
+        self._store: Optional[ProfileStore] = None
+        self._active = threading.Lock()
+        # doc_id -> modo: indexaciones encoladas por una subida perfilada (mismo proceso)
+        self._followed_jobs: Dict[str, str] = {}
+        self._jobs_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    @property
+    def store(self) -> ProfileStore:
+        if self._store is None:
+            self._store = ProfileStore(self.directory, self.max_stored)
+        return self._store
+
+    def authorize(self, token: Optional[str]) -> bool:
+        """Comprueba el token de administración (comparación en tiempo constante)."""
+        return self.enabled and bool(token) and hmac.compare_digest(token.encode(), self.token.encode())  # type: ignore[union-attr]
+
+    def acquire(self) -> str:
+        """
+        Reserva el perfilador para una petición.
+
+        Returns:
+            "recorded" si se puede perfilar, "busy" si ya hay un perfil activo o
+            "rate-limited" si se superó PROFILING_MAX_PER_MINUTE
+        """
+        if not self._active.acquire(blocking=False):
+            return "busy"
+        if not self.limiter.allow():
+            self._active.release()
+            return "rate-limited"
+        return "recorded"
+
+    def release(self) -> None:
+        self._active.release()
+
+    def new_session(self, name: str, mode: str) -> ProfileSession:
+        return ProfileSession(name, mode, self.sample_interval, self.max_spans)
+
+    def follow_job(self, doc_id: str) -> None:
+        """Si la petición actual se perfila y lo pidió (X-Profile-Indexing), perfila también la indexación de doc_id."""
+        session = current_session()
+        if session is not None and session.follow_jobs:
+            with self._jobs_lock:
+                self._followed_jobs[doc_id] = session.mode
+
+    @contextmanager
+    def profile_job(self, doc_id: str, name: str) -> Generator[Optional[ProfileSession], None, None]:
+        """
+        Perfila un trabajo en segundo plano si lo encoló una petición perfilada con X-Profile-Indexing.
+
+        El trabajo no cuenta para el límite por minuto (ya lo contó la petición). Solo
+        los trabajos que lo pidieron esperan (hasta JOB_PROFILE_WAIT_SECONDS) a que se
+        libere el perfilador; el resto no espera nunca. Si sigue ocupado, el trabajo se
+        ejecuta sin perfilar.
+        """
+        with self._jobs_lock:
+            mode = self._followed_jobs.pop(doc_id, None)
+        # El trabajo puede empezar antes de que la subida que lo encoló libere el perfilador
+        if mode is None or not self._active.acquire(timeout=JOB_PROFILE_WAIT_SECONDS):
+            yield None
+            return
+        session = self.new_session(name, mode)
+        session.start()
+        error: Optional[str] = None
+        try:
+            yield session
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            session.stop()
+            self._active.release()
+            self.save(session, session.report(doc_id=doc_id, error=error))
+
+    def save(self, session: ProfileSession, report: Dict[str, Any]) -> None:
+        try:
+            self.store.save(session, report)
+            print(f"[Profiler] Perfil {session.id} guardado ({session.name}, {report['duration_ms']} ms)")
+        except Exception as e:
+            print(f"[Profiler] No se pudo guardar el perfil {session.id}: {str(e)}")
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Profiler:
+    """Perfilador del proceso configurado con los ajustes PROFILING_*."""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                token = settings.PROFILING_TOKEN.get_secret_value() if settings.PROFILING_TOKEN else None
+                _profiler = Profiler(
+                    token,
+                    settings.PROFILING_DIR,
+                    settings.PROFILING_MAX_PER_MINUTE,
+                    settings.PROFILING_MAX_STORED,
+                    settings.PROFILING_SAMPLE_INTERVAL_MS,
+                    settings.PROFILING_MAX_SPANS,
+                )
+    return _profiler
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila las peticiones que lo piden con el token de administración.
+
+    Se activa con la cabecera X-Profile-Token (nunca por query string, que acaba en los
+    logs de acceso); el modo se elige con X-Profile-Mode ("sample" por defecto o
+    "cprofile") y X-Profile-Indexing: 1 perfila también la indexación que encole la
+    petición. La respuesta lleva X-Profile-Status y, si se perfiló, X-Profile-Id para
+    descargar el perfil en /rag/profiles/{id}. Es ASGI puro para cubrir respuestas en
+    streaming (SSE) hasta el último evento.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: Optional[Profiler] = None, exclude_paths: Tuple[str, ...] = ()) -> None:
+        self.app = app
+        self._profiler = profiler
+        # Prefijos que nunca se perfilan (p.ej. las rutas que descargan perfiles con el mismo token)
+        self.exclude_paths = exclude_paths
+
+    @property
+    def profiler(self) -> Profiler:
+        return self._profiler or get_profiler()
+
+    @staticmethod
+    def _requested(scope: Scope) -> Tuple[Optional[str], str, bool]:
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        follow_jobs = headers.get("x-profile-indexing", "").strip().lower() in ("1", "true", "yes")
+        return headers.get("x-profile-token"), headers.get("x-profile-mode") or SAMPLE_MODE, follow_jobs
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        token, mode, follow_jobs = self._requested(scope)
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = self.profiler
+        if not profiler.authorize(token):
+            # Token incorrecto o perfilado desactivado: la petición sigue sin perfilar
+            await self.app(scope, receive, _with_headers(send, [(b"x-profile-status", b"unauthorized")]))
+            return
+        status = profiler.acquire()
+        if status != "recorded":
+            await self.app(scope, receive, _with_headers(send, [(b"x-profile-status", status.encode())]))
+            return
+
+        session = profiler.new_session(f"{scope['method']} {scope['path']}", mode)
+        session.follow_jobs = follow_jobs
+        status_code: List[int] = []
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status_code.append(message["status"])
+            await send(message)
+
+        error: Optional[str] = None
+        session.start()
+        try:
+            await self.app(scope, receive, _with_headers(send_wrapper, [
+                (b"x-profile-status", b"recorded"),
+                (b"x-profile-id", session.id.encode()),
+            ]))
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            session.stop()
+            profiler.release()
+            report = session.report(status_code=status_code[0] if status_code else None, error=error)
+            await asyncio.to_thread(profiler.save, session, report)
+
+
+def _with_headers(send: Send, headers: List[Tuple[bytes, bytes]]) -> Send:
+    """Envuelve send para añadir cabeceras a http.response.start."""
+
+    async def wrapped(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": list(message.get("headers", [])) + headers}
+        await send(message)
+
+    return wrapped
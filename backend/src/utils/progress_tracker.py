@@ -0,0 +1,109 @@
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Etapas contadas durante la ingesta de un documento
+PAGES_EXTRACTED = "pages_extracted"
+CHUNKS_SPLIT = "chunks_split"
+CHUNKS_EMBEDDED = "chunks_embedded"
+CHUNKS_STORED = "chunks_stored"
+
+
+class IngestionProgress:
+    """
+    Contadores de progreso de la indexación de un documento.
+
+    Los contadores se actualizan desde varios hilos (parseo y embeddings) y se
+    persisten mediante `persist` como mucho cada flush_interval segundos, para que
+    cualquier worker pueda consultarlos sin ralentizar la ingesta.
+    """
+
+    def __init__(
+        self,
+        doc_id: str,
+        total_pages: Optional[int],
+        persist: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        flush_interval: float = 0.5,
+    ):
+        self.doc_id = doc_id
+        self.total_pages = total_pages
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self.started_at = time.time()
+        self.counters: Dict[str, int] = {PAGES_EXTRACTED: 0, CHUNKS_SPLIT: 0, CHUNKS_EMBEDDED: 0, CHUNKS_STORED: 0}
+        self.finished = False
+        self._last_flush = 0.0
+        self._lock = Lock()
+
+    def add(self, stage: str, count: int = 1) -> None:
+        """Suma count a la etapa indicada y persiste si toca."""
+        with self._lock:
+            self.counters[stage] = self.counters.get(stage, 0) + count
+        self.flush()
+
+    def track(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """Recorre un iterable contando cada elemento en la etapa indicada."""
+        for item in items:
+            self.add(stage)
+            yield item
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna el estado actual del progreso.
+
+        Returns:
+            Diccionario con los contadores, total_pages, percent, eta_seconds,
+            started_at, updated_at y finished
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            finished = self.finished
+        now = time.time()
+        elapsed = now - self.started_at
+
+        # El total de chunks se desconoce hasta el final: se estima a partir de las páginas leídas
+        percent: Optional[float] = None
+        if finished:
+            percent = 100.0
+        elif self.total_pages and counters[PAGES_EXTRACTED]:
+            estimated_chunks = counters[CHUNKS_SPLIT] / counters[PAGES_EXTRACTED] * self.total_pages
+            if estimated_chunks:
+                percent = min(99.0, 100.0 * counters[CHUNKS_STORED] / estimated_chunks)
+
+        eta_seconds: Optional[float] = None
+        if finished:
+            eta_seconds = 0.0
+        elif percent:
+            eta_seconds = elapsed * (100.0 - percent) / percent
+
+        return {
+            **counters,
+            "total_pages": self.total_pages,
+            "percent": round(percent, 1) if percent is not None else None,
+            "eta_seconds": round(eta_seconds, 1) if eta_seconds is not None else None,
+            "started_at": self.started_at,
+            "updated_at": now,
+            "finished": finished,
+        }
+
+    def flush(self, force: bool = False) -> None:
+        """Persiste el estado si pasó flush_interval desde la última vez (o si force)."""
+        if self.persist is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_flush < self.flush_interval:
+                return
+            self._last_flush = now
+        try:
+            self.persist(self.doc_id, self.snapshot())
+        except Exception as e:
+            print(f"[IngestionProgress] No se pudo guardar el progreso de {self.doc_id}: {str(e)}")
+
+    def finish(self) -> None:
+        """Marca la ingesta como terminada y persiste el estado final."""
+        with self._lock:
+            self.finished = True
+        self.flush(force=True)
@@ -0,0 +1,123 @@
+import os
+
+# Proveedores locales: los tests no necesitan red ni GOOGLE_API_KEY
+os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("CHAT_PROVIDER", "fake")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+from pathlib import Path  # noqa: E402
+from typing import TYPE_CHECKING, Callable, Iterator, List  # noqa: E402
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from pypdf import PdfWriter  # noqa: E402
+
+from src.config import settings  # noqa: E402
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+@pytest.fixture
+def make_pdf(tmp_path: Path) -> Callable[..., str]:
+    """Crea un PDF de páginas en blanco; marker cambia los bytes (y por tanto el hash)."""
+
+    def factory(name: str = "doc.pdf", pages: int = 1, marker: str = "") -> str:
+        path = os.path.join(str(tmp_path), name)
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=200, height=200)
+        if marker:
+            writer.add_metadata({"/Subject": marker})
+        with open(path, "wb") as f:
+            writer.write(f)
+        return path
+
+    return factory
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+@pytest.fixture
+def make_text_pdf(tmp_path: Path) -> Callable[[str, List[List[str]]], str]:
+    """Crea un PDF con texto extraíble: una lista de líneas por página (fuente Helvetica)."""
+
+    def factory(name: str, pages: List[List[str]]) -> str:
+        page_ids = [4 + 2 * i for i in range(len(pages))]
+        objects = [
+            "<< /Type /Catalog /Pages 2 0 R >>",
+            f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(pages)} >>",
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        ]
+        for page_id, lines in zip(page_ids, pages):
+            body = " T* ".join(f"({_pdf_string(line)}) Tj" for line in lines)
+            stream = f"BT /F1 10 Tf 12 TL 40 760 Td {body} ET"
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+            )
+            objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+        content = "%PDF-1.4\n"
+        offsets: List[int] = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(content))
+            content += f"{number} 0 obj\n{body}\nendobj\n"
+        xref = len(content)
+        content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+        content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+        content += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+
+        path = os.path.join(str(tmp_path), name)
+        with open(path, "w", encoding="latin-1") as f:
+            f.write(content)
+        return path
+
+    return factory
+
+
+@pytest.fixture(params=["numpy"])
+def vector_backend(request: pytest.FixtureRequest) -> str:
+    """Backend vectorial del servicio; los tests que lo parametrizan cubren también Chroma."""
+    return request.param
+
+
+@pytest.fixture
+def service(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, vector_backend: str) -> Iterator["RAGService"]:
+    """RAGService aislado en tmp_path, sin workers de indexación ni reconciliador en segundo plano."""
+    # Las rutas de datos (data/pdfs, chroma_db) son relativas al directorio de trabajo
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", vector_backend)
+    monkeypatch.setattr(settings, "INDEXING_WORKERS", 0)
+    monkeypatch.setattr(settings, "RECONCILE_INTERVAL_SECONDS", 0)
+    from src.services.rag_service import RAGService
+
+    rag_service = RAGService()
+    yield rag_service
+    rag_service.close()
+    if vector_backend == "chroma":
+        # chromadb reutiliza el cliente por ruta ("./chroma_db" en cada tmp_path)
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        SharedSystemClient.clear_system_cache()
+
+
+@pytest.fixture
+def indexed_doc(service: "RAGService", make_text_pdf: Callable[[str, List[List[str]]], str]) -> str:
+    """Indexa un PDF de texto de dos páginas y retorna su doc_id."""
+    path = make_text_pdf("volcanes.pdf", [
+        [f"Los volcanes expulsan lava y ceniza, linea {i}" for i in range(30)],
+        ["El magma se acumula en la camara magmatica bajo el volcan"],
+    ])
+    return service.add_pdf_from_path(path, "volcanes.pdf")["doc_id"]
+
+
+@pytest.fixture
+def client(service: "RAGService") -> TestClient:
+    """TestClient de la app usando el servicio aislado (sin pasar por el lifespan)."""
+    from src.main import app
+
+    app.state.rag_service = service
+    return TestClient(app)
@@ -0,0 +1,75 @@
+import time
+from typing import Dict
+
+from src.utils.answer_cache import AnswerCache, normalize_question
+from src.utils.lru_cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache: LRUCache[int] = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_entries_expire_after_ttl():
+    cache: LRUCache[int] = LRUCache(10, ttl_seconds=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_normalize_question_ignores_case_and_spacing():
+    assert normalize_question("  ¿Qué   DICE el\tcontrato? ") == normalize_question("¿qué dice el contrato?")
+
+
+def test_invalidate_document_drops_its_answers_and_global_ones():
+    cache = AnswerCache(max_entries=10)
+    on_a = cache.make_key("pregunta", "a", 4, "modelo")
+    on_b = cache.make_key("pregunta", "b", 4, "modelo")
+    on_all = cache.make_key("pregunta", None, 4, "modelo")
+    for key in (on_a, on_b, on_all):
+        cache.put(key, "respuesta")
+
+    cache.invalidate_document("a")
+
+    assert cache.get(on_a) is None
+    assert cache.get(on_all) is None
+    assert cache.get(on_b) == {"answer": "respuesta", "sources": []}
+    # Las claves nuevas llevan la versión nueva y no reutilizan las antiguas
+    assert cache.make_key("pregunta", "a", 4, "modelo") != on_a
+    assert cache.make_key("pregunta", "b", 4, "modelo") == on_b
+
+
+class Versions:
+    """VersionStore en memoria compartido por dos cachés (como dos workers)."""
+
+    def __init__(self):
+        self.versions: Dict[str, int] = {}
+
+    def get_version(self, scope: str) -> int:
+        return self.versions.get(scope, 0)
+
+    def bump_version(self, doc_id: str) -> None:
+        for scope in (doc_id, "__all__"):
+            self.versions[scope] = self.versions.get(scope, 0) + 1
+
+
+def test_shared_version_store_invalidates_other_workers():
+    versions = Versions()
+    worker_1 = AnswerCache(version_store=versions)
+    worker_2 = AnswerCache(version_store=versions)
+    key = worker_2.make_key("pregunta", "a", 4, "modelo")
+    worker_2.put(key, "respuesta")
+
+    worker_1.invalidate_document("a")
+
+    assert worker_2.make_key("pregunta", "a", 4, "modelo") != key
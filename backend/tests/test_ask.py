@@ -0,0 +1,53 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, List
+
+from fastapi.testclient import TestClient
+
+from src.services.llm import FakeChatModel
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+def test_aask_matches_sync_ask(service: "RAGService", indexed_doc: str):
+    service.answer_cache = None
+
+    answer = asyncio.run(service.aask("¿Qué expulsan los volcanes?", doc_id=indexed_doc))
+
+    assert answer
+    assert answer == service.ask("¿Qué expulsan los volcanes?", doc_id=indexed_doc)
+
+
+def test_aask_without_results(service: "RAGService"):
+    assert asyncio.run(service.aask("¿Qué es un volcán?")) == "No encontré información relevante."
+
+
+def test_aask_with_unknown_document(service: "RAGService", indexed_doc: str):
+    answer = asyncio.run(service.aask("¿Qué es un volcán?", doc_id="otro"))
+
+    assert answer == "No encontré información para el documento con id 'otro'."
+
+
+def test_concurrent_asks_do_not_block_each_other(service: "RAGService", indexed_doc: str):
+    llm = service.llm
+    assert isinstance(llm, FakeChatModel)
+    llm.latency_ms = 200
+    questions = [f"¿Qué expulsan los volcanes? ({i})" for i in range(5)]
+
+    async def ask_all() -> List[str]:
+        return await asyncio.gather(*(service.aask(question) for question in questions))
+
+    started = time.perf_counter()
+    answers = asyncio.run(ask_all())
+
+    assert len(answers) == 5
+    # Las esperas del LLM se solapan: bastante menos que 5 × 200 ms
+    assert time.perf_counter() - started < 0.8
+
+
+def test_ask_route(client: TestClient, indexed_doc: str):
+    response = client.post("/rag/ask", json={"question": "¿Qué expulsan los volcanes?", "doc_id": indexed_doc})
+
+    assert response.status_code == 200
+    assert response.json()["answer"]
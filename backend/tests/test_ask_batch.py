@@ -0,0 +1,77 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.config import settings
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+@pytest.fixture
+def searched(service: "RAGService") -> List[List[str]]:
+    """Registra las preguntas de cada búsqueda vectorial conjunta."""
+    calls: List[List[str]] = []
+    search_many = service.vector_store.search_many
+
+    def spy(queries: List[str], *args: Any, **kwargs: Any) -> Any:
+        calls.append(list(queries))
+        return search_many(queries, *args, **kwargs)
+
+    service.vector_store.search_many = spy  # type: ignore[method-assign]
+    return calls
+
+
+def test_batch_answers_in_order_like_single_asks(service: "RAGService", indexed_doc: str):
+    questions = ["¿Qué expulsan los volcanes?", "¿Dónde se acumula el magma?"]
+
+    results = asyncio.run(service.aask_batch(questions, doc_id=indexed_doc))
+
+    service.answer_cache = None
+    assert results == [{"answer": service.ask(question, doc_id=indexed_doc)} for question in questions]
+
+
+@pytest.mark.parametrize("answer_cache", [True, False])
+def test_repeated_questions_are_answered_once(service: "RAGService", indexed_doc: str, searched: List[List[str]], answer_cache: bool):
+    if not answer_cache:
+        service.answer_cache = None
+    questions = ["¿Qué es el magma?", "¿qué es   el MAGMA?", "¿Qué expulsan los volcanes?", "¿Qué es el magma?"]
+
+    results = asyncio.run(service.aask_batch(questions, doc_id=indexed_doc))
+
+    assert searched == [["¿Qué es el magma?", "¿Qué expulsan los volcanes?"]]
+    assert results[0] == results[1] == results[3]
+    assert results[2] != results[0]
+
+
+def test_cached_questions_skip_retrieval(service: "RAGService", indexed_doc: str, searched: List[List[str]]):
+    cached = asyncio.run(service.aask("¿Qué es el magma?", doc_id=indexed_doc))
+
+    results = asyncio.run(service.aask_batch(["¿Qué es el magma?", "¿Qué expulsan los volcanes?"], doc_id=indexed_doc))
+
+    assert results[0] == {"answer": cached}
+    assert searched == [["¿Qué expulsan los volcanes?"]]
+
+
+def test_retrieval_failure_is_reported_per_question(service: "RAGService"):
+    def fail(*args: Any, **kwargs: Any) -> Any:
+        raise RuntimeError("búsqueda caída")
+
+    service.vector_store.search_many = fail  # type: ignore[method-assign]
+
+    results = asyncio.run(service.aask_batch(["uno", "dos", "uno"]))
+
+    assert results == [{"error": "Error en la recuperación: búsqueda caída"}] * 3
+
+
+def test_batch_route_validates_size(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "ASK_BATCH_MAX_QUESTIONS", 2)
+
+    assert client.post("/rag/ask/batch", json={"questions": []}).status_code == 400
+    assert client.post("/rag/ask/batch", json={"questions": ["a", "b", "c"]}).status_code == 400
+
+    response = client.post("/rag/ask/batch", json={"questions": ["a", "b"]})
+    assert response.status_code == 200
+    assert [item["question"] for item in response.json()["answers"]] == ["a", "b"]
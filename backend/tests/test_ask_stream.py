@@ -0,0 +1,70 @@
+import asyncio
+import json
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from fastapi.testclient import TestClient
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+def parse_sse(body: str) -> List[Tuple[str, Any]]:
+    events: List[Tuple[str, Any]] = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def stream(client: TestClient, question: str, doc_id: str) -> List[Tuple[str, Any]]:
+    with client.stream("POST", "/rag/ask/stream", json={"question": question, "doc_id": doc_id}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        return parse_sse(response.read().decode("utf-8"))
+
+
+def test_stream_emits_sources_tokens_and_done(client: TestClient, service: "RAGService", indexed_doc: str):
+    events = stream(client, "¿Qué expulsan los volcanes?", indexed_doc)
+
+    names = [name for name, _ in events]
+    assert names[0] == "sources"
+    assert names[-1] == "done"
+    assert set(names[1:-1]) == {"token"} and len(names) > 3
+    sources: List[Dict[str, Any]] = events[0][1]
+    assert sources and all(source["doc_id"] == indexed_doc for source in sources)
+    answer = "".join(data for name, data in events if name == "token")
+    service.answer_cache = None
+    assert answer == service.ask("¿Qué expulsan los volcanes?", doc_id=indexed_doc)
+
+
+def test_cached_answer_is_streamed_as_one_token(client: TestClient, indexed_doc: str):
+    first = stream(client, "¿Qué expulsan los volcanes?", indexed_doc)
+    second = stream(client, "¿Qué expulsan los volcanes?", indexed_doc)
+
+    assert [name for name, _ in second] == ["sources", "token", "done"]
+    assert second[0][1] == first[0][1]
+    assert second[1][1] == "".join(data for name, data in first if name == "token")
+
+
+def test_stream_without_results(service: "RAGService"):
+    async def collect() -> List[Dict[str, Any]]:
+        return [event async for event in service.astream_answer("¿Qué es un volcán?")]
+
+    events = asyncio.run(collect())
+
+    assert events == [
+        {"event": "sources", "data": []},
+        {"event": "token", "data": "No encontré información relevante."},
+        {"event": "done", "data": {}},
+    ]
+
+
+def test_stream_reports_errors_as_event(client: TestClient, service: "RAGService", indexed_doc: str):
+    def fail(*args: Any, **kwargs: Any) -> Any:
+        raise RuntimeError("búsqueda caída")
+
+    service.vector_store.search = fail  # type: ignore[method-assign]
+
+    events = stream(client, "¿Qué expulsan los volcanes?", indexed_doc)
+
+    assert events == [("error", {"detail": "búsqueda caída"})]
@@ -0,0 +1,96 @@
+import os
+import uuid
+from pathlib import Path
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+
+from src.utils.bm25_index import BM25Index, BM25Store, CorpusStats, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_strips_accents_and_keeps_codes():
+    assert tokenize("Configuración del Error E-404 en ISO/IEC 3.2.1") == [
+        "configuracion", "del", "error", "e-404", "en", "iso/iec", "3.2.1",
+    ]
+
+
+def test_index_ranks_chunks_with_more_matches_first():
+    index = BM25Index(["a", "b", "c"], ["gato negro", "gato gato blanco", "perro"], [{}, {}, {}])
+
+    results = index.search(tokenize("gato"), k=5)
+
+    assert [position for position, _ in results] == [1, 0]
+    assert index.search(tokenize("inexistente"), k=5) == []
+
+
+def test_corpus_stats_use_global_frequencies():
+    # "raro" solo aparece en el documento pequeño: dentro de él es común, en el corpus es raro
+    big = BM25Index([f"big_{i}" for i in range(20)], ["comun texto"] * 20, [{}] * 20)
+    small = BM25Index(["small_0"], ["raro"], [{}])
+    terms = tokenize("raro comun")
+    corpus = CorpusStats([big, small], terms)
+
+    assert corpus.document_count == 21
+    assert corpus.document_frequencies == {"raro": 1, "comun": 20}
+    local_score = small.search(terms, 1)[0][1]
+    global_score = small.search(terms, 1, corpus)[0][1]
+    assert global_score > local_score * 5
+    assert global_score > big.search(terms, 1, corpus)[0][1]
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> BM25Store:
+    return BM25Store(str(tmp_path / "bm25"))
+
+
+def add(store: BM25Store, texts: List[str]) -> str:
+    doc_id = str(uuid.uuid4())
+    writer = store.open_writer(doc_id)
+    writer.add(
+        [f"{doc_id}_{i}" for i in range(len(texts))],
+        texts,
+        [{"doc_id": doc_id, "chunk_index": str(i)} for i in range(len(texts))],
+    )
+    writer.commit()
+    return doc_id
+
+
+def test_store_searches_one_or_all_documents(store: BM25Store):
+    first = add(store, ["contrato de alquiler", "fianza"])
+    second = add(store, ["factura de luz"])
+
+    assert store.list_documents() == sorted([first, second])
+    assert [doc.id for doc in store.search("fianza", 5)] == [f"{first}_1"]
+    assert store.search("factura", 5, doc_id=first) == []
+    assert [doc.id for doc in store.search("factura", 5, doc_id=second)] == [f"{second}_0"]
+
+    assert store.delete_document(first)
+    assert not store.delete_document(first)
+    assert store.search("fianza", 5) == []
+    assert not store.has_document(first)
+
+
+def test_aborted_writer_publishes_nothing(store: BM25Store):
+    writer = store.open_writer(str(uuid.uuid4()))
+    writer.add(["x_0"], ["fianza"], [{}])
+    writer.abort()
+
+    assert os.listdir(store.directory) == []
+    assert store.search("fianza", 5) == []
+
+
+def test_store_rejects_doc_ids_that_are_not_uuids(store: BM25Store):
+    with pytest.raises(ValueError):
+        store.open_writer("../fuera")
+    assert store.has_document("../fuera") is False
+    assert store.search("texto", 5, doc_id="../fuera") == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    a, b, c = (Document(id=name, page_content=name) for name in "abc")
+
+    fused = reciprocal_rank_fusion([[a, b], [b, c]], k=3)
+
+    assert [doc.id for doc in fused] == ["b", "a", "c"]
+    assert len(reciprocal_rank_fusion([[a, b], [b, c]], k=1)) == 1
@@ -0,0 +1,76 @@
+import os
+from typing import TYPE_CHECKING, Any, Callable, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.services import rag_service
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+TextPdf = Callable[[str, List[List[str]]], str]
+
+
+def index(service: "RAGService", make_text_pdf: TextPdf, name: str) -> str:
+    path = make_text_pdf(name, [[f"Texto de {name}, linea {i}" for i in range(30)]])
+    return service.add_pdf_from_path(path, name)["doc_id"]
+
+
+@pytest.mark.parametrize("vector_backend", ["numpy", "chroma"])
+def test_delete_removes_every_trace(client: TestClient, service: "RAGService", indexed_doc: str):
+    entry = service.index_manager.get_entry(indexed_doc)
+    assert entry is not None
+    client.post("/rag/ask", json={"question": "¿Qué expulsan los volcanes?", "doc_id": indexed_doc})
+    assert service.answer_cache is not None and service.answer_cache.stats()["entries"] == 1
+
+    response = client.delete(f"/rag/documents/{indexed_doc}")
+
+    assert response.status_code == 200
+    assert response.json() == {"deleted": True, "doc_id": indexed_doc}
+    assert service.index_manager.get_entry(indexed_doc) is None
+    assert service.vector_store.count_document_chunks(indexed_doc) == 0
+    assert not service.bm25_store.has_document(indexed_doc)
+    assert not os.path.exists(entry["path"])
+    answer = client.post("/rag/ask", json={"question": "¿Qué expulsan los volcanes?", "doc_id": indexed_doc}).json()["answer"]
+    assert answer.startswith("No encontré información")
+
+
+def test_delete_unknown_document(client: TestClient):
+    assert client.delete("/rag/documents/desconocido").status_code == 404
+
+
+def test_delete_queued_document_cancels_its_job(service: "RAGService", make_pdf: Callable[..., str]):
+    entry, _ = service.create_pending_entry(make_pdf(), "doc.pdf")
+
+    assert service.delete_document(entry["doc_id"])
+
+    assert service.job_queue.stats()["queued"] == 0
+    assert not os.path.exists(entry["path"])
+
+
+def test_failed_vector_delete_is_left_to_the_reconciler(service: "RAGService", indexed_doc: str):
+    def fail(*args: Any, **kwargs: Any) -> None:
+        raise RuntimeError("almacén no disponible")
+
+    original = service.vector_store.delete_document_chunks
+    service.vector_store.delete_document_chunks = fail  # type: ignore[method-assign]
+
+    assert service.delete_document(indexed_doc)
+    assert service.vector_store.count_document_chunks(indexed_doc) > 0
+
+    service.vector_store.delete_document_chunks = original  # type: ignore[method-assign]
+    report = service.reconciler.run_once()
+
+    assert report is not None and report["orphan_documents"] == [indexed_doc]
+    assert service.vector_store.count_document_chunks(indexed_doc) == 0
+
+
+def test_oldest_document_is_purged_over_the_limit(service: "RAGService", make_text_pdf: TextPdf, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(rag_service, "MAX_DOCS", 2)
+    oldest = index(service, make_text_pdf, "a.pdf")
+    kept = [index(service, make_text_pdf, "b.pdf"), index(service, make_text_pdf, "c.pdf")]
+
+    assert service.index_manager.get_entry(oldest) is None
+    assert sorted(service.vector_store.scan_document_chunks()) == sorted(kept)
+    assert service.bm25_store.list_documents() == sorted(kept)
@@ -0,0 +1,97 @@
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from src.db.embedding_cache import CachedEmbeddings
+from src.db.embeddings import FakeEmbeddings, embed_query_batch
+
+VECTOR_BYTES = 16 * 4  # FakeEmbeddings(size=16) en float32
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    """FakeEmbeddings que registra los textos que llegan al modelo."""
+
+    def __init__(self):
+        super().__init__(size=16)
+        self.documents: List[str] = []
+        self.queries: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.documents.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        self.queries.extend(texts)
+        return super().embed_queries(texts)
+
+
+@pytest.fixture
+def inner() -> CountingEmbeddings:
+    return CountingEmbeddings()
+
+
+def make_cache(tmp_path: Path, inner: CountingEmbeddings, max_bytes: int = 1 << 20, cache_queries: bool = False) -> CachedEmbeddings:
+    return CachedEmbeddings(inner, str(tmp_path / "cache.sqlite3"), "fake-16", max_bytes, cache_queries)
+
+
+def test_repeated_texts_are_embedded_once(tmp_path: Path, inner: CountingEmbeddings):
+    cache = make_cache(tmp_path, inner)
+
+    first = cache.embed_documents(["uno", "dos", "uno"])
+    second = cache.embed_documents(["dos", "tres"])
+
+    assert inner.documents == ["uno", "dos", "tres"]
+    assert first[0] == first[2]
+    assert second[0] == pytest.approx(first[1])
+    stats = cache.stats()
+    # Se cuenta por posición: el "uno" repetido dentro del mismo lote también es un fallo
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 3)
+
+
+def test_cache_survives_reopening(tmp_path: Path, inner: CountingEmbeddings):
+    make_cache(tmp_path, inner).embed_documents(["uno"])
+
+    reopened = make_cache(tmp_path, inner)
+    reopened.embed_documents(["uno"])
+
+    assert inner.documents == ["uno"]
+    assert reopened.stats()["bytes"] == VECTOR_BYTES
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path, inner: CountingEmbeddings):
+    cache = make_cache(tmp_path, inner, max_bytes=3 * VECTOR_BYTES)
+    for text in ("a", "b", "c"):
+        cache.embed_documents([text])
+        time.sleep(0.002)
+    cache.embed_documents(["a"])  # "a" pasa a ser la más reciente
+    time.sleep(0.002)
+
+    cache.embed_documents(["d"])
+
+    # Se expulsa hasta quedar por debajo del 90% del límite: "b" y "c" son las más antiguas
+    assert cache.stats()["bytes"] <= 3 * VECTOR_BYTES * 0.9
+    inner.documents.clear()
+    cache.embed_documents(["a", "d", "b"])
+    assert inner.documents == ["b"]
+
+
+def test_queries_use_their_own_key_space(tmp_path: Path, inner: CountingEmbeddings):
+    cache = make_cache(tmp_path, inner, cache_queries=True)
+    cache.embed_documents(["hola"])
+
+    embed_query_batch(cache, ["hola", "adiós"])
+    embed_query_batch(cache, ["hola"])
+
+    assert inner.queries == ["hola", "adiós"]
+
+
+def test_queries_are_not_cached_by_default(tmp_path: Path, inner: CountingEmbeddings):
+    cache = make_cache(tmp_path, inner)
+
+    cache.embed_queries(["hola"])
+    cache.embed_queries(["hola"])
+
+    assert inner.queries == ["hola", "hola"]
+    assert cache.stats()["entries"] == 0
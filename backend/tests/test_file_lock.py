@@ -0,0 +1,70 @@
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+from src.utils.file_lock import FileLock
+
+
+def test_second_instance_cannot_acquire_while_held(tmp_path: Path):
+    path = str(tmp_path / "x.lock")
+    first = FileLock(path)
+    second = FileLock(path)
+
+    assert first.acquire()
+    assert second.acquire(blocking=False) is False
+    first.release()
+    assert second.acquire(blocking=False) is True
+    second.release()
+
+
+def test_shared_instance_excludes_other_threads(tmp_path: Path):
+    lock = FileLock(str(tmp_path / "x.lock"))
+    assert lock.acquire()
+    result: List[bool] = []
+
+    thread = threading.Thread(target=lambda: result.append(lock.acquire(blocking=False)))
+    thread.start()
+    thread.join()
+
+    assert result == [False]
+    lock.release()
+    assert lock.acquire(blocking=False) is True
+    lock.release()
+
+
+def test_blocking_acquire_serializes_threads(tmp_path: Path):
+    path = str(tmp_path / "x.lock")
+    shared = FileLock(path)
+    inside = 0
+    max_inside = 0
+    counter_lock = threading.Lock()
+
+    def worker(lock: FileLock) -> None:
+        nonlocal inside, max_inside
+        for _ in range(5):
+            with lock:
+                with counter_lock:
+                    inside += 1
+                    max_inside = max(max_inside, inside)
+                time.sleep(0.002)
+                with counter_lock:
+                    inside -= 1
+
+    # Mezcla hilos que comparten instancia con hilos que usan la suya propia
+    threads = [threading.Thread(target=worker, args=(shared if i % 2 else FileLock(path),)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max_inside == 1
+
+
+def test_release_without_acquire_is_noop(tmp_path: Path):
+    lock = FileLock(str(tmp_path / "x.lock"))
+    lock.release()
+    with lock:
+        pass
+    assert lock.acquire(blocking=False) is True
+    lock.release()
@@ -0,0 +1,85 @@
+import json
+import os
+from pathlib import Path
+
+from src.utils.index_manager import IndexManager
+
+
+def test_migrates_legacy_json_once(tmp_path: Path):
+    legacy = tmp_path / "docs_index.json"
+    legacy.write_text(json.dumps([
+        {"doc_id": "a", "filename": "a.pdf", "uploaded_at": "2024-01-01T00:00:00", "status": "completed",
+         "chunks": 3, "file_hash": "h-a", "custom": {"tags": ["x"]}},
+        {"doc_id": "b", "filename": "b.pdf", "uploaded_at": "2024-01-02T00:00:00", "status": "processing"},
+        {"filename": "sin-id.pdf"},
+    ]), encoding="utf-8")
+    db_path = str(tmp_path / "docs_index.sqlite3")
+
+    index = IndexManager(db_path, legacy_json_path=str(legacy))
+
+    assert index.count_entries() == 2
+    entry = index.get_entry("a")
+    assert entry is not None
+    assert entry["chunks"] == 3
+    assert entry["file_hash"] == "h-a"
+    assert entry["custom"] == {"tags": ["x"]}
+    b = index.get_entry("b")
+    assert b is not None and b["chunks"] == 0
+    assert not legacy.exists()
+    assert os.path.exists(f"{legacy}.migrated")
+
+    # Un segundo arranque no vuelve a importar (el JSON ya se renombró)
+    index.delete_entry("b")
+    reopened = IndexManager(db_path, legacy_json_path=str(legacy))
+    assert reopened.get_entry("b") is None
+    assert reopened.count_entries() == 1
+
+
+def test_invalid_legacy_json_is_set_aside(tmp_path: Path):
+    legacy = tmp_path / "docs_index.json"
+    legacy.write_text("{no es json", encoding="utf-8")
+
+    index = IndexManager(str(tmp_path / "docs_index.sqlite3"), legacy_json_path=str(legacy))
+
+    assert index.count_entries() == 0
+    assert os.path.exists(f"{legacy}.migrated")
+
+
+def test_find_duplicate_by_hash_ignores_failed_entries(tmp_path: Path):
+    index = IndexManager(str(tmp_path / "docs_index.sqlite3"))
+    index.create_entry("a", "a.pdf", "/data/a.pdf", "processing", file_hash="same")
+
+    duplicate = index.find_duplicate_by_hash("same")
+    assert duplicate is not None and duplicate["doc_id"] == "a"
+
+    index.mark_as_failed("a")
+    assert index.find_duplicate_by_hash("same") is None
+    assert index.find_duplicate_by_hash("otro") is None
+
+
+def test_update_entry_merges_extra_fields(tmp_path: Path):
+    index = IndexManager(str(tmp_path / "docs_index.sqlite3"))
+    index.create_entry("a", "a.pdf", "/data/a.pdf")
+
+    assert index.update_entry("a", chunks=7, custom="x")
+    assert index.update_entry("a", other=1)
+    entry = index.get_entry("a")
+    assert entry is not None
+    assert (entry["chunks"], entry["custom"], entry["other"]) == (7, "x", 1)
+    assert index.update_entry("missing", chunks=1) is False
+
+
+def test_versions_are_shared_between_instances(tmp_path: Path):
+    db_path = str(tmp_path / "docs_index.sqlite3")
+    writer = IndexManager(db_path)
+    fresh = IndexManager(db_path, version_refresh_seconds=0)
+    cached = IndexManager(db_path, version_refresh_seconds=3600)
+    assert cached.get_version("a") == 0
+
+    writer.bump_version("a")
+
+    # El propio proceso ve el cambio al instante; los demás al refrescar su copia
+    assert writer.get_version("a") == 1
+    assert writer.get_version("__all__") == 1
+    assert fresh.get_version("a") == 1
+    assert cached.get_version("a") == 0
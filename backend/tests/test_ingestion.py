@@ -0,0 +1,50 @@
+from typing import TYPE_CHECKING, Callable, List
+
+import pytest
+
+from src.config import settings
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+TextPdf = Callable[[str, List[List[str]]], str]
+
+
+def test_add_pdf_from_path_streams_batches_to_every_store(
+    service: "RAGService", make_text_pdf: TextPdf, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 2)
+    path = make_text_pdf("volcanes.pdf", [
+        [f"Los volcanes expulsan lava y ceniza, linea {i}" for i in range(40)],
+        ["El magma se acumula en la camara magmatica"],
+    ])
+
+    result = service.add_pdf_from_path(path, "volcanes.pdf")
+
+    doc_id = result["doc_id"]
+    chunks = result["chunks"]
+    assert result["status"] == "ready" and result["pages"] == 2
+    assert chunks > 2  # varios lotes de EMBEDDING_BATCH_SIZE
+    entry = service.index_manager.get_entry(doc_id)
+    assert entry is not None and (entry["status"], entry["chunks"]) == ("ready", chunks)
+    assert sorted(service.vector_store.scan_document_chunks()[doc_id]) == sorted(f"{doc_id}_{i}" for i in range(chunks))
+    assert service.bm25_store.has_document(doc_id)
+    assert "magma" in service.bm25_store.search("magma", 1, doc_id)[0].page_content
+
+    progress = service.get_progress(doc_id)
+    assert progress is not None
+    assert progress["finished"] and progress["pages_extracted"] == 2
+    assert progress["chunks_split"] == progress["chunks_stored"] == chunks
+
+
+def test_pdf_without_text_fails_without_leftovers(service: "RAGService", make_pdf: Callable[..., str]):
+    entry, _ = service.create_pending_entry(make_pdf(pages=2), "blank.pdf")
+    doc_id = entry["doc_id"]
+
+    with pytest.raises(RuntimeError):
+        service.add_pdf_from_path(entry["path"], "blank.pdf", doc_id)
+
+    failed = service.index_manager.get_entry(doc_id)
+    assert failed is not None and failed["status"] == "failed"
+    assert doc_id not in service.vector_store.scan_document_chunks()
+    assert not service.bm25_store.has_document(doc_id)
@@ -0,0 +1,153 @@
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from src.config import settings
+from src.services import job_queue
+from src.services.job_queue import JobQueue
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+class Clock:
+    """Reloj manual para controlar leases y backoff sin esperar."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    current = Clock()
+    monkeypatch.setattr(job_queue.time, "time", current)
+    return current
+
+
+@pytest.fixture
+def queue(tmp_path: Path, clock: Clock) -> JobQueue:
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=30, retry_backoff_seconds=5)
+
+
+def test_claim_returns_each_job_once(queue: JobQueue):
+    job_id = queue.enqueue("doc-1", "/tmp/a.pdf", "a.pdf")
+
+    job = queue.claim("w1")
+    assert job is not None
+    assert job["job_id"] == job_id
+    assert job["attempts"] == 1
+    assert queue.claim("w2") is None
+    assert queue.stats() == {"queued": 0, "running": 1, "failed": 0}
+
+
+def test_claim_prefers_higher_priority(queue: JobQueue, clock: Clock):
+    queue.enqueue("low", "/tmp/low.pdf")
+    clock.now += 1
+    queue.enqueue("high", "/tmp/high.pdf", priority=5)
+
+    first = queue.claim("w1")
+    second = queue.claim("w1")
+    assert first is not None and second is not None
+    assert [first["doc_id"], second["doc_id"]] == ["high", "low"]
+
+
+def test_expired_lease_is_reclaimed(queue: JobQueue, clock: Clock):
+    queue.enqueue("doc-1", "/tmp/a.pdf")
+    assert queue.claim("w1") is not None
+    assert queue.has_active_job("doc-1")
+
+    # El worker muere sin latido: al expirar el lease otro lo retoma
+    clock.now += 31
+    assert not queue.has_active_job("doc-1")
+    job = queue.claim("w2")
+    assert job is not None
+    assert job["doc_id"] == "doc-1"
+    assert job["attempts"] == 2
+
+
+def test_heartbeat_renews_lease(queue: JobQueue, clock: Clock):
+    job_id = queue.enqueue("doc-1", "/tmp/a.pdf")
+    assert queue.claim("w1") is not None
+
+    clock.now += 20
+    queue.heartbeat([job_id])
+    clock.now += 20
+    assert queue.claim("w2") is None
+    assert queue.has_active_job("doc-1")
+
+
+def test_fail_retries_with_exponential_backoff(queue: JobQueue, clock: Clock):
+    job_id = queue.enqueue("doc-1", "/tmp/a.pdf", max_attempts=3)
+    queue.claim("w1")
+
+    assert queue.fail(job_id, "boom") is True
+    assert queue.stats()["queued"] == 1
+    clock.now += 4.9
+    assert queue.claim("w1") is None
+    clock.now += 0.2
+    job = queue.claim("w1")
+    assert job is not None
+    assert job["last_error"] == "boom"
+
+    # Segundo fallo: el retraso se duplica (5 s * 2)
+    assert queue.fail(job_id, "boom") is True
+    clock.now += 9.9
+    assert queue.claim("w1") is None
+    clock.now += 0.2
+    assert queue.claim("w1") is not None
+
+
+def test_fail_marks_job_failed_after_max_attempts(queue: JobQueue, clock: Clock):
+    job_id = queue.enqueue("doc-1", "/tmp/a.pdf", max_attempts=1)
+    queue.claim("w1")
+
+    assert queue.fail(job_id, "boom") is False
+    clock.now += 3600
+    assert queue.claim("w1") is None
+    assert queue.stats() == {"queued": 0, "running": 0, "failed": 1}
+    assert not queue.has_active_job("doc-1")
+
+
+def test_complete_and_cancel_remove_jobs(queue: JobQueue):
+    done = queue.enqueue("doc-1", "/tmp/a.pdf")
+    queue.enqueue("doc-2", "/tmp/b.pdf")
+    queue.enqueue("doc-2", "/tmp/b.pdf")
+    queue.claim("w1")
+    queue.complete(done)
+
+    assert queue.cancel_document("doc-2") == 2
+    assert queue.stats() == {"queued": 0, "running": 0, "failed": 0}
+    assert queue.fail(done, "ya no existe") is False
+
+
+def test_prune_failed_keeps_recent_failures(queue: JobQueue, clock: Clock):
+    old = queue.enqueue("doc-1", "/tmp/a.pdf", max_attempts=1)
+    queue.claim("w1")
+    queue.fail(old, "boom")
+    clock.now += 100
+    recent = queue.enqueue("doc-2", "/tmp/b.pdf", max_attempts=1)
+    queue.claim("w1")
+    queue.fail(recent, "boom")
+    queue.enqueue("doc-3", "/tmp/c.pdf")
+    clock.now += 50
+
+    assert queue.prune_failed(120) == 1
+    assert queue.stats() == {"queued": 1, "running": 0, "failed": 1}
+    assert queue.prune_failed(0) == 1
+    assert queue.stats() == {"queued": 1, "running": 0, "failed": 0}
+
+
+def test_reconciler_prunes_expired_failed_jobs(service: "RAGService", monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "INDEXING_FAILED_JOB_RETENTION_SECONDS", 0)
+    job_id = service.job_queue.enqueue("doc-1", "/tmp/a.pdf", max_attempts=1)
+    service.job_queue.claim("w1")
+    service.job_queue.fail(job_id, "boom")
+
+    report = service.reconciler.run_once()
+
+    assert report is not None and report["pruned_failed_jobs"] == 1
+    assert service.job_queue.stats()["failed"] == 0
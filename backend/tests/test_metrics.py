@@ -0,0 +1,77 @@
+from typing import TYPE_CHECKING, Dict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.config import settings
+from src.utils.metrics import MetricsRegistry
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+def scrape(client: TestClient) -> Dict[str, float]:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples: Dict[str, float] = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Trabajos", ("result",))
+    histogram = registry.histogram("latency_seconds", "Latencia", buckets=(0.1, 1.0))
+    counter.inc(result="ok")
+    counter.inc(2, result="ok")
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{result="ok"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_count 3" in lines
+    assert registry.counter("jobs_total", "Trabajos", ("result",)) is counter
+
+
+def test_ask_updates_stage_and_result_metrics(client: TestClient, indexed_doc: str):
+    before = scrape(client)
+    question = {"question": "¿Qué expulsan los volcanes?", "doc_id": indexed_doc}
+
+    client.post("/rag/ask", json=question)
+    client.post("/rag/ask", json=question)
+    after = scrape(client)
+
+    def delta(name: str) -> float:
+        return after.get(name, 0) - before.get(name, 0)
+
+    assert delta('rag_asks_total{result="answered"}') == 1
+    assert delta('rag_asks_total{result="cached"}') == 1
+    assert delta('rag_stage_duration_seconds_count{stage="llm"}') == 1
+    assert delta('rag_stage_duration_seconds_count{stage="retrieval"}') == 1
+    assert after["rag_asks_in_flight"] == 0
+
+
+def test_collectors_report_queue_and_documents(client: TestClient, service: "RAGService", indexed_doc: str):
+    service.job_queue.enqueue("otro", "/tmp/otro.pdf")
+
+    samples = scrape(client)
+
+    assert samples['rag_indexing_queue_jobs{state="queued"}'] == 1
+    assert samples['rag_documents{status="ready"}'] == 1
+    assert samples['rag_stage_items_total{stage="ingest"}'] >= service.vector_store.count_document_chunks(indexed_doc)
+
+
+def test_metrics_can_be_disabled(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,104 @@
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple, cast
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from src.db.numpy_store import NumpyVectorStore
+
+Batch = Tuple[List[Document], List[Dict[str, Any]], List[str]]
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> NumpyVectorStore:
+    return NumpyVectorStore(str(tmp_path / "store"))
+
+
+def batches(doc_id: str, texts: List[str], size: int = 2) -> Iterator[Batch]:
+    for start in range(0, len(texts), size):
+        part = texts[start:start + size]
+        yield (
+            [Document(page_content=text) for text in part],
+            [{"doc_id": doc_id, "filename": "a.pdf", "chunk_index": start + i} for i in range(len(part))],
+            [f"{doc_id}_{start + i}" for i in range(len(part))],
+        )
+
+
+def add(store: NumpyVectorStore, texts: List[str]) -> str:
+    doc_id = str(uuid.uuid4())
+    assert store.add_document_stream(batches(doc_id, texts)) == len(texts)
+    return doc_id
+
+
+def test_search_ranks_by_cosine_and_filters_by_document(store: NumpyVectorStore):
+    animals = add(store, ["el gato duerme", "el perro ladra", "la vaca muge"])
+    plants = add(store, ["el roble crece", "el gato trepa al roble"])
+
+    assert [doc.id for doc in store.search("gato duerme", 1)] == [f"{animals}_0"]
+    assert [doc.page_content for doc in store.search("gato", 2, where={"doc_id": plants})][0] == "el gato trepa al roble"
+    assert len(store.search("gato", 10)) == 5
+    found = store.search("perro ladra", 1)[0]
+    assert cast(Dict[str, Any], found.metadata) == {"doc_id": animals, "filename": "a.pdf", "chunk_index": "1"}  # pyright: ignore[reportUnknownMemberType]
+
+
+def test_search_many_matches_single_searches(store: NumpyVectorStore):
+    add(store, ["el gato duerme", "el perro ladra", "la vaca muge"])
+    queries = ["gato", "vaca muge"]
+
+    many = store.search_many(queries, 2)
+
+    assert [[doc.id for doc in docs] for docs in many] == [[doc.id for doc in store.search(q, 2)] for q in queries]
+
+
+def test_documents_persist_as_normalized_float32(store: NumpyVectorStore, tmp_path: Path):
+    doc_id = add(store, ["el gato duerme", "el perro ladra", "la vaca muge"])
+
+    matrix = np.load(store.matrix_path(doc_id))
+    assert matrix.dtype == np.float32 and matrix.shape[0] == 3
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
+
+    reopened = NumpyVectorStore(str(tmp_path / "store"))
+    assert reopened.scan_document_chunks() == {doc_id: [f"{doc_id}_{i}" for i in range(3)]}
+    assert [doc.id for doc in reopened.search("perro", 1)] == [f"{doc_id}_1"]
+
+
+def test_other_instance_sees_published_documents(store: NumpyVectorStore, tmp_path: Path):
+    # Otro worker con su propio almacén sobre el mismo directorio
+    other = NumpyVectorStore(str(tmp_path / "store"))
+    assert other.search("gato", 1) == []
+
+    doc_id = add(store, ["el gato duerme"])
+
+    assert [doc.id for doc in other.search("gato", 1)] == [f"{doc_id}_0"]
+
+
+def test_failed_stream_publishes_nothing(store: NumpyVectorStore):
+    doc_id = str(uuid.uuid4())
+
+    def failing() -> Iterator[Batch]:
+        yield from batches(doc_id, ["el gato duerme", "el perro ladra"])
+        raise RuntimeError("PDF corrupto")
+
+    with pytest.raises(RuntimeError):
+        store.add_document_stream(failing())
+
+    assert store.count_document_chunks(doc_id) == 0
+    assert os.listdir(store.directory) == []
+
+
+def test_delete_ids_and_documents(store: NumpyVectorStore):
+    first = add(store, ["el gato duerme", "el perro ladra", "la vaca muge"])
+    second = add(store, ["el roble crece"])
+
+    store.delete_ids([f"{first}_1", f"{second}_0"])
+
+    assert store.scan_document_chunks() == {first: [f"{first}_0", f"{first}_2"]}
+    assert f"{first}_1" not in [doc.id for doc in store.search("perro ladra", 5)]
+
+    store.delete_document_chunks(first, 2, verify=True)
+    assert store.list_documents() == []
+    with pytest.raises(ValueError):
+        store.delete_by_metadata({"filename": "a.pdf"})
@@ -0,0 +1,47 @@
+from typing import Any, Dict, cast
+
+import pytest
+from langchain_core.documents import Document
+
+from src.config import settings
+from src.utils.pdf_processor import PDFProcessor
+
+
+@pytest.fixture
+def processor(monkeypatch: pytest.MonkeyPatch) -> PDFProcessor:
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 40)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP", 0)
+    return PDFProcessor()
+
+
+def page(text: str, number: int) -> Document:
+    return Document(page_content=text, metadata={"page": number})
+
+
+def metadata(doc: Document) -> Dict[str, Any]:
+    return cast(Dict[str, Any], doc.metadata)  # pyright: ignore[reportUnknownMemberType]
+
+
+def test_split_pages_keeps_text_and_order(processor: PDFProcessor):
+    pages = [page(" ".join(f"p{n}w{i}" for i in range(12)), n) for n in range(3)]
+
+    chunks = list(processor.split_pages(pages))
+
+    assert all(len(chunk.page_content) <= 40 for chunk in chunks)
+    words = " ".join(chunk.page_content for chunk in chunks).split()
+    assert words == " ".join(p.page_content for p in pages).split()
+    numbers = [metadata(chunk)["page"] for chunk in chunks]
+    assert numbers == sorted(numbers)
+
+
+def test_split_pages_joins_short_pages_across_breaks(processor: PDFProcessor):
+    chunks = list(processor.split_pages([page("uno", 0), page("dos", 1), page("", 2), page("tres", 3)]))
+
+    # Las páginas cortas se unen en un solo chunk con los metadatos de la página donde empieza
+    assert len(chunks) == 1
+    assert chunks[0].page_content.split() == ["uno", "dos", "tres"]
+    assert metadata(chunks[0]) == {"page": 0}
+
+
+def test_split_pages_handles_no_pages(processor: PDFProcessor):
+    assert list(processor.split_pages([])) == []
@@ -0,0 +1,101 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.utils import profiling
+from src.utils.profiling import Profiler
+
+TOKEN = "secreto"
+QUESTION = {"question": "¿Qué expulsan los volcanes?"}
+
+
+@pytest.fixture
+def profiler(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Profiler:
+    instance = Profiler(TOKEN, str(tmp_path / "profiles"), max_per_minute=5, sample_interval_ms=1)
+    monkeypatch.setattr(profiling, "_profiler", instance)
+    return instance
+
+
+def span_names(span: Dict[str, Any]) -> List[str]:
+    children: List[Dict[str, Any]] = span.get("children", [])
+    return [span["name"]] + [name for child in children for name in span_names(child)]
+
+
+def test_requests_without_token_are_not_profiled(client: TestClient, profiler: Profiler):
+    response = client.post("/rag/ask", json=QUESTION)
+
+    assert response.status_code == 200
+    assert "x-profile-status" not in response.headers
+    assert profiler.store.list() == []
+
+
+def test_token_is_only_accepted_in_the_header(client: TestClient, profiler: Profiler):
+    wrong = client.post("/rag/ask", json=QUESTION, headers={"X-Profile-Token": "otro"})
+    in_query = client.post(f"/rag/ask?profile_token={TOKEN}", json=QUESTION)
+
+    assert wrong.status_code == 200 and wrong.headers["x-profile-status"] == "unauthorized"
+    assert "x-profile-status" not in in_query.headers
+    assert profiler.store.list() == []
+
+
+def test_sampled_profile_is_recorded_and_downloadable(client: TestClient, profiler: Profiler, indexed_doc: str):
+    headers = {"X-Profile-Token": TOKEN}
+    response = client.post("/rag/ask", json={**QUESTION, "doc_id": indexed_doc}, headers=headers)
+
+    assert response.headers["x-profile-status"] == "recorded"
+    profile_id = response.headers["x-profile-id"]
+    listed = client.get("/rag/profiles", headers=headers).json()
+    assert [profile["id"] for profile in listed] == [profile_id]
+    assert listed[0]["status_code"] == 200
+
+    report = client.get(f"/rag/profiles/{profile_id}", headers=headers).json()
+    assert report["mode"] == "sample"
+    assert {"ask", "retrieval", "llm"} <= set(span_names(report["spans"]))
+    assert client.get(f"/rag/profiles/{profile_id}/flamegraph", headers=headers).status_code == 200
+    assert client.get(f"/rag/profiles/{profile_id}/pstats", headers=headers).status_code == 404
+
+
+def test_cprofile_mode_stores_pstats(client: TestClient, profiler: Profiler):
+    headers = {"X-Profile-Token": TOKEN}
+    response = client.post("/rag/ask", json=QUESTION, headers={**headers, "X-Profile-Mode": "cprofile"})
+
+    profile_id = response.headers["x-profile-id"]
+    assert client.get(f"/rag/profiles/{profile_id}", headers=headers).json()["top_functions"]
+    assert client.get(f"/rag/profiles/{profile_id}/pstats", headers=headers).status_code == 200
+
+
+def test_profiles_are_rate_limited(client: TestClient, profiler: Profiler):
+    statuses = [
+        client.post("/rag/ask", json=QUESTION, headers={"X-Profile-Token": TOKEN}).headers["x-profile-status"]
+        for _ in range(6)
+    ]
+
+    assert statuses == ["recorded"] * 5 + ["rate-limited"]
+
+
+def test_admin_routes_require_the_token(client: TestClient, profiler: Profiler, monkeypatch: pytest.MonkeyPatch):
+    assert client.get("/rag/profiles").status_code == 403
+    assert client.get("/rag/profiles", headers={"X-Profile-Token": "otro"}).status_code == 403
+
+    monkeypatch.setattr(profiling, "_profiler", Profiler(None, profiler.directory))
+    assert client.get("/rag/profiles", headers={"X-Profile-Token": TOKEN}).status_code == 404
+
+
+def test_upload_can_profile_its_indexing_job(client: TestClient, profiler: Profiler, make_pdf: Callable[..., str]):
+    with open(make_pdf(), "rb") as f:
+        response = client.post(
+            "/rag/upload",
+            files={"file": ("doc.pdf", f, "application/pdf")},
+            headers={"X-Profile-Token": TOKEN, "X-Profile-Indexing": "1"},
+        )
+    doc_id = response.json()["doc_id"]
+
+    # El worker de indexación (aquí, el propio test) perfila el trabajo que encoló la subida
+    with profiler.profile_job(doc_id, f"index {doc_id}") as session:
+        assert session is not None
+    with profiler.profile_job(doc_id, f"index {doc_id}") as session:
+        assert session is None
+
+    assert len(profiler.store.list()) == 2
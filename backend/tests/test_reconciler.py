@@ -0,0 +1,117 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.config import settings
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+def reconcile(service: "RAGService"):
+    report = service.reconciler.run_once()
+    assert report is not None
+    return report
+
+
+def test_report_endpoints(client: TestClient, service: "RAGService"):
+    assert client.get("/rag/reconcile").status_code == 404
+
+    report = client.post("/rag/reconcile").json()
+
+    assert client.get("/rag/reconcile").json() == report
+    lock = service.reconciler._lock  # pyright: ignore[reportPrivateUsage]
+    assert lock.acquire(blocking=False)
+    try:
+        assert client.post("/rag/reconcile").status_code == 409
+    finally:
+        lock.release()
+
+
+def test_orphan_chunks_and_bm25_are_removed(service: "RAGService", indexed_doc: str):
+    # Entrada borrada del índice sin purgar sus datos (p. ej. un worker que murió a mitad)
+    chunks = service.vector_store.count_document_chunks(indexed_doc)
+    service.index_manager.delete_entry(indexed_doc)
+
+    report = reconcile(service)
+
+    assert report["orphan_documents"] == [indexed_doc]
+    assert report["orphan_chunks"] == chunks
+    assert report["orphan_bm25"] == [indexed_doc]
+    assert service.vector_store.count_document_chunks(indexed_doc) == 0
+    assert not service.bm25_store.has_document(indexed_doc)
+
+
+def test_extra_chunks_are_removed(service: "RAGService", indexed_doc: str):
+    entry = service.index_manager.get_entry(indexed_doc)
+    assert entry is not None
+    service.index_manager.mark_as_completed(indexed_doc, entry["chunks"] - 1)
+
+    report = reconcile(service)
+
+    assert report["extra_chunks"] == 1
+    assert service.vector_store.count_document_chunks(indexed_doc) == entry["chunks"] - 1
+    assert report["incomplete_documents"] == []
+
+
+def test_incomplete_document_is_requeued(service: "RAGService", indexed_doc: str):
+    service.bm25_store.delete_document(indexed_doc)
+
+    report = reconcile(service)
+
+    assert report["incomplete_documents"] == [indexed_doc]
+    assert report["reindexed"] == [indexed_doc]
+    assert service.job_queue.has_active_job(indexed_doc)
+    # La ronda siguiente no lo vuelve a encolar mientras el trabajo siga vivo
+    assert reconcile(service)["reindexed"] == []
+
+
+def test_incomplete_document_without_pdf_is_reported(service: "RAGService", indexed_doc: str):
+    entry = service.index_manager.get_entry(indexed_doc)
+    assert entry is not None
+    service.bm25_store.delete_document(indexed_doc)
+    os.remove(entry["path"])
+
+    report = reconcile(service)
+
+    assert report["missing_files"] == [indexed_doc]
+    assert report["reindexed"] == []
+
+
+def test_stale_processing_document_is_marked_failed(service: "RAGService", make_pdf: Callable[..., str]):
+    entry, _ = service.create_pending_entry(make_pdf(), "doc.pdf")
+    doc_id = entry["doc_id"]
+    service.job_queue.cancel_document(doc_id)
+    reconcile(service)
+    # Reciente: todavía puede estar a punto de encolarse
+    still = service.index_manager.get_entry(doc_id)
+    assert still is not None and still["status"] == "processing"
+
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    service.index_manager.update_entry(doc_id, uploaded_at=old.isoformat())
+    report = reconcile(service)
+
+    assert report["stale_processing"] == [doc_id]
+    failed = service.index_manager.get_entry(doc_id)
+    assert failed is not None and failed["status"] == "failed"
+
+
+def test_unreferenced_files_are_removed_after_grace(service: "RAGService", monkeypatch: pytest.MonkeyPatch):
+    file_manager = service.file_manager
+    orphan = os.path.join(file_manager.storage_dir, "huerfano.pdf")
+    temp = os.path.join(file_manager.temp_dir, "subida.tmp")
+    for path in (orphan, temp):
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4")
+
+    assert reconcile(service)["orphan_files"] == []
+
+    monkeypatch.setattr(settings, "RECONCILE_FILE_GRACE_SECONDS", 0)
+    report = reconcile(service)
+
+    assert report["orphan_files"] == ["huerfano.pdf"]
+    assert report["stale_temp_files"] == 1
+    assert not os.path.exists(orphan) and not os.path.exists(temp)
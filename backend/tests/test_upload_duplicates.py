@@ -0,0 +1,97 @@
+import shutil
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+from fastapi.testclient import TestClient
+
+from src.utils.index_manager import IndexManager
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+
+def upload(client: TestClient, path: str, name: str = "doc.pdf") -> str:
+    with open(path, "rb") as f:
+        response = client.post("/rag/upload", files={"file": (name, f, "application/pdf")})
+    assert response.status_code == 200, response.text
+    return response.json()["doc_id"]
+
+
+def test_pending_entry_stores_file_hash(service: "RAGService", make_pdf: Callable[..., str]):
+    path = make_pdf(pages=2)
+
+    entry, created = service.create_pending_entry(path, "doc.pdf")
+
+    assert created
+    stored = service.index_manager.get_entry(entry["doc_id"])
+    assert stored is not None
+    assert stored["status"] == "processing"
+    assert stored["pages"] == 2
+    assert stored["file_hash"] == service.file_manager.calculate_file_hash(path)
+    assert service.job_queue.has_active_job(entry["doc_id"])
+
+
+def test_pending_entry_returns_existing_duplicate(service: "RAGService", make_pdf: Callable[..., str]):
+    path = make_pdf()
+    copy = shutil.copy(path, str(Path(path).with_name("copia.pdf")))
+
+    first, _ = service.create_pending_entry(path, "doc.pdf")
+    second, created = service.create_pending_entry(copy, "copia.pdf")
+
+    assert not created
+    assert second["doc_id"] == first["doc_id"]
+    assert service.job_queue.stats()["queued"] == 1
+
+
+def test_concurrent_inserts_of_same_hash_create_one_entry(tmp_path: Path):
+    db_path = str(tmp_path / "docs_index.sqlite3")
+    # Un IndexManager por hilo: cada uno con su conexión, como workers distintos
+    managers = [IndexManager(db_path) for _ in range(8)]
+    barrier = threading.Barrier(len(managers))
+    results: List[Tuple[Dict[str, object], bool]] = []
+
+    def insert(position: int, index: IndexManager) -> None:
+        barrier.wait()
+        results.append(index.create_entry_unless_duplicate(f"doc-{position}", "a.pdf", "/data/a.pdf", "same-hash"))
+
+    threads = [threading.Thread(target=insert, args=(i, index)) for i, index in enumerate(managers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(created for _, created in results) == 1
+    assert len({entry["doc_id"] for entry, _ in results}) == 1
+    assert managers[0].count_entries() == 1
+
+
+def test_duplicate_upload_while_original_is_queued(client: TestClient, service: "RAGService", make_pdf: Callable[..., str]):
+    path = make_pdf()
+
+    first = upload(client, path)
+    second = upload(client, path, "copia.pdf")
+
+    assert second == first
+    assert service.index_manager.count_entries() == 1
+    assert service.job_queue.stats()["queued"] == 1
+    # La copia repetida no se guarda en data/pdfs
+    assert len(service.file_manager.list_files()) == 1
+
+
+def test_different_files_are_not_duplicates(client: TestClient, service: "RAGService", make_pdf: Callable[..., str]):
+    first = upload(client, make_pdf("a.pdf", marker="a"))
+    second = upload(client, make_pdf("b.pdf", marker="b"))
+
+    assert first != second
+    assert service.index_manager.count_entries() == 2
+
+
+def test_failed_document_can_be_uploaded_again(client: TestClient, service: "RAGService", make_pdf: Callable[..., str]):
+    path = make_pdf()
+    first = upload(client, path)
+    service.index_manager.mark_as_failed(first)
+
+    second = upload(client, path)
+
+    assert second != first
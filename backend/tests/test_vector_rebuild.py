@@ -0,0 +1,95 @@
+import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+if TYPE_CHECKING:
+    from src.services.rag_service import RAGService
+
+pytestmark = pytest.mark.parametrize("vector_backend", ["numpy", "chroma"])
+
+TextPdf = Callable[[str, List[List[str]]], str]
+
+
+def index(service: "RAGService", make_text_pdf: TextPdf, name: str, topic: str) -> str:
+    path = make_text_pdf(name, [[f"{topic} linea {i}" for i in range(30)], [f"{topic} final"]])
+    return service.add_pdf_from_path(path, name)["doc_id"]
+
+
+def test_report_is_missing_before_first_rebuild(client: TestClient):
+    assert client.get("/rag/vectors/rebuild").status_code == 404
+
+
+def test_rebuild_reuses_stored_vectors(client: TestClient, service: "RAGService", make_text_pdf: TextPdf):
+    first = index(service, make_text_pdf, "a.pdf", "volcanes")
+    second = index(service, make_text_pdf, "b.pdf", "glaciares")
+    chunks = service.vector_store.scan_document_chunks()
+    total = len(chunks[first]) + len(chunks[second])
+
+    response = client.post("/rag/vectors/rebuild")
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["status"] == "completed"
+    assert (report["total_documents"], report["documents"], report["chunks"]) == (2, 2, total)
+    assert (report["reused"], report["embedded"]) == (total, 0)
+    assert service.vector_store.scan_document_chunks() == chunks
+    assert service.vector_store.search("volcanes", 1, where={"doc_id": first})
+    assert client.get("/rag/vectors/rebuild").json() == report
+
+
+def test_rebuild_drops_chunks_of_unknown_documents(client: TestClient, service: "RAGService", make_text_pdf: TextPdf):
+    kept = index(service, make_text_pdf, "a.pdf", "volcanes")
+    orphan = index(service, make_text_pdf, "b.pdf", "glaciares")
+    service.index_manager.delete_entry(orphan)
+
+    client.post("/rag/vectors/rebuild")
+
+    assert set(service.vector_store.scan_document_chunks()) == {kept}
+
+
+def test_rebuild_marks_documents_without_pdf_as_failed(client: TestClient, service: "RAGService", make_text_pdf: TextPdf):
+    kept = index(service, make_text_pdf, "a.pdf", "volcanes")
+    lost = index(service, make_text_pdf, "b.pdf", "glaciares")
+    entry = service.index_manager.get_entry(lost)
+    assert entry is not None
+    os.remove(entry["path"])
+
+    report = client.post("/rag/vectors/rebuild").json()
+
+    assert report["missing_files"] == [lost]
+    assert report["documents"] == 1
+    assert set(service.vector_store.scan_document_chunks()) == {kept}
+    lost_entry = service.index_manager.get_entry(lost)
+    assert lost_entry is not None and lost_entry["status"] == "failed"
+
+
+def test_rebuild_saves_progress_after_each_document(service: "RAGService", make_text_pdf: TextPdf, monkeypatch: pytest.MonkeyPatch):
+    index(service, make_text_pdf, "a.pdf", "volcanes")
+    index(service, make_text_pdf, "b.pdf", "glaciares")
+    saved: List[Dict[str, Any]] = []
+    save = service.rebuilder._save_report  # pyright: ignore[reportPrivateUsage]
+
+    def record(report: Dict[str, Any]) -> None:
+        saved.append(dict(report))
+        save(report)
+
+    monkeypatch.setattr(service.rebuilder, "_save_report", record)
+    service.rebuilder.run_once()
+
+    assert [(report["status"], report["documents"]) for report in saved] == [
+        ("running", 0),
+        ("running", 1),
+        ("running", 2),
+        ("completed", 2),
+    ]
+
+
+def test_concurrent_rebuild_is_rejected(client: TestClient, service: "RAGService"):
+    lock = service.rebuilder._lock  # pyright: ignore[reportPrivateUsage]
+    assert lock.acquire(blocking=False)
+    try:
+        assert client.post("/rag/vectors/rebuild").status_code == 409
+    finally:
+        lock.release()